@@ -0,0 +1,82 @@
+# admission.py
+"""
+Admission control for requests that need model work: at most max_in_flight of them are
+admitted at once and the rest are rejected straight away (Overloaded), instead of queueing
+behind slow model calls. Requests admitted while more than degrade_watermark are in flight
+are told to use the cheaper, regex-only analysis.
+"""
+import threading
+from contextlib import contextmanager
+
+# Admission modes
+FULL = "full"
+DEGRADED = "degraded"
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request is shed: too many requests are in flight, or its deadline passed.
+    """
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight=None, degrade_watermark=None):
+        """
+        :param max_in_flight: Most requests admitted at once; None for no limit
+        :param degrade_watermark: Requests admitted while more than this many are in flight get DEGRADED;
+                                  None never degrades
+        """
+        self.max_in_flight = max_in_flight
+        self.degrade_watermark = degrade_watermark
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def acquire(self):
+        """
+        Admits one request; call release() when it is done.
+        :return: FULL, or DEGRADED above the watermark
+        :raises Overloaded: max_in_flight requests are already in flight
+        """
+        with self._lock:
+            if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+                self.rejected += 1
+                raise Overloaded(f"The server is busy ({self.in_flight} requests in progress). Please retry shortly.",
+                                 reason="queue_full")
+            self.in_flight += 1
+            self.admitted += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if self.degrade_watermark is not None and self.in_flight > self.degrade_watermark:
+                return DEGRADED
+            return FULL
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    @contextmanager
+    def admit(self):
+        """
+        acquire() and release() around a block, which receives the admission mode.
+        """
+        mode = self.acquire()
+        try:
+            yield mode
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "max_in_flight": self.max_in_flight or 0,
+                "degrade_watermark": self.degrade_watermark or 0,
+            }
@@ -0,0 +1,121 @@
+# amortization.py
+"""
+Amortization schedules (interest, principal and remaining balance for every month) built on
+calculator.loan_amortization_payment.
+
+* amortization_schedule: vectorized over many loans, returns compact (float32 by default) arrays.
+* iter_schedule_chunks: yields a few months at a time for every loan, so memory stays flat
+  however long the terms are.
+* iter_schedule: yields one month at a time for a single loan, from any month onwards.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+import calculator
+import vectorized_calculator
+
+AmortizationSchedule = namedtuple("AmortizationSchedule", ["payment", "interest", "principal", "balance", "error_codes"])
+ScheduleChunk = namedtuple("ScheduleChunk", ["start_month", "interest", "principal", "balance"])
+ScheduleRow = namedtuple("ScheduleRow", ["month", "payment", "interest", "principal", "balance"])
+
+
+def _prepare_loans(principal, annual_rate, n_months):
+    principal, annual_rate, n_months = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(principal, dtype=np.float64)),
+        np.atleast_1d(np.asarray(annual_rate, dtype=np.float64)),
+        np.atleast_1d(np.asarray(n_months, dtype=np.float64)),
+    )
+    payments = vectorized_calculator.loan_amortization_payment(principal, annual_rate, n_months)
+    # Number of schedule rows per loan; invalid loans get none
+    terms = np.where(payments.error_codes == vectorized_calculator.OK, np.ceil(n_months), 0).astype(np.int64)
+    return principal, annual_rate / 12, terms, payments
+
+
+def iter_schedule_chunks(principal, annual_rate, n_months, chunk_months=12, dtype=np.float32):
+    """
+    Generates the schedules of many loans a chunk of months at a time. Only the current balance
+    of each loan is carried between chunks, so memory depends on the chunk size, not the term.
+    Months after a loan's term (and every month of an invalid loan) are zero.
+    :param principal: Loan principal(s); scalar or 1-D array
+    :param annual_rate: Annual rate(s) as decimals; scalar or 1-D array
+    :param n_months: Term(s) in months; scalar or 1-D array
+    :param chunk_months: Months per yielded chunk
+    :param dtype: dtype of the yielded arrays (the running balance is always kept in float64)
+    :return: Iterator of ScheduleChunk(start_month, interest, principal, balance); arrays are (n_loans, months_in_chunk)
+    """
+    principal, monthly_rate, terms, payments = _prepare_loans(principal, annual_rate, n_months)
+    payment = np.nan_to_num(payments.values)
+    balance = np.where(terms > 0, principal, 0.0)
+    total_months = int(terms.max(initial=0))
+
+    for start_month in range(1, total_months + 1, chunk_months):
+        months_in_chunk = min(chunk_months, total_months - start_month + 1)
+        interest_chunk = np.zeros((len(balance), months_in_chunk), dtype=dtype)
+        principal_chunk = np.zeros_like(interest_chunk)
+        balance_chunk = np.zeros_like(interest_chunk)
+
+        for offset in range(months_in_chunk):
+            month = start_month + offset
+            active = month <= terms
+            interest = balance * monthly_rate
+            principal_paid = payment - interest
+            # The last payment clears whatever is left, absorbing floating-point drift
+            principal_paid = np.where(month == terms, balance, principal_paid)
+            balance = np.where(active, balance - principal_paid, 0.0)
+
+            interest_chunk[:, offset] = np.where(active, interest, 0.0)
+            principal_chunk[:, offset] = np.where(active, principal_paid, 0.0)
+            balance_chunk[:, offset] = balance
+
+        yield ScheduleChunk(start_month, interest_chunk, principal_chunk, balance_chunk)
+
+
+def amortization_schedule(principal, annual_rate, n_months, dtype=np.float32):
+    """
+    Full schedules for many loans at once.
+    :return: AmortizationSchedule with payment and error_codes of shape (n_loans,), and interest,
+             principal and balance arrays of shape (n_loans, longest term in months)
+    """
+    principal, _monthly_rate, terms, payments = _prepare_loans(principal, annual_rate, n_months)
+    total_months = int(terms.max(initial=0))
+    interest = np.zeros((len(terms), total_months), dtype=dtype)
+    principal_paid = np.zeros_like(interest)
+    balance = np.zeros_like(interest)
+
+    for chunk in iter_schedule_chunks(principal, annual_rate, n_months, chunk_months=max(total_months, 1), dtype=dtype):
+        end = chunk.start_month - 1 + chunk.interest.shape[1]
+        interest[:, chunk.start_month - 1:end] = chunk.interest
+        principal_paid[:, chunk.start_month - 1:end] = chunk.principal
+        balance[:, chunk.start_month - 1:end] = chunk.balance
+
+    return AmortizationSchedule(payments.values, interest, principal_paid, balance, payments.error_codes)
+
+
+def remaining_balance(principal, annual_rate, payment, months_paid):
+    """
+    Balance of a single loan after months_paid payments, in closed form.
+    """
+    monthly_rate = annual_rate / 12
+    if monthly_rate == 0:
+        return principal - payment * months_paid
+    growth = (1 + monthly_rate) ** months_paid
+    return principal * growth - payment * (growth - 1) / monthly_rate
+
+
+def iter_schedule(principal, annual_rate, n_months, start_month=1):
+    """
+    Generates the schedule of a single loan one month at a time.
+    :param start_month: First month yielded; the balance before it is computed in closed form,
+                        so the tail of a long schedule doesn't cost a walk through every month
+    :return: Iterator of ScheduleRow(month, payment, interest, principal, balance)
+    """
+    payment = calculator.loan_amortization_payment(principal, annual_rate, n_months)
+    monthly_rate = annual_rate / 12
+    balance = remaining_balance(principal, annual_rate, payment, start_month - 1) if start_month > 1 else principal
+    last_month = int(np.ceil(n_months))
+    for month in range(max(start_month, 1), last_month + 1):
+        interest = balance * monthly_rate
+        principal_paid = balance if month == last_month else payment - interest
+        balance -= principal_paid
+        yield ScheduleRow(month, payment, interest, principal_paid, balance)
@@ -1,10 +1,72 @@
 # app.py
-from flask import Flask, request, render_template, jsonify
-import calculator
+from flask import Flask, Response, g, request, render_template, jsonify
+import os
+import time
+import admission
+import metrics
 import nlp_service # Our new NLP module
+import pipeline
 
 app = Flask(__name__)
 
+# Models load lazily on the first request. Set NLP_PRELOAD_MODELS=1 (e.g. under a WSGI server)
+# to load and warm them up at import time instead, before the app takes traffic.
+# With MODEL_SERVER_SOCKET set, the model server holds the models and this process loads none.
+NLP_PRELOAD_MODELS = os.environ.get("NLP_PRELOAD_MODELS") == "1" and not pipeline.model_client
+if NLP_PRELOAD_MODELS:
+    nlp_service.warmup()
+
+# Upper bound on the number of queries accepted by /api/calculate/batch in one request
+MAX_BATCH_QUERIES = int(os.environ.get("MAX_BATCH_QUERIES", 256))
+
+# Seconds a shed request is told to wait before retrying (Retry-After header)
+SHED_RETRY_AFTER_SECONDS = 1
+
+def _trace_requested(body=None):
+    # ?trace=1, a "trace" form field, or "trace": true in a JSON body
+    flag = request.values.get("trace") or (body or {}).get("trace")
+    return flag in (True, "1", "true")
+
+
+def _retry_after():
+    return {"Retry-After": str(SHED_RETRY_AFTER_SECONDS)}
+
+
+def _overloaded_response(error):
+    return jsonify({"error": True, "overloaded": True, "result_text": f"Error: {error}"}), 503, _retry_after()
+
+
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    if "request_start" in g:
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                             endpoint=request.endpoint, status=response.status_code)
+    return response
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    # Liveness: the process is up and serving requests
+    return jsonify({"status": "ok"})
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    # Readiness: the models (local, or in the model server) can answer queries
+    ready, details = pipeline.readiness(preload_models=NLP_PRELOAD_MODELS)
+    return jsonify({"ready": ready, **details}), 200 if ready else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_page():
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/", methods=["GET"])
 def index_page():
     return render_template("index.html", query="", result_text="")
@@ -15,114 +77,49 @@ def calculate_financials():
     if not user_query:
         return render_template("index.html", query="", result_text="Error: No query provided.")
 
-    # 1. Get Intent
-    intent_key, intent_confidence = nlp_service.get_intent(user_query)
-    
-    result_text = ""
-    calculation_details = ""
+    try:
+        response = pipeline.answer_queries([user_query], trace=_trace_requested())[0]
+    except admission.Overloaded as e:
+        return render_template("index.html", query=user_query, result_text=f"Error: {e}"), 503, _retry_after()
+    return render_template("index.html", query=user_query, result_text=response["result_text"],
+                           calculation_details=response["calculation_details"])
 
-    if not intent_key:
-        result_text = "Error: Could not understand your request. Please try rephrasing."
-        return render_template("index.html", query=user_query, result_text=result_text)
 
-    # Optional: Check intent confidence
-    # if intent_confidence < 0.7: # Adjust threshold as needed
-    #     result_text = f"Warning: Low confidence ({intent_confidence:.2f}) in understanding intent. Interpreted as: {intent_key.replace('_', ' ').title()}"
-    # else:
-    #     result_text = f"Intent: {intent_key.replace('_', ' ').title()}\n"
-    
-    calculation_details += f"Interpreted Action: {nlp_service.CANDIDATE_INTENTS_LABELS[list(nlp_service.INTENT_LABEL_TO_KEY_MAP.values()).index(intent_key)]}\n"
+def _json_response(response):
+    # Everything except the human-readable details, which are meant for the HTML page
+    payload = {key: value for key, value in response.items() if key != "calculation_details"}
+    payload["error"] = response["result"] is None
+    return payload
 
 
-    # 2. Extract Entities (Parameters) based on intent
-    entities, error_message = nlp_service.extract_entities(user_query, intent_key)
+@app.route("/api/calculate", methods=["POST"])
+def api_calculate():
+    body = request.get_json(silent=True) or {}
+    user_query = body.get("query")
+    if not isinstance(user_query, str) or not user_query.strip():
+        return jsonify({"error": True, "result_text": "Error: No query provided."}), 400
 
-    if error_message:
-        result_text += f"Error extracting parameters: {error_message}"
-        return render_template("index.html", query=user_query, result_text=result_text, calculation_details=calculation_details)
+    try:
+        response = pipeline.answer_queries([user_query], trace=_trace_requested(body))[0]
+    except admission.Overloaded as e:
+        return _overloaded_response(e)
+    return jsonify(_json_response(response))
 
-    if not entities:
-        result_text += "Error: Could not extract necessary values from your query."
-        return render_template("index.html", query=user_query, result_text=result_text, calculation_details=calculation_details)
 
-    calculation_details += f"Extracted Values: {entities}\n"
+@app.route("/api/calculate/batch", methods=["POST"])
+def api_calculate_batch():
+    body = request.get_json(silent=True) or {}
+    queries = body.get("queries")
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+        return jsonify({"error": True, "result_text": "Error: 'queries' must be a non-empty list of strings."}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({"error": True, "result_text": f"Error: At most {MAX_BATCH_QUERIES} queries per batch."}), 400
 
-    # 3. Call Calculator Function
     try:
-        intent_config = nlp_service.INTENT_CONFIG[intent_key]
-        calc_func_name = intent_config["calculator_function_name"]
-        
-        # Prepare arguments for the calculator function
-        # Rates are expected as percentages from NLP, convert to decimal for calculator
-        args_for_calc = {}
-        valid_call = True
-        
-        for param_name, value in entities.items():
-            if param_name.endswith("_percent"): # e.g., rate_percent, annual_rate_percent
-                args_for_calc[param_name.replace("_percent", "")] = value / 100.0
-            elif param_name == "time_years": # for simple interest
-                 args_for_calc["time"] = value
-            elif param_name == "term_months": # for loan amortization
-                 args_for_calc["n_months"] = value
-            elif param_name == "compounding_frequency":
-                 args_for_calc["times_compounded_per_year"] = value
-            else: # Handles future_value, present_value, principal, periods, years
-                args_for_calc[param_name] = value
-        
-        # Ensure all required parameters for the specific function are present after mapping
-        # This is a simplified check; more robust mapping might be needed if param names differ greatly
-        # between NLP extraction and calculator function signatures. For now, we assume close mapping.
-
-        # Example: Get the actual calculator function
-        if hasattr(calculator, calc_func_name):
-            calculator_function = getattr(calculator, calc_func_name)
-            
-            # Dynamically call the function with extracted and mapped arguments
-            # This requires careful alignment of NLP param names and function arg names
-            # For simplicity, we'll use if/else based on intent_key for now,
-            # as direct mapping can be tricky with varying param names.
-
-            numeric_result = None
-            if intent_key == "calculate_present_value":
-                numeric_result = calculator_function(fv=args_for_calc['future_value'], rate=args_for_calc['rate'], n_periods=args_for_calc['periods'])
-                result_text = f"The Present Value is: ${numeric_result:,.2f}"
-            elif intent_key == "calculate_future_value":
-                numeric_result = calculator_function(pv=args_for_calc['present_value'], rate=args_for_calc['rate'], n_periods=args_for_calc['periods'])
-                result_text = f"The Future Value is: ${numeric_result:,.2f}"
-            elif intent_key == "calculate_simple_interest":
-                numeric_result = calculator_function(principal=args_for_calc['principal'], rate=args_for_calc['rate'], time=args_for_calc['time'])
-                result_text = f"The Simple Interest earned is: ${numeric_result:,.2f}"
-            elif intent_key == "calculate_compound_interest":
-                numeric_result = calculator_function(principal=args_for_calc['principal'], 
-                                                     annual_rate=args_for_calc['annual_rate'], 
-                                                     times_compounded_per_year=args_for_calc['times_compounded_per_year'], 
-                                                     years=args_for_calc['years'])
-                result_text = f"The total amount with Compound Interest (Future Value) is: ${numeric_result:,.2f}"
-            elif intent_key == "calculate_monthly_loan_payment":
-                numeric_result = calculator_function(principal=args_for_calc['principal'], 
-                                                     annual_rate=args_for_calc['annual_rate'], 
-                                                     n_months=args_for_calc['n_months'])
-                result_text = f"The Monthly Loan Payment is: ${numeric_result:,.2f}"
-            else:
-                result_text = "Error: Calculation logic for this intent is not implemented yet."
-                valid_call = False
-
-            if valid_call and numeric_result is not None:
-                 calculation_details += f"Calculation: {calc_func_name}({', '.join(f'{k}={v:.4f}' if isinstance(v, float) else f'{k}={v}' for k, v in args_for_calc.items() if k in calculator_function.__code__.co_varnames)})\n"
-                 calculation_details += f"Result: {numeric_result:.2f}"
-
-
-        else:
-            result_text = f"Error: Calculator function '{calc_func_name}' not found."
-
-    except ValueError as ve: # Catch specific errors from calculator functions
-        result_text = f"Calculation Error: {ve}"
-    except TypeError as te: # Catch argument mismatch errors
-        result_text = f"Parameter Mismatch Error: Could not perform calculation. {te}. Check extracted values: {args_for_calc}"
-    except Exception as e:
-        result_text = f"An unexpected error occurred during calculation: {e}"
-
-    return render_template("index.html", query=user_query, result_text=result_text, calculation_details=calculation_details)
+        responses = pipeline.answer_queries(queries, trace=_trace_requested(body))
+    except admission.Overloaded as e:
+        return _overloaded_response(e)
+    return jsonify({"results": [_json_response(response) for response in responses]})
 
 
 if __name__ == "__main__":
@@ -180,4 +177,9 @@ if __name__ == "__main__":
 </body>
 </html>
             """)
+    # Load both models up front so the first request isn't slowed down by model loading.
+    # With debug=True the reloader re-runs this script in a child process that serves the
+    # requests, so only warm up there rather than holding a second copy in the watcher.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true" and not pipeline.model_client:
+        nlp_service.warmup()
     app.run(debug=True)
\ No newline at end of file
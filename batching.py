@@ -0,0 +1,108 @@
+# batching.py
+"""
+Dynamic micro-batching: items submitted from many threads within a short window are
+coalesced into one call of a batch handler, and each caller gets its own result back
+through a Future. Used to turn concurrent requests into batched model invocations.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    def __init__(self, handler, max_batch_size=16, max_wait_ms=10, name="micro-batcher"):
+        """
+        :param handler: Called with a list of items; must return a list of results in the same order
+        :param max_batch_size: Largest batch passed to handler
+        :param max_wait_ms: Longest time the first item of a batch waits for others to arrive,
+                            which bounds the latency added by batching
+        :param name: Name of the worker thread
+        """
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def _ensure_worker(self):
+        # The worker starts on first use, so importing modules that create a batcher
+        # (or forking WSGI workers after import) doesn't leave threads behind.
+        if self._worker is None or not self._worker.is_alive():
+            with self._start_lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._worker.start()
+
+    def submit(self, item):
+        """
+        Queues one item for the next batch.
+        :return: A Future that resolves to the handler's result for this item
+        """
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future
+
+    def submit_many(self, items):
+        """
+        Queues several items at once; they are likely to land in the same batch.
+        :return: List of Futures, one per item
+        """
+        return [self.submit(item) for item in items]
+
+    def _collect_batch(self):
+        batch = [self._queue.get()] # Block until there is work
+        deadline = time.monotonic() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            # Skip items whose caller already gave up (e.g. timed out)
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+
+            try:
+                results = self.handler([item for item, _future in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Batch handler returned {len(results)} results for {len(batch)} items.")
+            except Exception as e:
+                for _item, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_item, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_seconds * 1000,
+            }
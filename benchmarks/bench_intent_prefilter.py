@@ -0,0 +1,110 @@
+# benchmarks/bench_intent_prefilter.py
+"""
+Measures the intent_registry candidate prefilter: how often the expected label survives the
+prefilter (recall), how often the candidate set is narrowed, and the mean number of labels left to
+score, which is the number of zero-shot NLI forward passes per query.
+
+Recall that matters is measured on phrasings written independently of the prefilter keywords: the
+CSV questions and HELD_OUT_QUERIES below, which deliberately use broad words ("today", "payments",
+"returns", "project", "grow") in queries about other intents. The registry examples and generated
+queries are built from the same wording as the keywords, so their recall is reported but can't show
+a keyword that is too broad. Exits with status 1 if held-out recall is below --min-recall.
+
+Usage:
+    python -m benchmarks.bench_intent_prefilter [--csv path] [--synthetic N] [--show-misses]
+"""
+import argparse
+import sys
+import time
+
+import intent_registry
+import question_dataset
+import synthetic_queries
+
+
+# (expected intent key, query) written without reference to the prefilter keywords
+HELD_OUT_QUERIES = [
+    ("calculate_present_value", "How much would I have to put aside today to have $5,000 in 6 years if I earn 3%?"),
+    ("calculate_present_value", "What's $8,000 due in 4 years worth today at a 5% discount rate?"),
+    ("calculate_present_value", "A payment of $12,000 arrives in 10 years; at 6% what is that in today's money?"),
+    ("calculate_future_value", "If I deposit $2,500 at 4% for 8 years, what will my balance be?"),
+    ("calculate_future_value", "How much will $700 grow to in 12 years at 6%?"),
+    ("calculate_future_value", "Starting today with $3,000 at 5% a year, what do I have after 7 years?"),
+    ("calculate_simple_interest", "How much interest will $1000 earn at 5% over 3 years starting today?"),
+    ("calculate_simple_interest", "I lend a friend $600 at 5% simple interest for 2 years; how much interest do I receive?"),
+    ("calculate_simple_interest", "What returns does $4,000 make at a flat 2.5% a year for 3 years, without compounding?"),
+    ("calculate_compound_interest", "What does $5,000 become after 10 years at 4% compounded monthly?"),
+    ("calculate_compound_interest", "Project the balance of $2,000 at 6% compounded annually for 15 years."),
+    ("calculate_compound_interest", "My savings of $10k grow at 3% interest compounded daily; what is the total after 5 years?"),
+    ("calculate_monthly_loan_payment", "What will my monthly payments be on a $250,000 mortgage at 6.5% for 30 years?"),
+    ("calculate_monthly_loan_payment", "I'm borrowing $15,000 for a car at 7% over 60 months. How much do I pay each month?"),
+    ("calculate_monthly_loan_payment", "Car loan of $20k at 4.9% over 5 years starting today, what are the payments?"),
+    ("calculate_loan_amortization_schedule", "Break down the amortization schedule of a $180,000 mortgage at 5% over 15 years."),
+    ("calculate_loan_amortization_schedule", "Show the remaining balance each month for a $5,000 loan at 8% over 12 months."),
+    ("calculate_loan_amortization_schedule", "How much interest will I pay in total on a $30,000 loan at 6% over 48 months?"),
+    ("calculate_net_present_value", "Is a project costing $10,000 with cash flows of $3,000, $4,000 and $5,000 worth it at 9%?"),
+    ("calculate_net_present_value", "What's the NPV of investing $2,000 today to receive $800, $900 and $1,000 at 10%?"),
+    ("calculate_internal_rate_of_return", "What rate of return do I get if I invest $5,000 and receive $2,000, $2,000 and $2,500?"),
+    ("calculate_internal_rate_of_return", "Find the IRR for an outlay of $1,200 returning $400, $500 and $600."),
+]
+
+# Sources written independently of the keywords; --min-recall applies to these
+HELD_OUT_SOURCES = ("csv", "held_out")
+
+
+def labelled_queries(csv_path, n_synthetic, seed):
+    """
+    :return: List of (source, query, expected intent key)
+    """
+    queries = [("csv", row["question"], row["expected_intent"])
+               for row in question_dataset.iter_rows(csv_path) if row["expected_intent"]]
+    queries.extend(("held_out", query, key) for key, query in HELD_OUT_QUERIES)
+    queries.extend(("example", example, spec.key) for spec in intent_registry.INTENTS for example in spec.examples)
+    queries.extend(("synthetic", query.query, query.intent_key)
+                   for query in synthetic_queries.generate_queries(n_synthetic, seed=seed))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the intent candidate prefilter.")
+    parser.add_argument("--csv", default=question_dataset.DEFAULT_CSV_PATH, help="Question/answer CSV file")
+    parser.add_argument("--synthetic", type=int, default=800, help="Generated queries to include")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated queries")
+    parser.add_argument("--show-misses", action="store_true", help="Print queries whose expected label was filtered out")
+    parser.add_argument("--min-recall", type=float, default=1.0, help="Lowest acceptable recall on the held-out queries")
+    args = parser.parse_args()
+
+    full_count = len(intent_registry.CANDIDATE_INTENTS_LABELS)
+    print(f"{'source':<12}{'queries':>9}{'recall':>9}{'narrowed':>10}{'labels':>9}{'us/query':>10}")
+    by_source = {}
+    for source, query, expected in labelled_queries(args.csv, args.synthetic, args.seed):
+        by_source.setdefault(source, []).append((query, expected))
+
+    held_out_hits = held_out_total = 0
+    for source, items in by_source.items():
+        hits = narrowed_count = label_total = 0
+        start = time.perf_counter()
+        results = [intent_registry.candidate_labels(query) for query, _expected in items]
+        elapsed = time.perf_counter() - start
+        for (query, expected), (labels, narrowed) in zip(items, results):
+            label_total += len(labels)
+            narrowed_count += narrowed
+            if intent_registry.INTENT_KEY_TO_LABEL_MAP[expected] in labels:
+                hits += 1
+            elif args.show_misses:
+                print(f"  miss [{expected}] {query} -> {labels}")
+        print(f"{source:<12}{len(items):>9}{hits / len(items):>9.1%}{narrowed_count / len(items):>10.1%}"
+              f"{label_total / len(items):>9.2f}{1e6 * elapsed / len(items):>10.1f}")
+        if source in HELD_OUT_SOURCES:
+            held_out_hits += hits
+            held_out_total += len(items)
+    print(f"(labels = zero-shot forward passes per query; {full_count} without the prefilter)")
+
+    held_out_recall = held_out_hits / held_out_total
+    print(f"Held-out recall: {held_out_recall:.1%}")
+    if held_out_recall < args.min_recall:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# benchmarks/bench_npv_irr.py
+"""
+Checks the batched NPV/IRR engine and the plain-Python calculator functions against known values
+and each other, then times the engine on large batches of random cashflow series against a loop
+over the plain-Python calculator functions.
+
+Usage:
+    python -m benchmarks.bench_npv_irr [--series N] [--periods T]
+"""
+import argparse
+import time
+
+import numpy as np
+
+import calculator
+import pipeline
+import vectorized_calculator
+
+# (cashflows, expected IRR), reference values as published for numpy-financial's irr()
+KNOWN_IRRS = [
+    ([-100, 39, 59, 55, 20], 0.28094842115996066),
+    ([-100, 0, 0, 74], -0.09549583034897258),
+    ([-100, 100, 0, -7], -0.08329966618370521),
+    ([-100, 100, 0, 7], 0.06205848562992956),
+    ([-5, 10.5, 1, -8, 1], 0.08859833852439172),
+]
+
+# (rate, cashflows, expected NPV), from the textbook sum(cf_t / (1 + rate)**t)
+KNOWN_NPVS = [
+    (0.10, [-1000, 300, 400, 500], -21.0368144252443),
+    (0.08, [-1000, 300, 400, 500], 17.62942640857591),
+    (0.0, [-100, 50, 50], 0.0),
+    (0.05, [-15000, 1500, 2500, 3500, 4500, 6000], 122.89485495093959),
+]
+
+
+def check_correctness():
+    for cashflows, expected in KNOWN_IRRS:
+        actual = calculator.internal_rate_of_return(cashflows)
+        assert abs(actual - expected) < 1e-8, f"IRR of {cashflows}: expected {expected}, got {actual}"
+    for rate, cashflows, expected in KNOWN_NPVS:
+        actual = calculator.net_present_value(rate, cashflows)
+        assert abs(actual - expected) < 1e-8, f"NPV of {cashflows} at {rate}: expected {expected}, got {actual}"
+
+    # Batched results agree with the per-series ones, including ragged series
+    batch = vectorized_calculator.internal_rate_of_return([cashflows for cashflows, _ in KNOWN_IRRS])
+    assert np.allclose(batch.values, [expected for _, expected in KNOWN_IRRS], atol=1e-8)
+
+    # The plain-Python and batched versions agree on random series
+    series = random_series(200, 12, seed=2)
+    series[::3, 5] = -800 # Some series with several sign changes
+    batch = vectorized_calculator.internal_rate_of_return(series)
+    npv_batch = vectorized_calculator.net_present_value(0.08, series)
+    for row, expected_irr, error_code, expected_npv in zip(series, batch.values, batch.error_codes, npv_batch.values):
+        assert abs(calculator.net_present_value(0.08, list(row)) - expected_npv) < 1e-8
+        if error_code:
+            continue
+        assert abs(calculator.internal_rate_of_return(list(row)) - expected_irr) < 1e-8
+
+    # -1, +5, -6 has IRRs of 100% and 200%
+    multiple = vectorized_calculator.internal_rate_of_return([[-1, 5, -6]])
+    assert multiple.multiple_roots[0] and abs(multiple.values[0] - 1.0) < 1e-8
+
+    # -100, +230, -132 has IRRs of 10% and 20%; the one nearest IRR_GUESS is returned, with a warning in the app
+    multiple = vectorized_calculator.internal_rate_of_return([[-100, 230, -132]])
+    assert multiple.multiple_roots[0] and abs(multiple.values[0] - 0.1) < 1e-8
+    numeric_result, result_text, _details = pipeline.run_calculation(
+        "calculate_internal_rate_of_return", {"initial_investment": 100.0, "cashflows": [230.0, -132.0]})
+    assert abs(numeric_result - 0.1) < 1e-8 and "more than one IRR" in result_text, result_text
+    numeric_result, result_text, _details = pipeline.run_calculation(
+        "calculate_internal_rate_of_return", {"initial_investment": 100.0, "cashflows": [39.0, 59.0, 55.0, 20.0]})
+    assert abs(numeric_result - 0.28094842115996066) < 1e-8 and "more than one IRR" not in result_text, result_text
+
+    # No sign change means no IRR
+    none = vectorized_calculator.internal_rate_of_return([[100, 200, 300]])
+    assert none.error_codes[0] == vectorized_calculator.NO_SIGN_CHANGE and np.isnan(none.values[0])
+
+    # Every rate x every series in one call
+    grid = vectorized_calculator.net_present_value(np.array([[0.08], [0.10]]), [[-1000, 300, 400, 500]] * 3)
+    assert grid.values.shape == (2, 3) and np.allclose(grid.values[:, 0], [17.62942640857591, -21.0368144252443])
+    print("Correctness checks passed.")
+
+
+def random_series(n_series, n_periods, seed=0):
+    rng = np.random.default_rng(seed)
+    cashflows = rng.uniform(50, 400, size=(n_series, n_periods))
+    cashflows[:, 0] = -rng.uniform(500, 2000, size=n_series)
+    return cashflows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batched NPV/IRR engine.")
+    parser.add_argument("--series", type=int, nargs="+", default=[10_000, 100_000], help="Batch sizes to time")
+    parser.add_argument("--periods", type=int, default=20, help="Cashflows per series")
+    parser.add_argument("--loop-series", type=int, default=2_000,
+                        help="Series timed with the per-series loop (extrapolated to each batch size)")
+    args = parser.parse_args()
+
+    check_correctness()
+
+    loop_cashflows = random_series(args.loop_series, args.periods, seed=1)
+    start = time.perf_counter()
+    loop_cashflows = [list(series) for series in loop_cashflows]
+    for series in loop_cashflows:
+        calculator.net_present_value(0.08, series)
+    npv_loop_per_series = (time.perf_counter() - start) / args.loop_series
+    start = time.perf_counter()
+    for series in loop_cashflows:
+        calculator.internal_rate_of_return(series)
+    irr_loop_per_series = (time.perf_counter() - start) / args.loop_series
+
+    print(f"\n{'series':>10}{'NPV batch s':>14}{'NPV loop s*':>14}{'IRR batch s':>14}{'IRR loop s*':>14}{'IRR iters':>11}")
+    for n_series in args.series:
+        cashflows = random_series(n_series, args.periods)
+        rates = np.full(n_series, 0.08)
+
+        start = time.perf_counter()
+        vectorized_calculator.net_present_value(rates, cashflows)
+        npv_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        irr = vectorized_calculator.internal_rate_of_return(cashflows)
+        irr_seconds = time.perf_counter() - start
+        assert not irr.error_codes.any(), "Every random series should have an IRR"
+
+        print(f"{n_series:>10,}{npv_seconds:>14.4f}{npv_loop_per_series * n_series:>14.2f}"
+              f"{irr_seconds:>14.4f}{irr_loop_per_series * n_series:>14.2f}{irr.iterations.max():>11}")
+    print("* extrapolated from the per-series loop timing")
+
+
+if __name__ == "__main__":
+    main()
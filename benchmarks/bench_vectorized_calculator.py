@@ -0,0 +1,85 @@
+# benchmarks/bench_vectorized_calculator.py
+"""
+Benchmarks vectorized_calculator.sensitivity_grid against the equivalent Python loop over
+the scalar calculator functions, and checks that both give the same numbers without NumPy warnings.
+
+Usage:
+    python -m benchmarks.bench_vectorized_calculator [--size N]
+"""
+import argparse
+import itertools
+import time
+import warnings
+
+import numpy as np
+
+import calculator
+import vectorized_calculator
+
+
+def _scalar_grid(function, arguments):
+    fixed = {name: value for name, value in arguments.items() if np.ndim(value) == 0}
+    axes = {name: value for name, value in arguments.items() if np.ndim(value) > 0}
+    shape = tuple(len(values) for values in axes.values())
+    values = np.empty(shape)
+    for index in itertools.product(*(range(n) for n in shape)):
+        arguments = dict(fixed, **{name: float(axes[name][i]) for name, i in zip(axes, index)})
+        try:
+            values[index] = function(**arguments)
+        except ValueError:
+            values[index] = np.nan
+    return values
+
+
+def bench(function_name, arguments):
+    start = time.perf_counter()
+    grid = vectorized_calculator.sensitivity_grid(function_name, **arguments)
+    vectorized_seconds = time.perf_counter() - start
+    cells = grid.values.size
+
+    start = time.perf_counter()
+    expected = _scalar_grid(getattr(calculator, function_name), arguments)
+    scalar_seconds = time.perf_counter() - start
+
+    if not np.allclose(grid.values, expected, rtol=1e-9, equal_nan=True):
+        raise AssertionError(f"{function_name}: vectorized results differ from the scalar loop")
+
+    print(f"{function_name:<28}{cells:>12,}{scalar_seconds:>12.3f}{vectorized_seconds:>14.4f}"
+          f"{scalar_seconds / vectorized_seconds:>10.0f}x")
+
+
+def check_edge_cases():
+    # Zero-rate and invalid cells are masked out; their placeholders must not overflow on long terms
+    result = vectorized_calculator.loan_amortization_payment(1000, [0.0, -0.05, 0.06], [1200, 1200, 0])
+    assert np.isclose(result.values[0], 1000 / 1200), result.values
+    assert list(result.error_codes) == [vectorized_calculator.OK, vectorized_calculator.NEGATIVE_ANNUAL_RATE,
+                                        vectorized_calculator.INVALID_N_MONTHS]
+    assert np.isclose(vectorized_calculator.loan_amortization_payment(1000, 0.0, 12_000).values, 1000 / 12_000)
+    print("Edge-case checks passed.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vectorized calculator grids against scalar loops.")
+    parser.add_argument("--size", type=int, default=100, help="Points per grid axis (cells = size^3)")
+    args = parser.parse_args()
+    n = args.size
+    # Any overflow or invalid-value warning fails the run
+    warnings.simplefilter("error", RuntimeWarning)
+    check_edge_cases()
+
+    rates = np.linspace(0.0, 0.12, n)
+    principals = np.linspace(1_000, 1_000_000, n)
+
+    print(f"{'function':<28}{'cells':>12}{'scalar s':>12}{'vectorized s':>14}{'speedup':>11}")
+    bench("present_value", {"fv": principals, "rate": rates, "n_periods": np.arange(1, n + 1)})
+    bench("future_value", {"pv": principals, "rate": rates, "n_periods": np.arange(1, n + 1)})
+    bench("simple_interest", {"principal": principals, "rate": rates, "time": np.arange(1, n + 1)})
+    # Frequencies and terms start at 0 so the per-cell error handling is exercised too
+    bench("compound_interest", {"principal": principals, "annual_rate": rates,
+                                "times_compounded_per_year": np.arange(0, n), "years": 10})
+    bench("loan_amortization_payment", {"principal": principals, "annual_rate": rates,
+                                        "n_months": np.arange(0, 12 * n, 12)})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# benchmarks/common.py
+"""
+Shared helpers for the benchmark scripts.
+"""
+import math
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers (pct in 0-100). Returns 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_latencies(seconds):
+    """
+    Summarises a list of per-call latencies (in seconds) as milliseconds.
+    """
+    count = len(seconds)
+    total = sum(seconds)
+    return {
+        "count": count,
+        "mean_ms": 1000 * total / count if count else 0.0,
+        "p50_ms": 1000 * percentile(seconds, 50),
+        "p95_ms": 1000 * percentile(seconds, 95),
+        "p99_ms": 1000 * percentile(seconds, 99),
+        "throughput_per_s": count / total if total else 0.0,
+    }
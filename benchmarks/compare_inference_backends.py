@@ -0,0 +1,126 @@
+# benchmarks/compare_inference_backends.py
+"""
+Checks that the quantized / ONNX Runtime inference backends give the same answers as full-precision
+torch, and compares their latency and memory. Each backend runs in a fresh process (so memory
+figures aren't mixed) over the CSV questions plus generated queries, with the rule-based fast path
+disabled so every query goes through get_intent and extract_entities.
+
+Reported per backend: model load time, resident memory growth, per-query latency, agreement with the
+reference backend (same intent, same extracted values) and accuracy against the known intents and
+values of the generated queries. Exits with status 1 if a backend's intent or entity agreement is
+below --min-agreement.
+
+Usage:
+    python -m benchmarks.compare_inference_backends [--backends torch int8 onnx onnx_int8] [--synthetic 100]
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+import inference_backends
+import question_dataset
+import synthetic_queries
+from benchmarks.common import summarize_latencies
+
+
+def _run_backend(backend, queries, results):
+    import nlp_service
+    import rule_extractor
+
+    assert nlp_service.INFERENCE_BACKEND == backend
+
+    rule_extractor.RULE_CONFIDENCE_THRESHOLD = float("inf")
+    rss_before = nlp_service.rss_mb()
+    start = time.perf_counter()
+    nlp_service.get_intent_classifier()
+    nlp_service.get_qa_pipeline()
+    load_seconds = time.perf_counter() - start
+    nlp_service.get_intent(queries[0]) # Warm up outside the timed loop
+
+    predictions = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        intent_key, _confidence = nlp_service.get_intent(query)
+        entities, error_message = nlp_service.extract_entities(query, intent_key)
+        latencies.append(time.perf_counter() - start)
+        predictions.append((intent_key, entities or {}, error_message))
+    results.put({
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "rss_delta_mb": nlp_service.rss_mb() - rss_before,
+        "latencies": latencies,
+        "predictions": predictions,
+    })
+
+
+def run_backend(backend, queries):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_backend, args=(backend, queries, results))
+    # nlp_service reads INFERENCE_BACKEND when it is first imported, which in the child happens
+    # while this module is re-imported, so the variable has to be in the environment it inherits
+    os.environ["INFERENCE_BACKEND"] = backend
+    process.start()
+    while True:
+        try:
+            result = results.get(timeout=1.0)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                raise RuntimeError(f"The {backend} backend process exited with code {process.exitcode} before reporting results.")
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy parity and latency/memory of the inference backends.")
+    parser.add_argument("--backends", nargs="+", choices=inference_backends.INFERENCE_BACKENDS,
+                        default=list(inference_backends.INFERENCE_BACKENDS), help="The first is the reference")
+    parser.add_argument("--csv", default=question_dataset.DEFAULT_CSV_PATH, help="Question/answer CSV file")
+    parser.add_argument("--synthetic", type=int, default=100, help="Generated queries with known answers")
+    parser.add_argument("--min-agreement", type=float, default=0.95,
+                        help="Lowest acceptable intent/entity agreement with the reference backend")
+    args = parser.parse_args()
+
+    csv_queries = [row["question"] for row in question_dataset.iter_rows(args.csv) if row["question"]]
+    generated = synthetic_queries.generate_queries(args.synthetic, seed=0)
+    queries = csv_queries + [item.query for item in generated]
+    # Known intent and values for the generated queries (the CSV only gives final answers)
+    expected = [None] * len(csv_queries) + [(item.intent_key, item.entities) for item in generated]
+
+    reference = None
+    failed = False
+    print(f"{len(queries)} queries ({len(csv_queries)} from the CSV, {len(generated)} generated)")
+    print(f"{'backend':<11}{'load s':>8}{'RSS MB':>9}{'p50 ms':>9}{'p95 ms':>9}{'intent agree':>14}"
+          f"{'entity agree':>14}{'intent acc':>12}{'entity acc':>12}")
+    for backend in args.backends:
+        result = run_backend(backend, queries)
+        predictions = result["predictions"]
+        reference = reference or predictions
+
+        intent_agree = sum(p[0] == r[0] for p, r in zip(predictions, reference)) / len(queries)
+        entity_agree = sum(p[0] == r[0] and synthetic_queries.entities_match(p[1], r[1]) for p, r in zip(predictions, reference)) / len(queries)
+        known = [(p, e) for p, e in zip(predictions, expected) if e]
+        intent_acc = sum(p[0] == e[0] for p, e in known) / len(known) if known else 0.0
+        entity_acc = sum(p[0] == e[0] and synthetic_queries.entities_match(p[1], e[1]) for p, e in known) / len(known) if known else 0.0
+
+        summary = summarize_latencies(result["latencies"])
+        print(f"{backend:<11}{result['load_seconds']:>8.1f}{result['rss_delta_mb']:>9.1f}{summary['p50_ms']:>9.1f}"
+              f"{summary['p95_ms']:>9.1f}{intent_agree:>14.1%}{entity_agree:>14.1%}{intent_acc:>12.1%}{entity_acc:>12.1%}")
+        if min(intent_agree, entity_agree) < args.min_agreement:
+            failed = True
+            for query, p, r in zip(queries, predictions, reference):
+                if p[0] != r[0] or not synthetic_queries.entities_match(p[1], r[1]):
+                    print(f"  [{backend}] {query}: {p[0]} {p[1]} vs reference {r[0]} {r[1]}")
+
+    if failed:
+        print(f"Agreement below {args.min_agreement:.0%} with the reference backend ({args.backends[0]}).")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# benchmarks/compare_intent_backends.py
+"""
+Compares the intent classifier backends on a question/answer CSV: accuracy against the
+"Calculation" column, load time, and per-query latency. The rule-based fast path is bypassed
+so both backends see every question.
+
+Usage:
+    python -m benchmarks.compare_intent_backends [--csv path] [--repeat N]
+"""
+import argparse
+import time
+
+import nlp_service
+import question_dataset
+from benchmarks.common import summarize_latencies
+
+# How to build each backend (so load time is measured) and its batch classify function
+BACKENDS = {
+    "zero_shot": (nlp_service.get_intent_classifier, nlp_service._classify_intents_zero_shot),
+    "embedding": (nlp_service.get_embedding_classifier, nlp_service._classify_intents_with_embeddings),
+}
+
+
+def evaluate_backend(name, rows, repeat):
+    load, classify = BACKENDS[name]
+    start = time.perf_counter()
+    load()
+    load_seconds = time.perf_counter() - start
+    classify([rows[0]["question"]]) # Warm up outside the timed loop
+
+    latencies = []
+    correct = 0
+    for row in rows:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            intent_key, _confidence = classify([row["question"]])[0]
+            latencies.append(time.perf_counter() - start)
+        if intent_key == row["expected_intent"]:
+            correct += 1
+        else:
+            print(f"  [{name}] expected {row['expected_intent']}, got {intent_key}: {row['question']}")
+
+    summary = summarize_latencies(latencies)
+    summary["accuracy"] = correct / len(rows)
+    summary["load_seconds"] = load_seconds
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare intent classifier backends on a question CSV.")
+    parser.add_argument("--csv", default=question_dataset.DEFAULT_CSV_PATH, help="Question/answer CSV file")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per question")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    args = parser.parse_args()
+
+    rows = [row for row in question_dataset.iter_rows(args.csv) if row["expected_intent"]]
+    if not rows:
+        parser.error(f"No rows with a known Calculation in {args.csv}")
+
+    results = {name: evaluate_backend(name, rows, args.repeat) for name in args.backends}
+
+    print(f"\n{len(rows)} questions, {args.repeat} timed runs each")
+    print(f"{'backend':<12}{'accuracy':>10}{'load s':>9}{'mean ms':>10}{'p50 ms':>9}{'p95 ms':>9}{'q/s':>9}")
+    for name, summary in results.items():
+        print(f"{name:<12}{summary['accuracy']:>10.1%}{summary['load_seconds']:>9.2f}{summary['mean_ms']:>10.1f}"
+              f"{summary['p50_ms']:>9.1f}{summary['p95_ms']:>9.1f}{summary['throughput_per_s']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
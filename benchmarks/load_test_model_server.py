@@ -0,0 +1,184 @@
+# benchmarks/load_test_model_server.py
+"""
+Load test comparing the two multi-worker setups:
+* per_process: every worker process loads its own copy of the models (the default setup).
+* server: one model_server.py process owns the models and workers call it over its Unix socket.
+Each worker sends its share of queries through pipeline.answer_queries from several threads. The script
+reports throughput, latency percentiles and memory (PSS where /proc provides it, so pages shared
+between processes are only counted once) for the workers, the server and in total.
+
+The fast path and query cache are disabled so every query reaches the models. --models stub (default)
+uses the deterministic stubs from benchmarks.stub_models and runs offline; --models real loads the
+transformers pipelines in each process that needs them.
+
+Usage:
+    python -m benchmarks.load_test_model_server [--workers 4] [--requests 200] [--concurrency 4] [--models real]
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import summarize_latencies
+
+MODES = ["per_process", "server"]
+
+
+def _memory_mb(pid):
+    """
+    Proportional set size of a process in MB, falling back to its resident set size.
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f_smaps:
+            for line in f_smaps:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        with open(f"/proc/{pid}/statm") as f_statm:
+            return int(f_statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return 0.0
+
+
+def _install_models(models, stub_latency_ms):
+    import nlp_service
+
+    if models == "stub":
+        from benchmarks.stub_models import StubIntentClassifier, StubQAPipeline
+
+        nlp_service.set_models(
+            intent_classifier=StubIntentClassifier(nlp_service.INTENT_LABEL_TO_KEY_MAP, latency_ms=stub_latency_ms),
+            qa_pipeline=StubQAPipeline(latency_ms=stub_latency_ms))
+    else:
+        nlp_service.warmup()
+
+
+def _bypass_fast_path():
+    import query_cache
+    import rule_extractor
+
+    rule_extractor.RULE_CONFIDENCE_THRESHOLD = float("inf")
+    query_cache.nlp_cache.max_entries = 0
+
+
+def _run_server(socket_path, models, stub_latency_ms, intra_op_threads):
+    import nlp_service
+
+    nlp_service.TORCH_INTRA_OP_THREADS = intra_op_threads
+    _bypass_fast_path()
+    from model_server import ModelServer
+
+    if models == "stub":
+        _install_models(models, stub_latency_ms)
+    ModelServer(socket_path, warmup=models == "real").serve_forever()
+
+
+def _run_worker(queries, mode, socket_path, models, stub_latency_ms, intra_op_threads, concurrency, barrier, results):
+    if mode == "server":
+        os.environ["MODEL_SERVER_SOCKET"] = socket_path
+    import nlp_service
+    import pipeline
+
+    nlp_service.TORCH_INTRA_OP_THREADS = intra_op_threads
+    _bypass_fast_path()
+    if mode == "per_process":
+        _install_models(models, stub_latency_ms)
+
+    def timed_answer(query):
+        start = time.perf_counter()
+        pipeline.answer_queries([query])
+        return time.perf_counter() - start
+
+    barrier.wait()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed_answer, queries))
+    results.put({"latencies": latencies, "memory_mb": _memory_mb(os.getpid())})
+
+
+def _wait_until_ready(socket_path, timeout_seconds):
+    from model_client import ModelServerClient
+
+    client = ModelServerClient(socket_path)
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        try:
+            if client.ping()["ready"]:
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"Model server at {socket_path} was not ready within {timeout_seconds}s")
+
+
+def run_mode(mode, args, queries):
+    context = multiprocessing.get_context("spawn")
+    # Holds the socket and the server's authkey file; removed with them when the run ends
+    with tempfile.TemporaryDirectory(prefix="model-server-") as socket_dir:
+        socket_path = os.path.join(socket_dir, "models.sock")
+        server = None
+        if mode == "server":
+            server = context.Process(target=_run_server, daemon=True,
+                                     args=(socket_path, args.models, args.stub_latency_ms, args.intra_op_threads))
+            server.start()
+            _wait_until_ready(socket_path, args.ready_timeout)
+
+        barrier = context.Barrier(args.workers + 1)
+        results = context.Queue()
+        per_worker = [queries[i::args.workers] for i in range(args.workers)]
+        workers = [context.Process(target=_run_worker, daemon=True,
+                                   args=(worker_queries, mode, socket_path, args.models, args.stub_latency_ms,
+                                         args.intra_op_threads, args.concurrency, barrier, results))
+                   for worker_queries in per_worker]
+        for worker in workers:
+            worker.start()
+
+        barrier.wait() # Workers have loaded everything they need; start the clock
+        start = time.perf_counter()
+        worker_results = [results.get() for _ in workers]
+        wall_seconds = time.perf_counter() - start
+        server_memory = _memory_mb(server.pid) if server else 0.0
+        for worker in workers:
+            worker.join()
+        if server:
+            server.terminate()
+            server.join()
+
+    latencies = [latency for result in worker_results for latency in result["latencies"]]
+    summary = summarize_latencies(latencies)
+    summary["throughput_per_s"] = len(latencies) / wall_seconds
+    summary["worker_memory_mb"] = sum(result["memory_mb"] for result in worker_results)
+    summary["server_memory_mb"] = server_memory
+    summary["total_memory_mb"] = summary["worker_memory_mb"] + server_memory
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-process models against a shared model server.")
+    parser.add_argument("--workers", type=int, default=4, help="Web worker processes")
+    parser.add_argument("--requests", type=int, default=200, help="Queries per worker")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent requests per worker")
+    parser.add_argument("--models", choices=["stub", "real"], default="stub", help="Stub models (offline) or the real pipelines")
+    parser.add_argument("--stub-latency-ms", type=float, default=1.0, help="Delay per stub model item")
+    parser.add_argument("--intra-op-threads", type=int, default=None, help="torch intra-op threads per model-owning process")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--ready-timeout", type=float, default=600, help="Seconds to wait for the model server to load")
+    args = parser.parse_args()
+
+    import synthetic_queries
+
+    queries = [query.query for query in synthetic_queries.generate_queries(args.workers * args.requests, seed=0)]
+    print(f"{args.workers} workers x {args.requests} queries, {args.concurrency} concurrent per worker, {args.models} models")
+    print(f"{'mode':<13}{'per s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'workers MB':>12}{'server MB':>11}{'total MB':>10}")
+    for mode in args.modes:
+        summary = run_mode(mode, args, queries)
+        print(f"{mode:<13}{summary['throughput_per_s']:>9.1f}{summary['p50_ms']:>9.2f}{summary['p95_ms']:>9.2f}"
+              f"{summary['p99_ms']:>9.2f}{summary['worker_memory_mb']:>12.1f}{summary['server_memory_mb']:>11.1f}"
+              f"{summary['total_memory_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
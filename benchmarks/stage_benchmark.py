@@ -0,0 +1,198 @@
+# benchmarks/stage_benchmark.py
+"""
+Times each stage of the /calculate pipeline separately -- intent classification, entity
+extraction (and the QA calls inside it), number parsing, the calculator call and template
+rendering -- over the question CSV plus generated queries, and reports p50/p95/p99 latency,
+throughput and peak resident memory per stage.
+
+By default the models are replaced with the deterministic stubs in benchmarks.stub_models, so the
+suite runs offline in seconds and tracks the cost of the code around the models; pass --models real
+to time the transformers pipelines. The rule-based fast path is disabled unless --fast-path is given,
+so every query goes through the model stages.
+
+Save a baseline once and compare later runs against it; the script exits with status 1 when a
+stage's p95 regresses by more than --threshold:
+    python -m benchmarks.stage_benchmark --save-baseline benchmarks/stage_baseline.json
+    python -m benchmarks.stage_benchmark --baseline benchmarks/stage_baseline.json [--threshold 0.2]
+"""
+import argparse
+import json
+import sys
+import time
+
+import nlp_service
+import pipeline
+import query_cache
+import question_dataset
+import rule_extractor
+import synthetic_queries
+from benchmarks.common import summarize_latencies
+from benchmarks.stub_models import StubIntentClassifier, StubQAPipeline
+
+STAGES = ["intent", "entity_extraction", "qa_call", "number_parsing", "calculation", "render"]
+
+
+class TimedQAPipeline:
+    """
+    Wraps a QA pipeline, recording the latency of every call and the answers it returns.
+    """
+
+    def __init__(self, qa_pipeline):
+        self.qa_pipeline = qa_pipeline
+        self.latencies = []
+        self.answers = []
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        results = self.qa_pipeline(*args, **kwargs)
+        self.latencies.append(time.perf_counter() - start)
+        for result in [results] if isinstance(results, dict) else results:
+            self.answers.append(result["answer"])
+        return results
+
+
+def load_queries(csv_path, n_synthetic, seed):
+    queries = [row["question"] for row in question_dataset.iter_rows(csv_path) if row["question"]]
+    queries.extend(query.query for query in synthetic_queries.generate_queries(n_synthetic, seed=seed))
+    return queries
+
+
+def install_models(kind, stub_latency_ms):
+    """
+    Installs the stub models (or loads the real ones) and wraps the QA pipeline for timing.
+    """
+    if kind == "stub":
+        nlp_service.set_models(
+            intent_classifier=StubIntentClassifier(nlp_service.INTENT_LABEL_TO_KEY_MAP, latency_ms=stub_latency_ms),
+            qa_pipeline=StubQAPipeline(latency_ms=stub_latency_ms))
+    else:
+        nlp_service.get_intent_classifier()
+    timed_qa = TimedQAPipeline(nlp_service.get_qa_pipeline())
+    nlp_service.set_models(qa_pipeline=timed_qa)
+    return timed_qa
+
+
+def run_stages(queries, timed_qa, repeat):
+    """
+    Runs every query through the pipeline stage by stage.
+    :return: dict mapping stage name to a list of latencies in seconds
+    """
+    from flask import render_template
+
+    import app
+
+    latencies = {stage: [] for stage in STAGES}
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            intent_key, intent_confidence = nlp_service.get_intent(query)
+            latencies["intent"].append(time.perf_counter() - start)
+
+            answers_before = len(timed_qa.answers)
+            start = time.perf_counter()
+            entities, error_message = nlp_service.extract_entities(query, intent_key)
+            latencies["entity_extraction"].append(time.perf_counter() - start)
+
+            # Parsing is timed again on its own, on the answers QA returned for this query
+            for answer in timed_qa.answers[answers_before:]:
+                start = time.perf_counter()
+                nlp_service.parse_numerical_value(answer)
+                latencies["number_parsing"].append(time.perf_counter() - start)
+
+            response = pipeline.answer_query(query, (intent_key, intent_confidence, entities, error_message))
+            if entities and not error_message:
+                start = time.perf_counter()
+                pipeline.run_calculation(intent_key, entities)
+                latencies["calculation"].append(time.perf_counter() - start)
+
+            with app.app.test_request_context():
+                start = time.perf_counter()
+                render_template("index.html", query=query, result_text=response["result_text"],
+                                calculation_details=response["calculation_details"])
+                latencies["render"].append(time.perf_counter() - start)
+
+    latencies["qa_call"] = list(timed_qa.latencies)
+    return latencies
+
+
+def compare_to_baseline(report, baseline, threshold, min_delta_ms):
+    """
+    :return: List of messages, one per stage whose p95 regressed beyond the threshold
+    """
+    regressions = []
+    for stage, baseline_summary in baseline["stages"].items():
+        current = report["stages"].get(stage)
+        if not current or not baseline_summary["count"]:
+            continue
+        allowed = max(baseline_summary["p95_ms"] * (1 + threshold), baseline_summary["p95_ms"] + min_delta_ms)
+        if current["p95_ms"] > allowed:
+            regressions.append(f"{stage}: p95 {current['p95_ms']:.3f} ms vs baseline {baseline_summary['p95_ms']:.3f} ms "
+                               f"(allowed {allowed:.3f} ms)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency benchmark of the query pipeline.")
+    parser.add_argument("--csv", default=question_dataset.DEFAULT_CSV_PATH, help="Question/answer CSV file")
+    parser.add_argument("--synthetic", type=int, default=200, help="Generated queries added to the CSV questions")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated queries")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the query set")
+    parser.add_argument("--models", choices=["stub", "real"], default="stub", help="Stub models (offline) or the real pipelines")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Delay per stub model item, to mimic inference cost")
+    parser.add_argument("--fast-path", action="store_true", help="Keep the rule-based fast path enabled")
+    parser.add_argument("--save-baseline", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a baseline JSON file; exit 1 on a p95 regression")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative p95 increase over the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05,
+                        help="Allowed absolute p95 increase, so sub-millisecond stages don't fail on timer noise")
+    args = parser.parse_args()
+
+    if not args.fast_path:
+        rule_extractor.RULE_CONFIDENCE_THRESHOLD = float("inf")
+    # Measure the calculator itself rather than cache lookups
+    query_cache.calculation_cache.max_entries = 0
+    query_cache.calculation_cache.clear()
+
+    queries = load_queries(args.csv, args.synthetic, args.seed)
+    timed_qa = install_models(args.models, args.stub_latency_ms)
+    # One untimed pass over a few queries, so lazy imports and template compilation aren't counted
+    run_stages(queries[:5], timed_qa, repeat=1)
+    timed_qa.latencies.clear()
+    timed_qa.answers.clear()
+
+    latencies = run_stages(queries, timed_qa, args.repeat)
+    report = {
+        "models": args.models,
+        "fast_path": args.fast_path,
+        "queries": len(queries),
+        "repeat": args.repeat,
+        "peak_rss_mb": nlp_service.rss_mb(peak=True),
+        "stages": {stage: summarize_latencies(latencies[stage]) for stage in STAGES},
+    }
+
+    print(f"{len(queries)} queries x {args.repeat} passes, {args.models} models, "
+          f"fast path {'on' if args.fast_path else 'off'}, peak RSS {report['peak_rss_mb']:.1f} MB")
+    print(f"{'stage':<20}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'per s':>12}")
+    for stage, summary in report["stages"].items():
+        print(f"{stage:<20}{summary['count']:>8}{summary['p50_ms']:>10.3f}{summary['p95_ms']:>10.3f}"
+              f"{summary['p99_ms']:>10.3f}{summary['throughput_per_s']:>12.1f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f_baseline:
+            json.dump(report, f_baseline, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f_baseline:
+            baseline = json.load(f_baseline)
+        regressions = compare_to_baseline(report, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print("p95 regressions against the baseline:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print("No p95 regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# benchmarks/stub_models.py
+"""
+Deterministic stand-ins for the transformers pipelines, so the stage benchmarks run offline and
+measure the code around the models rather than model inference. Install them with
+nlp_service.set_models(...). Both are call-compatible with the pipelines they replace and can
+add a fixed per-item delay to approximate a real model's cost.
+"""
+import re
+import time
+
+import rule_extractor
+
+_WORD = re.compile(r"[a-z]+")
+
+
+def _words(text):
+    return set(_WORD.findall(text.lower()))
+
+
+class StubIntentClassifier:
+    """
+    Replaces the zero-shot pipeline. Labels are scored by the rule_extractor intent keywords,
+    then by word overlap between the query and the label.
+    """
+
+    def __init__(self, label_to_key, latency_ms=0.0):
+        """
+        :param label_to_key: Mapping from readable labels to intent keys (INTENT_LABEL_TO_KEY_MAP)
+        :param latency_ms: Delay added per (sequence, label) pair, mimicking one NLI forward pass each
+        """
+        self.label_to_key = label_to_key
+        self.latency_ms = latency_ms
+
+    def _classify_one(self, sequence, candidate_labels):
+        sequence_words = _words(sequence)
+        raw_scores = []
+        for label in candidate_labels:
+            pattern = rule_extractor.INTENT_PATTERNS.get(self.label_to_key.get(label))
+            keyword_hit = 2.0 if pattern is not None and pattern.search(sequence) else 0.0
+            label_words = _words(label) - {"calculate", "show"}
+            overlap = len(sequence_words & label_words) / len(label_words) if label_words else 0.0
+            raw_scores.append(keyword_hit + overlap + 0.01)
+        total = sum(raw_scores)
+        ranked = sorted(zip(candidate_labels, (score / total for score in raw_scores)),
+                        key=lambda pair: pair[1], reverse=True)
+        return {
+            "sequence": sequence,
+            "labels": [label for label, _score in ranked],
+            "scores": [score for _label, score in ranked],
+        }
+
+    def __call__(self, sequences, candidate_labels, multi_label=False, **kwargs):
+        single = isinstance(sequences, str)
+        sequences = [sequences] if single else list(sequences)
+        if self.latency_ms:
+            time.sleep(self.latency_ms * len(sequences) * len(candidate_labels) / 1000)
+        results = [self._classify_one(sequence, candidate_labels) for sequence in sequences]
+        return results[0] if single else results
+
+
+class StubQAPipeline:
+    """
+    Replaces the question-answering pipeline. The answer span is the first match, in the context,
+    of the rule_extractor pattern that fits the question's wording.
+    """
+
+    def __init__(self, latency_ms=0.0):
+        """
+        :param latency_ms: Delay added per (question, context) pair
+        """
+        self.latency_ms = latency_ms
+
+    @staticmethod
+    def _pattern_for(question):
+        question = question.lower()
+        if "cash flow" in question:
+            return rule_extractor.CASHFLOW_LIST_PATTERN
+        if "initial investment" in question or "upfront" in question:
+            return rule_extractor.INITIAL_INVESTMENT_PATTERN
+        if "compounded" in question:
+            return rule_extractor.COMPOUNDING_COUNT_PATTERN
+        if "rate" in question or "percent" in question:
+            return rule_extractor.RATE_PATTERN
+        if any(word in question for word in ("month", "year", "period")):
+            return rule_extractor.DURATION_PATTERN
+        return rule_extractor.MONEY_PATTERN
+
+    def _answer_one(self, question, context):
+        match = self._pattern_for(question).search(context)
+        if not match:
+            return {"answer": "", "score": 0.0, "start": 0, "end": 0}
+        # Prefer the span of the pattern's value group, as a QA model would return "$1,000" rather than the phrase
+        group = next((name for name in ("list", "amount", "amount2", "num") if match.groupdict().get(name)), 0)
+        start, end = match.span(group)
+        return {"answer": context[start:end], "score": 0.9, "start": start, "end": end}
+
+    def __call__(self, question, context, batch_size=None, **kwargs):
+        single = isinstance(question, str)
+        questions = [question] if single else list(question)
+        contexts = [context] * len(questions) if isinstance(context, str) else list(context)
+        if self.latency_ms:
+            time.sleep(self.latency_ms * len(questions) / 1000)
+        results = [self._answer_one(q, c) for q, c in zip(questions, contexts)]
+        return results[0] if single else results
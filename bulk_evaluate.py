@@ -0,0 +1,247 @@
+# bulk_evaluate.py
+"""
+Offline bulk evaluation of question/answer CSV files (Calculation, Question, Answer columns,
+as in financial_questions_and_answers.csv) through the nlp_service + calculator pipeline.
+
+Rows are streamed from the input and results are written incrementally, so memory stays
+constant regardless of file size. Work is spread over a process pool in which every worker
+loads its own copy of the models once.
+
+Usage:
+    python bulk_evaluate.py queries.csv --output results.csv --workers 4
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import question_dataset
+
+STAGES = ("intent", "entities", "calculation")
+
+OUTPUT_FIELDS = [
+    "calculation", "question", "expected_answer", "expected_intent",
+    "predicted_intent", "intent_confidence", "entities", "result", "result_text",
+    "intent_match", "answer_match", "intent_ms", "entities_ms", "calculation_ms",
+]
+
+
+def _init_worker():
+    # Each worker process holds one copy of the models, loaded before it takes any rows
+    import nlp_service
+    nlp_service.warmup()
+
+
+def _evaluate_row(row, abs_tolerance, rel_tolerance):
+    import nlp_service
+    import pipeline
+
+    timings = {}
+    start = time.perf_counter()
+    if nlp_service.NLP_MODE == "joint":
+        # One forward pass gives both stages, so its time is counted as intent, as in nlp_service's metrics
+        intent_key, intent_confidence, entities, error_message = nlp_service.analyze_query(row["question"])
+        timings["intent"] = time.perf_counter() - start
+    else:
+        intent_key, intent_confidence = nlp_service.get_intent(row["question"])
+        timings["intent"] = time.perf_counter() - start
+        entities, error_message = None, None
+        if intent_key:
+            start = time.perf_counter()
+            entities, error_message = nlp_service.extract_entities(row["question"], intent_key)
+            timings["entities"] = time.perf_counter() - start
+
+    numeric_result = None
+    result_text = "Error: Could not understand your request. Please try rephrasing."
+    if intent_key:
+        if error_message:
+            result_text = f"Error extracting parameters: {error_message}"
+        elif not entities:
+            result_text = "Error: Could not extract necessary values from your query."
+        else:
+            start = time.perf_counter()
+            numeric_result, result_text, _details = pipeline.run_calculation(intent_key, entities)
+            timings["calculation"] = time.perf_counter() - start
+
+    expected_amount = question_dataset.parse_answer_amount(row["answer"])
+    answer_match = None
+    if expected_amount is not None:
+        tolerance = max(abs_tolerance, rel_tolerance * abs(expected_amount))
+        answer_match = numeric_result is not None and abs(numeric_result - expected_amount) <= tolerance
+
+    return {
+        "calculation": row["calculation"],
+        "question": row["question"],
+        "expected_answer": row["answer"],
+        "expected_intent": row["expected_intent"] or "",
+        "predicted_intent": intent_key or "",
+        "intent_confidence": f"{intent_confidence:.4f}",
+        "entities": json.dumps(entities, sort_keys=True) if entities else "",
+        "result": "" if numeric_result is None else f"{numeric_result:.2f}",
+        "result_text": result_text,
+        "intent_match": "" if not row["expected_intent"] else intent_key == row["expected_intent"],
+        "answer_match": "" if answer_match is None else answer_match,
+        "intent_ms": f"{1000 * timings.get('intent', 0.0):.3f}",
+        "entities_ms": f"{1000 * timings.get('entities', 0.0):.3f}",
+        "calculation_ms": f"{1000 * timings.get('calculation', 0.0):.3f}",
+        "_timings": timings,
+    }
+
+
+def evaluate_chunk(rows, abs_tolerance, rel_tolerance):
+    """
+    Evaluates a chunk of rows in a worker process.
+    """
+    return [_evaluate_row(row, abs_tolerance, rel_tolerance) for row in rows]
+
+
+def _iter_chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class EvaluationReport:
+    """
+    Running totals for the accuracy and throughput report, updated one result at a time.
+    """
+    def __init__(self):
+        self.rows = 0
+        self.intent_total = 0
+        self.intent_correct = 0
+        self.answer_total = 0
+        self.answer_correct = 0
+        self.stage_seconds = {stage: 0.0 for stage in STAGES}
+        self.stage_counts = {stage: 0 for stage in STAGES}
+
+    def add(self, result):
+        self.rows += 1
+        if result["intent_match"] != "":
+            self.intent_total += 1
+            self.intent_correct += bool(result["intent_match"])
+        if result["answer_match"] != "":
+            self.answer_total += 1
+            self.answer_correct += bool(result["answer_match"])
+        for stage, seconds in result["_timings"].items():
+            self.stage_seconds[stage] += seconds
+            self.stage_counts[stage] += 1
+
+    def summary(self, wall_seconds):
+        return {
+            "rows": self.rows,
+            "intent_accuracy": self.intent_correct / self.intent_total if self.intent_total else None,
+            "intent_evaluated": self.intent_total,
+            "answer_accuracy": self.answer_correct / self.answer_total if self.answer_total else None,
+            "answer_evaluated": self.answer_total,
+            "wall_seconds": wall_seconds,
+            "rows_per_second": self.rows / wall_seconds if wall_seconds else 0.0,
+            "stages": {
+                stage: {
+                    "calls": self.stage_counts[stage],
+                    "total_seconds": self.stage_seconds[stage],
+                    "mean_ms": 1000 * self.stage_seconds[stage] / self.stage_counts[stage] if self.stage_counts[stage] else 0.0,
+                }
+                for stage in STAGES
+            },
+        }
+
+
+def _print_summary(summary, file=sys.stdout):
+    def pct(value):
+        return "n/a" if value is None else f"{value:.1%}"
+
+    print(f"Rows evaluated:   {summary['rows']}", file=file)
+    print(f"Intent accuracy:  {pct(summary['intent_accuracy'])} ({summary['intent_evaluated']} rows with a known Calculation)", file=file)
+    print(f"Answer accuracy:  {pct(summary['answer_accuracy'])} ({summary['answer_evaluated']} rows with a numeric Answer)", file=file)
+    print(f"Throughput:       {summary['rows_per_second']:.2f} rows/s over {summary['wall_seconds']:.1f}s", file=file)
+    for stage, stats in summary["stages"].items():
+        print(f"  {stage:<12} {stats['calls']:>8} calls  {stats['mean_ms']:>9.2f} ms mean  {stats['total_seconds']:>9.2f} s total", file=file)
+
+
+def run(input_path, output_path, workers, chunk_size, abs_tolerance, rel_tolerance, max_rows=None):
+    """
+    Streams input_path through the pipeline and writes one output row per input row, in input order.
+    :return: Summary dict for the accuracy and throughput report
+    """
+    rows = question_dataset.iter_rows(input_path)
+    if max_rows is not None:
+        rows = itertools.islice(rows, max_rows)
+    chunks = _iter_chunks(rows, chunk_size)
+    report = EvaluationReport()
+
+    output_file = open(output_path, "w", newline="", encoding="utf-8") if output_path else sys.stdout
+    try:
+        writer = csv.DictWriter(output_file, fieldnames=OUTPUT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+
+        def write_results(results):
+            for result in results:
+                report.add(result)
+                writer.writerow(result)
+            output_file.flush()
+
+        start = time.perf_counter()
+        if workers <= 0:
+            # In-process mode, handy for debugging
+            _init_worker()
+            for chunk in chunks:
+                write_results(evaluate_chunk(chunk, abs_tolerance, rel_tolerance))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+                # Keep a bounded number of chunks in flight so memory doesn't grow with the input size,
+                # and write them back in submission order.
+                in_flight = deque()
+                max_in_flight = workers * 2
+                for chunk in chunks:
+                    in_flight.append(executor.submit(evaluate_chunk, chunk, abs_tolerance, rel_tolerance))
+                    if len(in_flight) >= max_in_flight:
+                        write_results(in_flight.popleft().result())
+                while in_flight:
+                    write_results(in_flight.popleft().result())
+        wall_seconds = time.perf_counter() - start
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+
+    return report.summary(wall_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a question/answer CSV through the NLP calculator pipeline.")
+    parser.add_argument("input", nargs="?", default=question_dataset.DEFAULT_CSV_PATH,
+                        help="CSV with Calculation, Question and Answer columns")
+    parser.add_argument("--output", "-o", help="Where to write per-row results (CSV). Defaults to stdout.")
+    parser.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes, each with its own model copy (0 = run in this process)")
+    parser.add_argument("--chunk-size", type=int, default=32, help="Rows sent to a worker per task")
+    parser.add_argument("--abs-tolerance", type=float, default=0.01,
+                        help="Absolute tolerance when comparing results to the expected Answer")
+    parser.add_argument("--rel-tolerance", type=float, default=0.0,
+                        help="Relative tolerance when comparing results to the expected Answer")
+    parser.add_argument("--max-rows", type=int, help="Only evaluate the first N rows")
+    parser.add_argument("--report-json", help="Also write the summary report to this JSON file")
+    args = parser.parse_args()
+
+    summary = run(args.input, args.output, args.workers, args.chunk_size,
+                  args.abs_tolerance, args.rel_tolerance, max_rows=args.max_rows)
+
+    # Keep the report off stdout when results are being streamed there
+    _print_summary(summary, file=sys.stdout if args.output else sys.stderr)
+
+    if args.report_json:
+        with open(args.report_json, "w") as f_report:
+            json.dump(summary, f_report, indent=2)
+
+
+if __name__ == "__main__":
+    main()
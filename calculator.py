@@ -1,6 +1,8 @@
 # calculator.py
 import math
 
+import vectorized_calculator
+
 def present_value(fv, rate, n_periods):
     """
     Calculates the present value.
@@ -66,11 +68,31 @@ def loan_amortization_payment(principal, annual_rate, n_months):
     payment = principal * (monthly_rate * ((1 + monthly_rate) ** n_months)) / (((1 + monthly_rate) ** n_months) - 1)
     return payment
 
-# You can add more functions here like NPV, IRR, Annuities etc.
-# For NPV and IRR, you'd need to handle lists of cashflows.
+# Longest term accepted for an amortization schedule (100 years)
+MAX_TERM_MONTHS = 1200
+
+def loan_amortization_summary(principal, annual_rate, n_months):
+    """
+    Summarises a fully amortizing loan.
+    :param principal: Loan principal amount
+    :param annual_rate: Annual interest rate (as a decimal, e.g., 0.05 for 5%)
+    :param n_months: Total number of months for the loan (at most MAX_TERM_MONTHS)
+    :return: dict with the monthly payment, total amount paid and total interest paid
+    """
+    if n_months > MAX_TERM_MONTHS:
+        raise ValueError(f"Loan term cannot exceed {MAX_TERM_MONTHS} months ({MAX_TERM_MONTHS // 12} years).")
+    payment = loan_amortization_payment(principal, annual_rate, n_months)
+    total_paid = payment * n_months
+    return {
+        "monthly_payment": payment,
+        "total_paid": total_paid,
+        "total_interest": total_paid - principal,
+    }
+
+# You can add more functions here like Annuities etc.
+# NPV and IRR work on lists of cashflows; the batched versions live in vectorized_calculator.
+# These plain-Python versions are for a single series, where NumPy's per-call overhead would dominate.
 
-# Example: (Not used by the initial app.py but good to have)
-import numpy as np # Add numpy to requirements.txt if you use this
 def net_present_value(rate, cashflows):
     """
     Calculates Net Present Value.
@@ -78,14 +100,77 @@ def net_present_value(rate, cashflows):
     :param cashflows: A list of cashflows (the first can be negative for initial investment)
     :return: NPV
     """
+    if rate <= -1:
+        raise ValueError(vectorized_calculator.ERROR_MESSAGES[vectorized_calculator.INVALID_DISCOUNT_RATE])
     return sum(cf / (1 + rate) ** i for i, cf in enumerate(cashflows))
 
-def internal_rate_of_return(cashflows):
+def _npv_and_derivative(rate, cashflows):
+    # NPV and dNPV/drate at rate, by Horner's rule in v = 1 / (1 + rate)
+    discount = 1 / (1 + rate)
+    value = 0.0
+    derivative = 0.0
+    for cf in reversed(cashflows):
+        derivative = derivative * discount + value
+        value = value * discount + cf
+    return value, derivative * -(discount ** 2)
+
+def _count_sign_changes(values):
+    changes = 0
+    previous = 0
+    for value in values:
+        if value:
+            changes += previous != 0 and (value > 0) != (previous > 0)
+            previous = value
+    return changes
+
+# Same search range and scan grid as vectorized_calculator.internal_rate_of_return
+_IRR_SCAN_RATES = vectorized_calculator.IRR_SCAN_RATES.tolist()
+
+def internal_rate_of_return(cashflows, guess=vectorized_calculator.IRR_GUESS, tol=1e-10, max_iter=100):
     """
-    Calculates Internal Rate of Return. Requires numpy.
-    :param cashflows: A list of cashflows
-    :return: IRR
+    Calculates Internal Rate of Return with Newton steps inside a bracket, falling back to bisection
+    (the single-series version of vectorized_calculator.internal_rate_of_return).
+    If the cashflows have several IRRs, the one closest to guess (10% by default) is returned.
+    :param cashflows: A list of cashflows (the first is usually negative for the initial investment)
+    :return: IRR per period (as a decimal)
     """
-    # Ensure numpy is installed and imported if this function is used.
-    # return np.irr(cashflows)
-    pass # Placeholder if numpy not yet a requirement
\ No newline at end of file
+    cashflows = [float(cf) for cf in cashflows]
+    sign_changes = _count_sign_changes(cashflows)
+    if sign_changes == 0:
+        raise ValueError(vectorized_calculator.ERROR_MESSAGES[vectorized_calculator.NO_SIGN_CHANGE])
+
+    low, high = _IRR_SCAN_RATES[0], _IRR_SCAN_RATES[-1]
+    rate = min(max(guess, low), high)
+    if sign_changes > 1:
+        # Several IRRs are possible: bracket the NPV crossing of the scan grid nearest the guess
+        scan_npv = [_npv_and_derivative(scan_rate, cashflows)[0] for scan_rate in _IRR_SCAN_RATES]
+        crossings = [i for i in range(len(scan_npv) - 1)
+                     if scan_npv[i] * scan_npv[i + 1] < 0 or scan_npv[i] == 0]
+        if not crossings:
+            raise ValueError(vectorized_calculator.ERROR_MESSAGES[vectorized_calculator.IRR_NOT_FOUND])
+        i = min(crossings, key=lambda i: abs((_IRR_SCAN_RATES[i] + _IRR_SCAN_RATES[i + 1]) / 2 - guess))
+        low, high = _IRR_SCAN_RATES[i], _IRR_SCAN_RATES[i + 1]
+        rate = (low + high) / 2
+
+    f_low = _npv_and_derivative(low, cashflows)[0]
+    f_high = _npv_and_derivative(high, cashflows)[0]
+    if f_low == 0:
+        return low
+    if (f_low > 0) == (f_high > 0) and f_high != 0:
+        raise ValueError(vectorized_calculator.ERROR_MESSAGES[vectorized_calculator.IRR_NOT_FOUND])
+
+    for _ in range(max_iter):
+        f, df = _npv_and_derivative(rate, cashflows)
+        if f == 0:
+            return rate
+        # Shrink the bracket around the root using the sign of NPV at the current rate
+        if (f > 0) == (f_low > 0):
+            low, f_low = rate, f
+        else:
+            high = rate
+        newton = rate - f / df if df else math.nan
+        new_rate = newton if math.isfinite(newton) and low < newton < high else (low + high) / 2
+        if abs(new_rate - rate) <= tol * max(1.0, abs(rate)):
+            return new_rate
+        rate = new_rate
+    raise ValueError(vectorized_calculator.ERROR_MESSAGES[vectorized_calculator.IRR_NOT_FOUND])
@@ -0,0 +1,85 @@
+# embedding_classifier.py
+"""
+Embedding-based intent classifier.
+Label descriptions and example phrasings are embedded once when the classifier is built;
+each query then costs one encoder pass plus a cosine-similarity matrix product,
+instead of one NLI pass per candidate label as with zero-shot classification.
+"""
+import numpy as np
+
+# Sentence-embedding model used to encode both the examples and the queries.
+DEFAULT_EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Softmax temperature applied to the per-intent cosine similarities to turn them into a confidence.
+# Cosine similarities between related sentences sit in a narrow band, so this is well below 1.
+SIMILARITY_TEMPERATURE = 0.05
+
+
+class EmbeddingIntentClassifier:
+    def __init__(self, intent_examples, model_name=DEFAULT_EMBEDDING_MODEL_NAME, batch_size=32):
+        """
+        :param intent_examples: dict of intent key -> list of label descriptions / example phrasings
+        :param model_name: Hugging Face model used as the sentence encoder
+        :param batch_size: Number of texts encoded per forward pass
+        """
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        self._torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name)
+        self.model.eval()
+        self.batch_size = batch_size
+
+        self.intent_keys = list(intent_examples)
+        example_texts = []
+        example_owners = []
+        for intent_index, intent_key in enumerate(self.intent_keys):
+            for text in intent_examples[intent_key]:
+                example_texts.append(text)
+                example_owners.append(intent_index)
+
+        # (n_examples, dim) matrix of unit vectors, computed once
+        self.example_embeddings = self.embed(example_texts)
+        self.example_owners = np.array(example_owners)
+
+    def embed(self, texts):
+        """
+        Encodes texts into L2-normalised sentence vectors using attention-masked mean pooling.
+        :return: float32 array of shape (len(texts), dim)
+        """
+        chunks = []
+        with self._torch.no_grad():
+            for start in range(0, len(texts), self.batch_size):
+                batch = self.tokenizer(texts[start:start + self.batch_size], padding=True,
+                                       truncation=True, return_tensors="pt")
+                token_embeddings = self.model(**batch).last_hidden_state
+                mask = batch["attention_mask"].unsqueeze(-1).to(token_embeddings.dtype)
+                pooled = (token_embeddings * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+                chunks.append(pooled.numpy())
+        embeddings = np.concatenate(chunks).astype(np.float32)
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    def classify(self, queries):
+        """
+        Classifies a batch of queries.
+        :param queries: List of query strings
+        :return: List of (intent_key, confidence) tuples, one per query
+        """
+        if not queries:
+            return []
+        similarities = self.embed(queries) @ self.example_embeddings.T # (n_queries, n_examples)
+
+        # Score each intent by its closest example
+        intent_scores = np.full((len(queries), len(self.intent_keys)), -np.inf, dtype=np.float32)
+        for intent_index in range(len(self.intent_keys)):
+            owned = self.example_owners == intent_index
+            intent_scores[:, intent_index] = similarities[:, owned].max(axis=1)
+
+        logits = intent_scores / SIMILARITY_TEMPERATURE
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+
+        best = probabilities.argmax(axis=1)
+        return [(self.intent_keys[index], float(probabilities[row, index])) for row, index in enumerate(best)]
@@ -0,0 +1,146 @@
+# inference_backends.py
+"""
+Ways of running the transformers pipelines on CPU, selected with INFERENCE_BACKEND:
+* torch: full-precision PyTorch (default).
+* int8: PyTorch with dynamic int8 quantization of the Linear layers.
+* onnx: the same checkpoint exported to ONNX and run with ONNX Runtime.
+* onnx_int8: the ONNX export with ONNX Runtime dynamic int8 quantization.
+The ONNX backends need optimum[onnxruntime], which is only imported when they are selected.
+Quantized and exported models are cached under INFERENCE_CACHE_DIR, so only the first startup
+pays for the conversion. Every backend returns a regular transformers pipeline, so callers
+don't change.
+"""
+import inspect
+import os
+import shutil
+import tempfile
+
+INFERENCE_BACKENDS = ("torch", "int8", "onnx", "onnx_int8")
+
+INFERENCE_CACHE_DIR = os.environ.get(
+    "INFERENCE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "financial_nlp_calculator"))
+
+# Model classes holding the task head, per pipeline task
+_TORCH_MODEL_CLASSES = {
+    "zero-shot-classification": "AutoModelForSequenceClassification",
+    "question-answering": "AutoModelForQuestionAnswering",
+}
+_ORT_MODEL_CLASSES = {
+    "zero-shot-classification": "ORTModelForSequenceClassification",
+    "question-answering": "ORTModelForQuestionAnswering",
+}
+
+_INT8_FILE_NAME = "model.pt"
+_ONNX_FILE_NAME = "model.onnx"
+_ONNX_INT8_FILE_NAME = "model_quantized.onnx"
+
+
+def artifact_dir(model_name, backend):
+    """
+    Directory holding the cached artifacts of model_name for backend.
+    """
+    return os.path.join(INFERENCE_CACHE_DIR, backend, model_name.replace("/", "--"))
+
+
+def _build_atomically(target_dir, build):
+    """
+    Calls build(directory) on a temporary directory next to target_dir and moves it into place,
+    so concurrent startups never load a half-written artifact. If another process finished
+    first, its artifact is kept.
+    """
+    os.makedirs(os.path.dirname(target_dir), exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=".building-", dir=os.path.dirname(target_dir))
+    try:
+        build(work_dir)
+        try:
+            os.replace(work_dir, target_dir)
+        except OSError:
+            if not os.path.isdir(target_dir):
+                raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _load_int8_model(task, model_name):
+    """
+    Returns the model for task with its Linear layers dynamically quantized to int8,
+    from the cache if it was quantized before.
+    """
+    import torch
+    import transformers
+
+    cache_dir = artifact_dir(model_name, "int8")
+    cached_path = os.path.join(cache_dir, _INT8_FILE_NAME)
+    # The cache holds a pickled module, which newer torch versions only load with weights_only=False
+    load_kwargs = {"weights_only": False} if "weights_only" in inspect.signature(torch.load).parameters else {}
+    if os.path.exists(cached_path):
+        try:
+            model = torch.load(cached_path, **load_kwargs)
+            model.eval()
+            return model
+        except Exception as e:
+            print(f"Ignoring unreadable cached int8 model {cached_path}: {e}")
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    model = getattr(transformers, _TORCH_MODEL_CLASSES[task]).from_pretrained(model_name)
+    model.eval()
+    quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    _build_atomically(cache_dir, lambda work_dir: torch.save(quantized, os.path.join(work_dir, _INT8_FILE_NAME)))
+    return quantized
+
+
+def _load_onnx_model(task, model_name, quantize):
+    """
+    Returns an ONNX Runtime model for task, exporting (and optionally quantizing) the checkpoint
+    into the cache on first use.
+    """
+    try:
+        import optimum.onnxruntime as onnxruntime_models
+    except ImportError as e:
+        raise ImportError("The onnx inference backends need optimum with ONNX Runtime: "
+                          "pip install 'optimum[onnxruntime]'") from e
+    model_class = getattr(onnxruntime_models, _ORT_MODEL_CLASSES[task])
+
+    export_dir = artifact_dir(model_name, "onnx")
+    if not os.path.exists(os.path.join(export_dir, _ONNX_FILE_NAME)):
+        print(f"Exporting {model_name} to ONNX in {export_dir}")
+        _build_atomically(export_dir, lambda work_dir: model_class.from_pretrained(model_name, export=True).save_pretrained(work_dir))
+    if not quantize:
+        return model_class.from_pretrained(export_dir, file_name=_ONNX_FILE_NAME)
+
+    quantized_dir = artifact_dir(model_name, "onnx_int8")
+    if not os.path.exists(os.path.join(quantized_dir, _ONNX_INT8_FILE_NAME)):
+        from optimum.onnxruntime import ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        print(f"Quantizing the ONNX export of {model_name} in {quantized_dir}")
+        # Dynamic quantization computes activation ranges at run time, so no calibration data is needed
+        quantization_config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+
+        def quantize_into(work_dir):
+            ORTQuantizer.from_pretrained(export_dir, file_name=_ONNX_FILE_NAME).quantize(
+                save_dir=work_dir, quantization_config=quantization_config)
+            # Keep the config and tokenizer files alongside, so the directory loads on its own
+            for file_name in os.listdir(export_dir):
+                if not file_name.endswith(".onnx") and not os.path.exists(os.path.join(work_dir, file_name)):
+                    shutil.copy2(os.path.join(export_dir, file_name), work_dir)
+
+        _build_atomically(quantized_dir, quantize_into)
+    return model_class.from_pretrained(quantized_dir, file_name=_ONNX_INT8_FILE_NAME)
+
+
+def build_pipeline(task, model_name, backend="torch"):
+    """
+    Builds a transformers pipeline for task running model_name on the given backend.
+    """
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Choose one of: {', '.join(INFERENCE_BACKENDS)}.")
+    from transformers import AutoTokenizer, pipeline
+
+    if backend == "torch":
+        return pipeline(task, model=model_name)
+    if backend == "int8":
+        model = _load_int8_model(task, model_name)
+    else:
+        model = _load_onnx_model(task, model_name, quantize=backend == "onnx_int8")
+    return pipeline(task, model=model, tokenizer=AutoTokenizer.from_pretrained(model_name))
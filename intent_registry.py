@@ -0,0 +1,316 @@
+# intent_registry.py
+"""
+The single list of intents the calculator understands. Each IntentSpec holds an intent's readable
+label, its group, prefilter keywords, rule fast-path keywords and slot map, QA parameter questions,
+calculator function, example phrasings, synthetic-query lead-ins and CSV calculation names.
+nlp_service's CANDIDATE_INTENTS_LABELS, INTENT_LABEL_TO_KEY_MAP, INTENT_CONFIG and INTENT_EXAMPLES,
+rule_extractor's INTENT_PATTERNS and INTENT_SLOTS, synthetic_queries' INTENT_PHRASES and
+question_dataset's CALCULATION_TO_INTENT_KEY are all derived from it, so adding an intent means
+adding one entry here (plus a synthetic_queries.PARAMETER_TEMPLATES entry for any new parameter name,
+which is checked when synthetic_queries is imported).
+
+candidate_labels(query) narrows the labels the zero-shot classifier scores (one NLI forward pass
+per label) to the groups the query's wording points at, and returns the full set when it can't tell.
+"""
+import os
+import re
+from collections import namedtuple
+
+IntentSpec = namedtuple("IntentSpec", [
+    "key", "label", "group", "keywords", "rule_keywords", "slots", "parameters", "required_params", "list_params",
+    "calculator_function_name", "examples", "lead_phrases", "csv_calculations",
+])
+
+# Slot kinds rule_extractor.find_slots can fill; IntentSpec.slots maps each to a parameter name
+SLOT_KINDS = ("rate", "money", "duration", "frequency", "initial", "cashflows")
+
+# Intents are grouped with the intents they are most easily confused with. A keyword match selects
+# the whole group, so the classifier still separates e.g. simple from compound interest.
+# Keywords must be phrases only that intent's queries use: a broad word ("today", "payments",
+# "returns") in a query about another group would leave the true intent out of the scored labels.
+# rule_keywords are the rule fast path's: a match there settles the intent without any model, so they
+# may differ from the prefilter keywords (e.g. "total interest" marks a loan schedule for the rules,
+# but would drop the interest group from the prefilter's candidates for "total interest earned").
+INTENT_GROUPS = {
+    "interest": "Interest earned on a principal",
+    "time_value": "Moving a single amount between today and the future",
+    "loan": "Loan payments and repayment schedules",
+    "valuation": "Valuing a series of cash flows",
+}
+
+INTENTS = [
+    IntentSpec(
+        key="calculate_present_value",
+        label="Calculate Present Value",
+        group="time_value",
+        keywords=r"(?<!net )\bpresent value\b|\bworth (?:today|now)\b|\bdiscounted (?:back|to today)\b",
+        rule_keywords=r"(?<!net )\bpresent value\b|\bworth today\b|\bdiscounted (?:back|to today)\b",
+        slots={"money": "future_value", "rate": "rate_percent", "duration": "periods"},
+        parameters={
+            "future_value": "What is the future value or final amount?",
+            "rate_percent": "What is the interest rate in percent?", # Expects e.g., 5 for 5%
+            "periods": "How many periods (e.g., years)?",
+        },
+        required_params=["future_value", "rate_percent", "periods"],
+        list_params=[],
+        calculator_function_name="present_value",
+        examples=[
+            "What is the present value of $2,000 received in 5 years at 6%?",
+            "How much is a future payment worth today?",
+            "How much do I need to invest now to have $10,000 in 8 years at 4%?",
+        ],
+        lead_phrases=["What is the present value of", "How much is it worth today:"],
+        csv_calculations=["Present Value"],
+    ),
+    IntentSpec(
+        key="calculate_future_value",
+        label="Calculate Future Value",
+        group="time_value",
+        keywords=r"\bfuture value\b|\bgrows? to\b|\bbe worth in\b",
+        rule_keywords=r"\bfuture value\b|\bgrows? to\b|\bbe worth in\b",
+        slots={"money": "present_value", "rate": "rate_percent", "duration": "periods"},
+        parameters={
+            "present_value": "What is the present value or initial investment amount?",
+            "rate_percent": "What is the interest rate in percent?",
+            "periods": "How many periods (e.g., years)?",
+        },
+        required_params=["present_value", "rate_percent", "periods"],
+        list_params=[],
+        calculator_function_name="future_value",
+        examples=[
+            "What is the future value of $1,500 invested for 4 years at 5%?",
+            "How much will my investment be worth in 10 years?",
+            "What will $5,000 grow to at 7% over 20 years?",
+        ],
+        lead_phrases=["What is the future value of", "What will it grow to:"],
+        csv_calculations=["Future Value"],
+    ),
+    IntentSpec(
+        key="calculate_simple_interest",
+        label="Calculate Simple Interest",
+        group="interest",
+        keywords=r"\bsimple interest\b|\bwithout compounding\b",
+        rule_keywords=r"\bsimple interest\b",
+        slots={"money": "principal", "rate": "rate_percent", "duration": "time_years"},
+        parameters={
+            "principal": "What is the starting sum of money or principal?",
+            "rate_percent": "What specific percentage is the interest rate?",
+            "time_years": "For how many years is the interest calculated?",
+        },
+        required_params=["principal", "rate_percent", "time_years"],
+        list_params=[],
+        calculator_function_name="simple_interest",
+        examples=[
+            "What is the simple interest on $1,200 at 4% for 2 years?",
+            "How much interest do I earn without compounding?",
+            "Interest earned on a principal at a flat annual rate",
+        ],
+        lead_phrases=["What is the simple interest on", "Simple interest earned on"],
+        csv_calculations=["Simple Interest"],
+    ),
+    IntentSpec(
+        key="calculate_compound_interest",
+        label="Calculate Compound Interest",
+        group="interest",
+        keywords=r"\bcompound(?:ed|ing)?\b|\btimes (?:a|per) year\b",
+        rule_keywords=r"\bcompound(?:ed|ing)?\b",
+        slots={"money": "principal", "rate": "annual_rate_percent", "frequency": "compounding_frequency",
+               "duration": "years"},
+        parameters={
+            "principal": "What is the principal amount?",
+            "annual_rate_percent": "What is the annual interest rate in percent?",
+            "compounding_frequency": "How many times is the interest compounded per year?",
+            "years": "For how many years is the investment?",
+        },
+        required_params=["principal", "annual_rate_percent", "compounding_frequency", "years"],
+        list_params=[],
+        calculator_function_name="compound_interest",
+        examples=[
+            "If I invest $1,000 at 6% compounded quarterly, what is the total after 5 years?",
+            "Total amount with interest compounded monthly",
+            "How much will I have with interest compounded annually for 10 years?",
+        ],
+        lead_phrases=["What is the total with compound interest on", "Compound interest on"],
+        csv_calculations=["Compound Interest"],
+    ),
+    IntentSpec(
+        key="calculate_monthly_loan_payment",
+        label="Calculate Monthly Loan Payment",
+        group="loan",
+        keywords=r"\bmonthly (?:loan |mortgage )?payments?\b|\b(?:loan|mortgage) payments?\b|\bpay (?:each|per|every) month\b",
+        rule_keywords=r"\bmonthly (?:loan |mortgage )?payments?\b|\b(?:loan|mortgage) payments?\b|\bpay (?:each|per|every) month\b",
+        slots={"money": "principal", "rate": "annual_rate_percent", "duration": "term_months"},
+        parameters={
+            "principal": "What is the loan principal amount or total borrowed?",
+            "annual_rate_percent": "What is the annual interest rate in percent?",
+            "term_months": "For how many months does the loan last?",
+        },
+        required_params=["principal", "annual_rate_percent", "term_months"],
+        list_params=[],
+        calculator_function_name="loan_amortization_payment",
+        examples=[
+            "What is the monthly payment for a $10,000 loan at 5% over 24 months?",
+            "How much is my mortgage payment each month?",
+            "Monthly installment on a car loan",
+        ],
+        lead_phrases=["What is the monthly payment for a loan of", "Monthly loan payment on"],
+        csv_calculations=["Loan Amortization", "Monthly Loan Payment"], # The CSV's "Loan Amortization" rows ask for the payment
+    ),
+    IntentSpec(
+        key="calculate_loan_amortization_schedule",
+        label="Show Loan Amortization Schedule",
+        group="loan",
+        keywords=r"\bamorti[sz]ation (?:schedule|table)\b|\b(?:payment|repayment) schedule\b|\bremaining balance\b",
+        rule_keywords=(r"\bamortization (?:schedule|table)\b|\b(?:payment|repayment) schedule\b|\btotal interest\b"
+                       r"|\bhow much interest (?:will|would|do) i pay\b"),
+        slots={"money": "principal", "rate": "annual_rate_percent", "duration": "term_months"},
+        parameters={
+            "principal": "What is the loan principal amount or total borrowed?",
+            "annual_rate_percent": "What is the annual interest rate in percent?",
+            "term_months": "For how many months does the loan last?",
+        },
+        required_params=["principal", "annual_rate_percent", "term_months"],
+        list_params=[],
+        calculator_function_name="loan_amortization_summary",
+        examples=[
+            "Show me the amortization schedule for a $200,000 mortgage at 6% over 30 years",
+            "How much total interest will I pay on my loan?",
+            "Break down each month's interest, principal and remaining balance",
+        ],
+        lead_phrases=["Show the amortization schedule for", "How much total interest will I pay on"],
+        csv_calculations=[],
+    ),
+    IntentSpec(
+        key="calculate_net_present_value",
+        label="Calculate Net Present Value",
+        group="valuation",
+        keywords=r"\bnet present value\b|\bnpv\b",
+        rule_keywords=r"\bnet present value\b|\bnpv\b",
+        slots={"rate": "rate_percent", "initial": "initial_investment", "cashflows": "cashflows"},
+        parameters={
+            "rate_percent": "What is the discount rate in percent?",
+            "initial_investment": "What is the initial investment or upfront cost?",
+            "cashflows": "What are the cash flows received in each period?",
+        },
+        required_params=["rate_percent", "initial_investment", "cashflows"],
+        list_params=["cashflows"], # Parsed as a list of numbers rather than a single value
+        calculator_function_name="net_present_value",
+        examples=[
+            "What is the NPV of a $1,000 investment returning $300, $400 and $500 at an 8% discount rate?",
+            "Is this project worth it given its cash flows and a 10% discount rate?",
+            "Discount these cash flows back to today and subtract the upfront cost",
+        ],
+        lead_phrases=["What is the net present value of", "NPV for"],
+        csv_calculations=[],
+    ),
+    IntentSpec(
+        key="calculate_internal_rate_of_return",
+        label="Calculate Internal Rate of Return",
+        group="valuation",
+        keywords=r"\binternal rate of return\b|\birr\b",
+        rule_keywords=r"\binternal rate of return\b|\birr\b",
+        slots={"initial": "initial_investment", "cashflows": "cashflows"},
+        parameters={
+            "initial_investment": "What is the initial investment or upfront cost?",
+            "cashflows": "What are the cash flows received in each period?",
+        },
+        required_params=["initial_investment", "cashflows"],
+        list_params=["cashflows"],
+        calculator_function_name="internal_rate_of_return",
+        examples=[
+            "What is the IRR of investing $1,000 and receiving $300, $400 and $500?",
+            "What rate of return does this project earn on its cash flows?",
+            "At what discount rate is the net present value zero?",
+        ],
+        lead_phrases=["What is the internal rate of return of", "IRR for"],
+        csv_calculations=[],
+    ),
+]
+
+
+
+def _check_spec(spec):
+    """
+    Catches entries whose parts refer to each other inconsistently, when the module is imported.
+    """
+    problems = []
+    if spec.group not in INTENT_GROUPS:
+        problems.append(f"unknown group '{spec.group}'")
+    if set(spec.slots) - set(SLOT_KINDS):
+        problems.append(f"unknown slot kinds {sorted(set(spec.slots) - set(SLOT_KINDS))}")
+    for name, params in (("slots", spec.slots.values()), ("required_params", spec.required_params),
+                         ("list_params", spec.list_params)):
+        if set(params) - set(spec.parameters):
+            problems.append(f"{name} {sorted(set(params) - set(spec.parameters))} are not parameters")
+    if not spec.lead_phrases:
+        problems.append("no lead_phrases")
+    if problems:
+        raise ValueError(f"IntentSpec '{spec.key}': {'; '.join(problems)}.")
+
+
+for _spec in INTENTS:
+    _check_spec(_spec)
+
+# --- Views derived from INTENTS, in the shapes the rest of the code uses ---
+
+INTENTS_BY_KEY = {spec.key: spec for spec in INTENTS}
+
+CANDIDATE_INTENTS_LABELS = [spec.label for spec in INTENTS]
+
+# Mapping from readable labels to keys in INTENT_CONFIG, and back
+INTENT_LABEL_TO_KEY_MAP = {spec.label: spec.key for spec in INTENTS}
+INTENT_KEY_TO_LABEL_MAP = {spec.key: spec.label for spec in INTENTS}
+
+# Parameters + questions for QA and the calculator function, per intent key
+INTENT_CONFIG = {
+    spec.key: {
+        "parameters": dict(spec.parameters),
+        "calculator_function_name": spec.calculator_function_name,
+        "required_params": list(spec.required_params),
+        **({"list_params": list(spec.list_params)} if spec.list_params else {}),
+    }
+    for spec in INTENTS
+}
+
+# Label descriptions and example phrasings per intent, embedded once by the "embedding" backend
+INTENT_EXAMPLES = {spec.key: [spec.label] + list(spec.examples) for spec in INTENTS}
+
+# Intent keys per group, in INTENTS order
+GROUP_INTENT_KEYS = {group: [spec.key for spec in INTENTS if spec.group == group] for group in INTENT_GROUPS}
+
+# --- Candidate prefilter ---
+
+# Set INTENT_PREFILTER=0 to always score every label.
+INTENT_PREFILTER_ENABLED = os.environ.get("INTENT_PREFILTER", "1") != "0"
+
+# Narrowed candidate sets smaller than this fall back to every label: the zero-shot scores are
+# normalized over the candidates, so a single candidate would always come back with confidence 1.0.
+MIN_CANDIDATE_LABELS = 2
+
+_KEYWORD_PATTERNS = [(spec.group, re.compile(spec.keywords, re.IGNORECASE)) for spec in INTENTS]
+
+
+def matched_groups(query):
+    """
+    Returns the groups (in INTENT_GROUPS order) with at least one intent whose keywords occur in the query.
+    """
+    hits = {group for group, pattern in _KEYWORD_PATTERNS if pattern.search(query)}
+    return [group for group in INTENT_GROUPS if group in hits]
+
+
+def candidate_labels(query):
+    """
+    Picks the labels the intent classifier should score for this query: every intent in the groups
+    its keywords point at. Falls back to CANDIDATE_INTENTS_LABELS when no group (or every group)
+    matches, the narrowed set is too small, or the prefilter is disabled.
+    :return: (labels, narrowed) where narrowed is False when the full label set is returned
+    """
+    if not INTENT_PREFILTER_ENABLED:
+        return CANDIDATE_INTENTS_LABELS, False
+    groups = matched_groups(query)
+    if not groups or len(groups) == len(INTENT_GROUPS):
+        return CANDIDATE_INTENTS_LABELS, False
+    labels = [INTENT_KEY_TO_LABEL_MAP[key] for group in groups for key in GROUP_INTENT_KEYS[group]]
+    if len(labels) < MIN_CANDIDATE_LABELS:
+        return CANDIDATE_INTENTS_LABELS, False
+    return labels, True
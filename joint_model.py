@@ -0,0 +1,178 @@
+# joint_model.py
+"""
+Joint intent + slot model: one encoder forward pass per batch of queries feeds a
+sequence-classification head (which intent) and a token-tagging head (BIO tags marking where
+each INTENT_CONFIG parameter's value is in the query). This replaces one zero-shot pass per
+candidate label plus one QA pass per parameter.
+
+The model is trained by train_joint_model.py, which distills the zero-shot and QA pipelines
+on generated queries, and is loaded from the directory it writes.
+"""
+import json
+import os
+
+import numpy as np
+import torch
+from transformers import AutoModel, AutoTokenizer
+
+import intent_registry
+
+JOINT_CONFIG_FILE = "joint_config.json"
+HEADS_FILE = "heads.pt"
+
+# Tag for tokens that belong to no parameter; the others are B-<parameter> and I-<parameter>
+OUTSIDE_TAG = "O"
+
+# Label id ignored by the slot loss (special and padding tokens)
+IGNORE_LABEL_ID = -100
+
+
+def slot_names():
+    """
+    Every parameter name used by any intent, in registry order.
+    """
+    names = []
+    for spec in intent_registry.INTENTS:
+        names.extend(name for name in spec.parameters if name not in names)
+    return names
+
+
+def bio_tags(names):
+    return [OUTSIDE_TAG] + [f"{prefix}-{name}" for name in names for prefix in ("B", "I")]
+
+
+def tag_tokens(offsets, spans, tag_to_id):
+    """
+    Labels tokens with BIO tags from character spans.
+    :param offsets: (start, end) character offsets per token; (0, 0) marks special tokens
+    :param spans: dict of parameter name -> (start, end) character span of its value
+    :param tag_to_id: dict of tag -> label id
+    :return: List of label ids, IGNORE_LABEL_ID for special tokens
+    """
+    labels = []
+    for token_start, token_end in offsets:
+        if token_start == token_end:
+            labels.append(IGNORE_LABEL_ID)
+            continue
+        tag = OUTSIDE_TAG
+        for name, (span_start, span_end) in spans.items():
+            if token_start < span_end and token_end > span_start:
+                tag = f"{'B' if token_start <= span_start else 'I'}-{name}"
+                break
+        labels.append(tag_to_id[tag])
+    return labels
+
+
+class JointIntentSlotModel(torch.nn.Module):
+    def __init__(self, encoder, n_intents, n_tags, dropout=0.1):
+        super().__init__()
+        self.encoder = encoder
+        hidden_size = encoder.config.hidden_size
+        self.dropout = torch.nn.Dropout(dropout)
+        self.intent_head = torch.nn.Linear(hidden_size, n_intents)
+        self.slot_head = torch.nn.Linear(hidden_size, n_tags)
+
+    def forward(self, input_ids, attention_mask):
+        """
+        :return: (intent_logits of shape (batch, n_intents), slot_logits of shape (batch, tokens, n_tags))
+        """
+        hidden = self.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        hidden = self.dropout(hidden)
+        return self.intent_head(hidden[:, 0]), self.slot_head(hidden)
+
+    def heads_state_dict(self):
+        return {"intent_head": self.intent_head.state_dict(), "slot_head": self.slot_head.state_dict()}
+
+
+def save_joint_model(model, tokenizer, intent_keys, tags, output_dir, base_model, max_length):
+    """
+    Writes the encoder, tokenizer, heads and label lists to output_dir for JointIntentSlotExtractor.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    model.encoder.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    torch.save(model.heads_state_dict(), os.path.join(output_dir, HEADS_FILE))
+    with open(os.path.join(output_dir, JOINT_CONFIG_FILE), "w", encoding="utf-8") as f_config:
+        json.dump({"intent_keys": intent_keys, "tags": tags, "base_model": base_model, "max_length": max_length},
+                  f_config, indent=2)
+
+
+class JointIntentSlotExtractor:
+    def __init__(self, model_dir, batch_size=32):
+        """
+        :param model_dir: Directory written by train_joint_model.py
+        :param batch_size: Number of queries encoded per forward pass
+        """
+        with open(os.path.join(model_dir, JOINT_CONFIG_FILE), encoding="utf-8") as f_config:
+            config = json.load(f_config)
+        self.intent_keys = config["intent_keys"]
+        self.tags = config["tags"]
+        self.max_length = config["max_length"]
+        self.batch_size = batch_size
+
+        unknown = set(self.intent_keys) - set(intent_registry.INTENTS_BY_KEY)
+        if unknown:
+            raise ValueError(f"Joint model in {model_dir} was trained for unknown intents: {', '.join(sorted(unknown))}. Retrain it.")
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.model = JointIntentSlotModel(AutoModel.from_pretrained(model_dir), len(self.intent_keys), len(self.tags))
+        heads = torch.load(os.path.join(model_dir, HEADS_FILE), map_location="cpu")
+        self.model.intent_head.load_state_dict(heads["intent_head"])
+        self.model.slot_head.load_state_dict(heads["slot_head"])
+        self.model.eval()
+
+    def _decode_slots(self, query, offsets, tag_probs):
+        """
+        Groups consecutive B-/I- tokens into spans and keeps the highest-scoring span per parameter.
+        :return: dict of parameter name -> {"answer": text, "score": mean tag probability}
+        """
+        tag_ids = tag_probs.argmax(axis=1)
+        slots = {}
+        current = None # [name, start_char, end_char, probabilities]
+
+        def close(span):
+            if span is None:
+                return
+            name, start, end, probabilities = span
+            score = float(np.mean(probabilities))
+            if name not in slots or score > slots[name]["score"]:
+                slots[name] = {"answer": query[start:end], "score": score, "start": start, "end": end}
+
+        for (token_start, token_end), tag_id, probs in zip(offsets, tag_ids, tag_probs):
+            if token_start == token_end: # Special or padding token
+                continue
+            tag = self.tags[tag_id]
+            if tag == OUTSIDE_TAG:
+                close(current)
+                current = None
+                continue
+            prefix, name = tag.split("-", 1)
+            if prefix == "I" and current is not None and current[0] == name:
+                current[2] = token_end
+                current[3].append(probs[tag_id])
+            else:
+                close(current)
+                current = [name, token_start, token_end, [probs[tag_id]]]
+        close(current)
+        return slots
+
+    def predict(self, queries):
+        """
+        :return: List of (intent_key, confidence, slots) per query, where slots maps parameter names
+                 to QA-style {"answer", "score", "start", "end"} dicts
+        """
+        predictions = []
+        with torch.no_grad():
+            for start in range(0, len(queries), self.batch_size):
+                batch_queries = list(queries[start:start + self.batch_size])
+                encoded = self.tokenizer(batch_queries, padding=True, truncation=True, max_length=self.max_length,
+                                         return_offsets_mapping=True, return_tensors="pt")
+                intent_logits, slot_logits = self.model(encoded["input_ids"], encoded["attention_mask"])
+                intent_probs = torch.softmax(intent_logits, dim=-1).numpy()
+                tag_probs = torch.softmax(slot_logits, dim=-1).numpy()
+                offsets = encoded["offset_mapping"].tolist()
+                for i, query in enumerate(batch_queries):
+                    intent_index = int(intent_probs[i].argmax())
+                    predictions.append((self.intent_keys[intent_index], float(intent_probs[i, intent_index]),
+                                        self._decode_slots(query, offsets[i], tag_probs[i])))
+        return predictions
@@ -0,0 +1,251 @@
+# metrics.py
+"""
+Lightweight in-process metrics for the query pipeline, rendered in the Prometheus text format
+by the /metrics route.
+* Counter and Histogram keep one value (or one set of bucket counts) per label combination.
+* CallbackGauge reads its values when /metrics is scraped, e.g. cache or batcher stats.
+* trace() collects the histogram observations made in the current request, so they can be
+  shown in calculation_details.
+Set METRICS_ENABLED=0 to turn recording off; each observation is a dict lookup and a few
+additions under a lock, so leaving it on costs microseconds per request.
+"""
+import bisect
+import contextvars
+import os
+import threading
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+# Latency buckets in seconds, from sub-millisecond regex/calculator work up to slow model calls
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_REGISTRY = []
+
+# Spans recorded while a trace() is active in this context: list of (metric name, labels, seconds)
+_current_trace = contextvars.ContextVar("metrics_trace", default=None)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, traced=True):
+        """
+        :param traced: Whether observations are durations to include in an active trace()
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.traced = traced
+        self._values = {} # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+        spans = _current_trace.get() if self.traced else None
+        if spans is not None:
+            spans.append((self.name, labels, value))
+
+    def count(self, **labels):
+        with self._lock:
+            entry = self._values.get(_label_key(self.labelnames, labels))
+            return entry[-1] if entry else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, entry):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', _format_value(bound))])} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {entry[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(entry[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {entry[-1]}")
+        return lines
+
+
+class CallbackGauge:
+    """
+    A gauge whose values are read from callback() at scrape time.
+    callback returns a dict mapping label value tuples (in labelnames order) to numbers.
+    """
+
+    def __init__(self, name, documentation, labelnames, callback):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        _REGISTRY.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"Error collecting metric '{self.name}': {e}")
+            return lines
+        for key, value in sorted(values.items()):
+            if value is None:
+                continue
+            key = tuple(str(part) for part in key)
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+def render_prometheus():
+    """
+    Returns every registered metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def trace():
+    """
+    Collects the histogram observations made in this thread (or context) while the block runs.
+    Work done on other threads, such as batched model calls in the MicroBatcher worker, has to
+    be traced there and handed back with add_spans.
+    :yield: List of (metric name, labels, seconds) spans, filled in as the block runs
+    """
+    spans = []
+    token = _current_trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _current_trace.reset(token)
+
+
+def tracing():
+    """
+    Whether a trace() is active in this thread (or context).
+    """
+    return _current_trace.get() is not None
+
+
+def add_spans(spans):
+    """
+    Adds spans collected by a trace() elsewhere (e.g. on another thread) to the active trace, if any.
+    """
+    current = _current_trace.get()
+    if current is not None:
+        current.extend(spans)
+
+
+def format_trace(spans):
+    """
+    Formats trace() spans as text lines for calculation_details.
+    """
+    lines = ["Trace:"]
+    for name, labels, seconds in spans:
+        label_text = ", ".join(f"{key}={value}" for key, value in labels.items())
+        lines.append(f"  {name}{f' ({label_text})' if label_text else ''}: {seconds * 1000:.3f} ms")
+    return "\n".join(lines) + "\n"
+
+
+# --- Pipeline metrics ---
+
+NLP_STAGE_SECONDS = Histogram(
+    "nlp_stage_seconds", "Time spent in an NLP stage call, by stage (intent, entities) and path (fast_path, model, degraded).",
+    ["stage", "path"])
+NLP_STAGE_QUERIES = Counter(
+    "nlp_stage_queries_total", "Queries handled by each NLP stage and path.", ["stage", "path"])
+NLP_ERRORS = Counter(
+    "nlp_errors_total", "Exceptions raised by model calls, by stage.", ["stage"])
+INTENT_PREFILTER = Counter(
+    "intent_prefilter_total", "Queries whose zero-shot candidate labels were narrowed by the prefilter, or left full.",
+    ["outcome"])
+INTENT_CONFIDENCE = Histogram(
+    "intent_confidence", "Confidence of the predicted intent.", ["intent"],
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0), traced=False)
+INTENT_LOW_CONFIDENCE = Counter(
+    "intent_low_confidence_total", "Intent predictions below LOW_CONFIDENCE_THRESHOLD.", ["intent"])
+QA_BATCH_SECONDS = Histogram(
+    "qa_batch_seconds", "Time per batched QA pipeline call.")
+PARAMETER_EXTRACTIONS = Counter(
+    "parameter_extractions_total",
+    "Parameter extraction outcomes (ok, low_score, unparsable, error) per intent and parameter.",
+    ["intent", "parameter", "outcome"])
+MISSING_PARAMETERS = Counter(
+    "missing_parameters_total", "Required parameters that could not be extracted.", ["intent", "parameter"])
+NUMBER_PARSING_SECONDS = Histogram(
+    "number_parsing_seconds", "Time to parse a number (or list of numbers) from a QA answer.", ["kind", "outcome"],
+    buckets=(0.000001, 0.000005, 0.00001, 0.00005, 0.0001, 0.0005, 0.001))
+CALCULATION_SECONDS = Histogram(
+    "calculation_seconds", "Time per calculator dispatch, by calculator function and outcome.", ["function", "outcome"])
+BATCH_WAIT_SECONDS = Histogram(
+    "batch_wait_seconds", "Time a request waits for its queries' micro-batched NLP results.")
+REQUESTS_SHED = Counter(
+    "requests_shed_total",
+    "Requests rejected by admission control, by reason (queue_full; deadline: no query answered in time).", ["reason"])
+QUERIES_PAST_DEADLINE = Counter(
+    "queries_past_deadline_total", "Queries answered with a deadline error because their request's budget ran out.")
+DEGRADED_ANSWERS = Counter(
+    "degraded_answers_total",
+    "Queries answered with regex-only extraction, by reason (watermark: whole query; late_intent: entities only).",
+    ["reason"])
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "Flask request latency by endpoint and status code.", ["endpoint", "status"])
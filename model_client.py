@@ -0,0 +1,97 @@
+# model_client.py
+"""
+Thin client for model_server.py, used by web workers when MODEL_SERVER_SOCKET is set.
+Connections are pooled, so concurrent requests in one worker each use their own connection.
+"""
+import queue
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+def authkey_path(address):
+    """
+    File next to the socket holding the key the server generated, when it wasn't given one.
+    """
+    return address + ".key"
+
+
+def read_authkey(address):
+    try:
+        with open(authkey_path(address), "rb") as f_key:
+            return f_key.read()
+    except OSError as e:
+        raise ModelServerError(f"No MODEL_SERVER_AUTHKEY is set and the model server's key file can't be read: {e}") from e
+
+
+class ModelServerClient:
+    def __init__(self, address, authkey=None, timeout_seconds=30.0, max_idle_connections=8):
+        """
+        :param address: Path of the model server's Unix socket
+        :param authkey: Shared secret the server was started with; None reads the key the server
+                        wrote to authkey_path(address)
+        :param timeout_seconds: Longest wait for a response before the call fails
+        :param max_idle_connections: Connections kept open for reuse between calls
+        """
+        self.address = address
+        self.authkey = authkey
+        self.timeout_seconds = timeout_seconds
+        self._idle = queue.LifoQueue(maxsize=max_idle_connections)
+
+    def _connect(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            # The key file is read on every new connection, since a restarted server writes a new one
+            return Client(self.address, family="AF_UNIX", authkey=self.authkey or read_authkey(self.address))
+
+    def _release(self, connection):
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def call(self, operation, payload=None, timeout_seconds=None):
+        """
+        Sends one request and waits for its response.
+        :raises ModelServerError: if the server can't be reached, times out or reports an error
+        """
+        timeout_seconds = self.timeout_seconds if timeout_seconds is None else timeout_seconds
+        try:
+            connection = self._connect()
+        except (OSError, EOFError, AuthenticationError) as e:
+            raise ModelServerError(f"Model server at {self.address} is unreachable: {e}") from e
+        try:
+            connection.send((operation, payload))
+            if not connection.poll(timeout_seconds):
+                # The late response would be read by the next caller, so drop this connection
+                connection.close()
+                raise ModelServerError(f"Model server did not answer '{operation}' within {timeout_seconds:g}s.")
+            status, result = connection.recv()
+        except (EOFError, OSError) as e:
+            connection.close()
+            raise ModelServerError(f"Lost connection to the model server: {e}") from e
+        self._release(connection)
+        if status != "ok":
+            raise ModelServerError(f"Model server error: {result}")
+        return result
+
+    def analyze_batch(self, queries, budgets=None, timeout_seconds=None):
+        """
+        Same contract as nlp_service.analyze_batch, run in the model server.
+        :param budgets: Optional list of (intent_seconds, entities_seconds) left per query, or None for a query
+                        without a deadline. The server turns them into deadlines when it receives the batch.
+        :param timeout_seconds: Longest wait for the answer; defaults to the client's timeout
+        :return: List of (intent_key, intent_confidence, entities, error_message) tuples, one per query
+        """
+        payload = list(zip(queries, budgets or [None] * len(queries)))
+        return self.call("analyze_batch", payload, timeout_seconds=timeout_seconds)
+
+    def ping(self, timeout_seconds=1.0):
+        """
+        :return: The server's status dict ("ready", "pid", memory and batching stats, ...)
+        """
+        return self.call("ping", timeout_seconds=timeout_seconds)
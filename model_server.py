@@ -0,0 +1,215 @@
+# model_server.py
+"""
+A local inference process that owns the NLP models for every web worker on the host.
+Workers connect over a Unix socket (multiprocessing.connection) with model_client.ModelServerClient
+and send batches of queries, with what is left of their deadlines; the server coalesces requests from all workers with a MicroBatcher
+and answers with nlp_service.analyze_batch results. The models are loaded once, in this process,
+instead of once per WSGI worker.
+
+Messages are pickled, so only clients holding the authkey may connect: MODEL_SERVER_AUTHKEY if set,
+otherwise a random key the server writes, readable by its user only, next to the socket.
+
+Usage:
+    python model_server.py [--socket /tmp/financial_nlp_models.sock] [--intra-op-threads N]
+Then start the web workers, as the same user, with MODEL_SERVER_SOCKET set to the same path.
+"""
+import argparse
+import concurrent.futures
+import os
+import secrets
+import signal
+import sys
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+
+import nlp_service
+from batching import MicroBatcher
+from model_client import authkey_path
+
+DEFAULT_SOCKET_PATH = os.environ.get("MODEL_SERVER_SOCKET", "/tmp/financial_nlp_models.sock")
+
+# Shared secret clients must present; when unset the server generates one (see _write_authkey)
+MODEL_SERVER_AUTHKEY = os.environ.get("MODEL_SERVER_AUTHKEY", "").encode() or None
+
+# Longest a request waits for its batch before the server answers with an error
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("MODEL_SERVER_REQUEST_TIMEOUT_SECONDS", 30))
+
+
+def _write_authkey(address):
+    """
+    Generates a random authkey and writes it to authkey_path(address), readable by this user only.
+    """
+    path = authkey_path(address)
+    if os.path.exists(path):
+        os.unlink(path) # Key of a previous run
+    authkey = secrets.token_bytes(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f_key:
+        f_key.write(authkey)
+    return authkey
+
+
+def _analyze_items(items):
+    """
+    The batcher's handler. Items are (query, deadlines) pairs, as for nlp_service.analyze_batch.
+    """
+    return nlp_service.analyze_batch([query for query, _deadlines in items], [deadlines for _query, deadlines in items])
+
+
+class ModelServer:
+    def __init__(self, address=DEFAULT_SOCKET_PATH, authkey=MODEL_SERVER_AUTHKEY, max_batch_size=32, max_wait_ms=5,
+                 warmup=True, request_timeout_seconds=REQUEST_TIMEOUT_SECONDS):
+        """
+        :param address: Path of the Unix socket to listen on
+        :param authkey: Shared secret clients must present; None generates one and writes it to
+                        model_client.authkey_path(address) for the clients to read
+        :param max_batch_size: Largest batch of queries passed to nlp_service.analyze_batch
+        :param max_wait_ms: Longest time a query waits for others to join its batch
+        :param warmup: Load the models (nlp_service.warmup) as soon as the server starts;
+                       otherwise they load on the first request
+        :param request_timeout_seconds: Longest a request waits for its results before it is answered with an error
+        """
+        self.address = address
+        self.authkey = authkey
+        self.request_timeout_seconds = request_timeout_seconds
+        self.batcher = MicroBatcher(_analyze_items, max_batch_size=max_batch_size,
+                                    max_wait_ms=max_wait_ms, name="model-server-batcher")
+        self.warmup_on_start = warmup
+        self.ready = threading.Event()
+        self.warmup_error = None
+        self.started_at = time.monotonic()
+        self._stats_lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+
+    def _warmup(self):
+        try:
+            nlp_service.warmup()
+        except Exception as e:
+            self.warmup_error = str(e)
+            print(f"Model warmup failed: {e}")
+            return
+        self.ready.set()
+        print(f"Model server ready on {self.address}")
+
+    def status(self):
+        with self._stats_lock:
+            connections, requests = self.connections, self.requests
+        return {
+            "ready": self.ready.is_set(),
+            "warmup_error": self.warmup_error,
+            "pid": os.getpid(),
+            "uptime_seconds": time.monotonic() - self.started_at,
+            "connections": connections,
+            "requests": requests,
+            "resident_memory_mb": nlp_service.rss_mb(),
+            "model_load_stats": nlp_service.MODEL_LOAD_STATS,
+            "batcher": self.batcher.stats(),
+        }
+
+    def _dispatch(self, operation, payload):
+        if operation == "ping":
+            return self.status()
+        if operation == "analyze_batch":
+            # Budgets are seconds left when the client sent the batch; they become deadlines on this clock
+            now = time.monotonic()
+            futures = self.batcher.submit_many([(query, budgets and (now + budgets[0], now + budgets[1]))
+                                                for query, budgets in payload])
+            deadline = time.monotonic() + self.request_timeout_seconds
+            try:
+                return [future.result(timeout=max(deadline - time.monotonic(), 0.0)) for future in futures]
+            except concurrent.futures.TimeoutError:
+                for future in futures:
+                    future.cancel()
+                raise TimeoutError(f"Batch not answered within {self.request_timeout_seconds:g}s.")
+        raise ValueError(f"Unknown operation '{operation}'.")
+
+    def _handle_connection(self, connection):
+        """
+        Serves one client connection: each message is an (operation, payload) request, answered
+        with ("ok", result) or ("error", message). Requests on a connection are handled in order.
+        """
+        with self._stats_lock:
+            self.connections += 1
+        try:
+            while True:
+                try:
+                    operation, payload = connection.recv()
+                except (EOFError, OSError):
+                    break
+                with self._stats_lock:
+                    self.requests += 1
+                try:
+                    response = ("ok", self._dispatch(operation, payload))
+                except Exception as e:
+                    print(f"Error handling '{operation}' request: {e}")
+                    response = ("error", str(e))
+                try:
+                    connection.send(response)
+                except (OSError, ValueError):
+                    break
+        finally:
+            connection.close()
+            with self._stats_lock:
+                self.connections -= 1
+
+    def serve_forever(self):
+        """
+        Listens on the Unix socket and serves each client connection on its own thread.
+        Health pings are answered while the models are still loading.
+        """
+        # The socket and key file are created private to this user, with no window in which
+        # they have the default permissions
+        previous_umask = os.umask(0o077)
+        try:
+            if os.path.exists(self.address):
+                os.unlink(self.address) # Stale socket from a previous run
+            authkey = self.authkey or _write_authkey(self.address)
+            listener = Listener(self.address, family="AF_UNIX", authkey=authkey)
+        finally:
+            os.umask(previous_umask)
+        with listener:
+            print(f"Model server (pid {os.getpid()}) listening on {self.address}")
+            if self.warmup_on_start:
+                threading.Thread(target=self._warmup, name="model-warmup", daemon=True).start()
+            else:
+                self.ready.set()
+            while True:
+                try:
+                    connection = listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e: # e.g. a client that failed authentication
+                    print(f"Rejected model server connection: {e}")
+                    continue
+                threading.Thread(target=self._handle_connection, args=(connection,), daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the NLP models to local web workers over a Unix socket.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="Unix socket path (default: MODEL_SERVER_SOCKET)")
+    parser.add_argument("--intra-op-threads", type=int, default=nlp_service.TORCH_INTRA_OP_THREADS,
+                        help="torch intra-op threads (default: TORCH_INTRA_OP_THREADS, else torch's default)")
+    parser.add_argument("--max-batch-size", type=int, default=32, help="Largest batch of queries per model call")
+    parser.add_argument("--max-wait-ms", type=float, default=5, help="Longest wait for a batch to fill")
+    parser.add_argument("--request-timeout", type=float, default=REQUEST_TIMEOUT_SECONDS,
+                        help="Seconds a request waits for its batch before getting an error")
+    args = parser.parse_args()
+
+    nlp_service.TORCH_INTRA_OP_THREADS = args.intra_op_threads
+    server = ModelServer(args.socket, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms,
+                         request_timeout_seconds=args.request_timeout)
+    # A supervisor stops the server with SIGTERM; exiting through SystemExit runs the cleanup below
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for path in (args.socket, authkey_path(args.socket)):
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
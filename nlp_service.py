@@ -1,106 +1,601 @@
 # nlp_service.py
-from transformers import pipeline
+import os
 import re
+import sys
+import threading
+import time
 
-# --- Initialize Hugging Face Pipelines ---
+import inference_backends
+import intent_registry
+import metrics
+import rule_extractor
+
+try:
+    import resource # Unix only; used for resident memory reporting
+except ImportError:
+    resource = None
+
+# --- Hugging Face Pipelines (loaded lazily) ---
 # Using a smaller, efficient model for zero-shot classification.
 # You can experiment with others like 'facebook/bart-large-mnli' for potentially higher accuracy.
-intent_classifier = pipeline("zero-shot-classification", model="valhalla/distilbart-mnli-12-3")
+INTENT_MODEL_NAME = "valhalla/distilbart-mnli-12-3"
 
 # Using a common model for question answering.
-qa_pipeline = pipeline("question-answering", model="distilbert-base-cased-distilled-squad")
+QA_MODEL_NAME = "distilbert-base-cased-distilled-squad"
+
+# Intent classifier backend: "zero_shot" (NLI, one forward pass per candidate label)
+# or "embedding" (one encoder pass + cosine similarity against precomputed example vectors).
+INTENT_CLASSIFIER_BACKEND = os.environ.get("INTENT_CLASSIFIER_BACKEND", "zero_shot")
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+
+# "pipelines" (zero-shot intent + one QA pass per parameter) or "joint" (one pass of the joint
+# intent + slot model in JOINT_MODEL_DIR, trained with train_joint_model.py)
+NLP_MODE = os.environ.get("NLP_MODE", "pipelines")
+if NLP_MODE not in ("pipelines", "joint"):
+    raise ValueError(f"Unknown NLP_MODE '{NLP_MODE}'. Choose 'pipelines' or 'joint'.")
+JOINT_MODEL_DIR = os.environ.get("JOINT_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "joint_intent_slot"))
+
+# How the pipelines run on CPU: "torch", "int8" (dynamic quantization), "onnx" or "onnx_int8"
+# (ONNX Runtime). See inference_backends.py; converted models are cached on disk.
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch")
+if INFERENCE_BACKEND not in inference_backends.INFERENCE_BACKENDS:
+    raise ValueError(f"Unknown INFERENCE_BACKEND '{INFERENCE_BACKEND}'. Choose one of: {', '.join(inference_backends.INFERENCE_BACKENDS)}.")
+
+# Threads torch uses inside one operator (e.g. a matmul). Unset leaves torch's default of one per core,
+# which oversubscribes the CPU when several processes each run a model.
+TORCH_INTRA_OP_THREADS = int(os.environ.get("TORCH_INTRA_OP_THREADS", 0)) or None
+
+# The pipelines are only built on first use (or by warmup()), so importing this module
+# for the config dicts or parse_numerical_value doesn't pull in transformers/torch.
+_intent_classifier = None
+_embedding_classifier = None
+_qa_pipeline = None
+_joint_model = None
+_model_lock = threading.Lock()
+
+# Load time and resident memory growth for each model, filled in as they are loaded.
+MODEL_LOAD_STATS = {}
+
+metrics.CallbackGauge(
+    "model_load_stat", "Model load time, warmup time (seconds) and resident memory growth (MB), from MODEL_LOAD_STATS.",
+    ["model", "stat"],
+    lambda: {(name, stat): value for name, stats in list(MODEL_LOAD_STATS.items())
+             for stat, value in stats.items() if isinstance(value, (int, float))})
+
+
+def rss_mb(peak=False):
+    """
+    Returns the resident set size of this process in MB, or 0.0 where it can't be measured.
+    :param peak: Return the peak RSS reported by getrusage instead of the current one. The current
+                 RSS is read from /proc on Linux and falls back to the peak elsewhere.
+    """
+    if resource is None:
+        return 0.0
+    if not peak:
+        try:
+            with open("/proc/self/statm") as f_statm:
+                resident_pages = int(f_statm.read().split()[1])
+            return resident_pages * resource.getpagesize() / (1024 * 1024)
+        except (OSError, ValueError, IndexError):
+            pass
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+def _load_model(name, model_name, build, backend="torch"):
+    """
+    Calls build() and records how long it took and how much resident memory it added.
+    """
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    loaded = build()
+    load_seconds = time.perf_counter() - start
+    rss_delta = rss_mb() - rss_before
+
+    MODEL_LOAD_STATS[name] = {
+        "model": model_name,
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "rss_delta_mb": rss_delta,
+    }
+    print(f"Loaded {name} ({model_name}, {backend}) in {load_seconds:.2f}s, resident memory +{rss_delta:.1f} MB")
+    return loaded
+
+
+def configure_torch_threads(intra_op_threads=None):
+    """
+    Sets torch's intra-op thread count to intra_op_threads (default TORCH_INTRA_OP_THREADS), if given.
+    """
+    threads = intra_op_threads or TORCH_INTRA_OP_THREADS
+    if threads:
+        import torch
+
+        torch.set_num_threads(threads)
+
+
+def _load_pipeline(name, task, model_name):
+    """
+    Builds a transformers pipeline on INFERENCE_BACKEND, recording its load time and memory.
+    """
+    configure_torch_threads()
+    return _load_model(name, model_name, lambda: inference_backends.build_pipeline(task, model_name, INFERENCE_BACKEND),
+                       backend=INFERENCE_BACKEND)
+
+
+def get_intent_classifier():
+    """
+    Returns the zero-shot classification pipeline, loading it on first use.
+    """
+    global _intent_classifier
+    if _intent_classifier is None:
+        with _model_lock:
+            if _intent_classifier is None:
+                _intent_classifier = _load_pipeline("intent_classifier", "zero-shot-classification", INTENT_MODEL_NAME)
+    return _intent_classifier
+
+
+def get_embedding_classifier():
+    """
+    Returns the embedding-based intent classifier, loading it (and embedding INTENT_EXAMPLES) on first use.
+    """
+    global _embedding_classifier
+    if _embedding_classifier is None:
+        with _model_lock:
+            if _embedding_classifier is None:
+                from embedding_classifier import EmbeddingIntentClassifier
+
+                _embedding_classifier = _load_model(
+                    "embedding_classifier", EMBEDDING_MODEL_NAME,
+                    lambda: EmbeddingIntentClassifier(INTENT_EXAMPLES, model_name=EMBEDDING_MODEL_NAME))
+    return _embedding_classifier
+
+
+def get_qa_pipeline():
+    """
+    Returns the question-answering pipeline, loading it on first use.
+    """
+    global _qa_pipeline
+    if _qa_pipeline is None:
+        with _model_lock:
+            if _qa_pipeline is None:
+                _qa_pipeline = _load_pipeline("qa_pipeline", "question-answering", QA_MODEL_NAME)
+    return _qa_pipeline
+
+
+def get_joint_model():
+    """
+    Returns the joint intent + slot model, loading it from JOINT_MODEL_DIR on first use.
+    """
+    global _joint_model
+    if _joint_model is None:
+        with _model_lock:
+            if _joint_model is None:
+                from joint_model import JointIntentSlotExtractor
+
+                configure_torch_threads()
+                _joint_model = _load_model("joint_model", JOINT_MODEL_DIR, lambda: JointIntentSlotExtractor(JOINT_MODEL_DIR))
+    return _joint_model
+
+
+def set_models(intent_classifier=None, qa_pipeline=None, embedding_classifier=None, joint_model=None):
+    """
+    Replaces the loaded models with the given objects, e.g. deterministic stubs for offline
+    benchmarks. Each must be call-compatible with the model it replaces; None leaves that model as is.
+    """
+    global _intent_classifier, _qa_pipeline, _embedding_classifier, _joint_model
+    with _model_lock:
+        if joint_model is not None:
+            _joint_model = joint_model
+        if intent_classifier is not None:
+            _intent_classifier = intent_classifier
+        if qa_pipeline is not None:
+            _qa_pipeline = qa_pipeline
+        if embedding_classifier is not None:
+            _embedding_classifier = embedding_classifier
+
+
+def models_loaded():
+    """
+    Reports which models are loaded, and whether the ones needed by INTENT_CLASSIFIER_BACKEND are.
+    """
+    loaded = {
+        "intent_classifier": _intent_classifier is not None,
+        "embedding_classifier": _embedding_classifier is not None,
+        "qa_pipeline": _qa_pipeline is not None,
+        "joint_model": _joint_model is not None,
+    }
+    if NLP_MODE == "joint":
+        loaded["ready"] = loaded["joint_model"]
+        return loaded
+    intent_model_name = "embedding_classifier" if INTENT_CLASSIFIER_BACKEND == "embedding" else "intent_classifier"
+    loaded["ready"] = loaded[intent_model_name] and loaded["qa_pipeline"]
+    return loaded
+
+
+def warmup():
+    """
+    Loads the intent classifier for INTENT_CLASSIFIER_BACKEND and the QA pipeline, and runs one
+    dummy inference through each, so the first real request doesn't pay for model loading
+    or lazy initialisation inside torch.
+    :return: MODEL_LOAD_STATS, with a warmup inference time added per model
+    """
+    dummy_query = "What is the future value of $1000 at 5% for 10 years?"
+
+    if NLP_MODE == "joint":
+        start = time.perf_counter()
+        get_joint_model().predict([dummy_query])
+        MODEL_LOAD_STATS.setdefault("joint_model", {})["warmup_seconds"] = time.perf_counter() - start
+        return MODEL_LOAD_STATS
+
+    start = time.perf_counter()
+    INTENT_BACKENDS[INTENT_CLASSIFIER_BACKEND]([dummy_query])
+    intent_model_name = "embedding_classifier" if INTENT_CLASSIFIER_BACKEND == "embedding" else "intent_classifier"
+    MODEL_LOAD_STATS.setdefault(intent_model_name, {})["warmup_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_qa_pipeline()(question="What is the interest rate in percent?", context=dummy_query)
+    MODEL_LOAD_STATS.setdefault("qa_pipeline", {})["warmup_seconds"] = time.perf_counter() - start
+
+    return MODEL_LOAD_STATS
 
 # --- Configuration for Intents and Parameter Extraction ---
+# Labels, QA questions and examples all come from the intent registry; add new intents there.
+CANDIDATE_INTENTS_LABELS = intent_registry.CANDIDATE_INTENTS_LABELS
+INTENT_CONFIG = intent_registry.INTENT_CONFIG
+INTENT_EXAMPLES = intent_registry.INTENT_EXAMPLES
+INTENT_LABEL_TO_KEY_MAP = intent_registry.INTENT_LABEL_TO_KEY_MAP
+INTENT_KEY_TO_LABEL_MAP = intent_registry.INTENT_KEY_TO_LABEL_MAP
 
-# Define the financial intents your calculator will understand
-CANDIDATE_INTENTS_LABELS = [
-    "Calculate Present Value",
-    "Calculate Future Value",
-    "Calculate Simple Interest",
-    "Calculate Compound Interest",
-    "Calculate Monthly Loan Payment"
-]
-
-# Map user-friendly labels to internal keys and define parameters + questions for QA
-INTENT_CONFIG = {
-    "calculate_present_value": {
-        "parameters": {
-            "future_value": "What is the future value or final amount?",
-            "rate_percent": "What is the interest rate in percent?", # Expects e.g., 5 for 5%
-            "periods": "How many periods (e.g., years)?"
-        },
-        "calculator_function_name": "present_value",
-        "required_params": ["future_value", "rate_percent", "periods"]
-    },
-    "calculate_future_value": {
-        "parameters": {
-            "present_value": "What is the present value or initial investment amount?",
-            "rate_percent": "What is the interest rate in percent?",
-            "periods": "How many periods (e.g., years)?"
-        },
-        "calculator_function_name": "future_value",
-        "required_params": ["present_value", "rate_percent", "periods"]
-    },
-    "calculate_simple_interest": {
-    "parameters": {
-        "principal": "What is the starting sum of money or principal?",
-        "rate_percent": "What specific percentage is the interest rate?", 
-        "time_years": "For how many years is the interest calculated?"  
-    },
-    "calculator_function_name": "simple_interest",
-    "required_params": ["principal", "rate_percent", "time_years"]
-},
-    "calculate_compound_interest": {
-        "parameters": {
-            "principal": "What is the principal amount?",
-            "annual_rate_percent": "What is the annual interest rate in percent?",
-            "compounding_frequency": "How many times is the interest compounded per year?",
-            "years": "For how many years is the investment?"
-        },
-        "calculator_function_name": "compound_interest",
-        "required_params": ["principal", "annual_rate_percent", "compounding_frequency", "years"]
-    },
-   # In INTENT_CONFIG:
-"calculate_monthly_loan_payment": {
-    "parameters": {
-        "principal": "What is the loan principal amount or total borrowed?", # Keep this or your previous good one
-        "annual_rate_percent": "What is the annual interest rate in percent?", # Keep this
-        "term_months": "For how many months does the loan last?" # <-- TRY THIS NEW QUESTION (or another from suggestions)
-    },
-    "calculator_function_name": "loan_amortization_payment",
-    "required_params": ["principal", "annual_rate_percent", "term_months"]
-}
-}
+# Intent predictions below this confidence are counted in intent_low_confidence_total.
+LOW_CONFIDENCE_THRESHOLD = float(os.environ.get("LOW_CONFIDENCE_THRESHOLD", 0.5))
 
-# Mapping from readable labels to keys in INTENT_CONFIG
-INTENT_LABEL_TO_KEY_MAP = {
-    "Calculate Present Value": "calculate_present_value",
-    "Calculate Future Value": "calculate_future_value",
-    "Calculate Simple Interest": "calculate_simple_interest",
-    "Calculate Compound Interest": "calculate_compound_interest",
-    "Calculate Monthly Loan Payment": "calculate_monthly_loan_payment",
+# How often the rule-based fast path resolves a stage without a model, and the time spent on each path.
+FAST_PATH_STATS = {
+    stage: {"fast_path": 0, "model": 0, "fast_path_seconds": 0.0, "model_seconds": 0.0}
+    for stage in ("intent", "entities")
 }
+_stats_lock = threading.Lock()
 
-def get_intent(query):
+
+def _record_path(stage, path, seconds, count=1):
+    with _stats_lock:
+        FAST_PATH_STATS[stage][path] += count
+        FAST_PATH_STATS[stage][f"{path}_seconds"] += seconds
+    metrics.NLP_STAGE_SECONDS.observe(seconds, stage=stage, path=path)
+    metrics.NLP_STAGE_QUERIES.inc(count, stage=stage, path=path)
+
+
+def get_fast_path_stats():
     """
-    Identifies the financial intent from the user's query.
+    Summarises FAST_PATH_STATS: per stage, how many calls took each path,
+    the fast-path rate, and the mean latency of each path in milliseconds.
+    """
+    summary = {}
+    with _stats_lock:
+        for stage, counts in FAST_PATH_STATS.items():
+            total = counts["fast_path"] + counts["model"]
+            summary[stage] = {
+                "fast_path": counts["fast_path"],
+                "model": counts["model"],
+                "fast_path_rate": counts["fast_path"] / total if total else 0.0,
+                "fast_path_mean_ms": 1000 * counts["fast_path_seconds"] / counts["fast_path"] if counts["fast_path"] else 0.0,
+                "model_mean_ms": 1000 * counts["model_seconds"] / counts["model"] if counts["model"] else 0.0,
+            }
+    return summary
+
+
+def _rule_match(query):
+    """
+    Returns the rule-based match for the query if it is confident enough to skip the models, else None.
+    """
+    match = rule_extractor.match_query(query)
+    if match.intent_key and match.confidence >= rule_extractor.RULE_CONFIDENCE_THRESHOLD:
+        return match
+    return None
+
+
+def _classify_intents_zero_shot(queries):
+    """
+    Identifies the intents of a batch of queries with the zero-shot classifier.
+    Each query is only scored against the labels intent_registry.candidate_labels keeps for it;
+    queries with the same candidate set share one pipeline call.
+    :return: List of (intent_key, confidence) tuples, one per query
+    """
+    by_candidates = {}
+    for i, query in enumerate(queries):
+        labels, narrowed = intent_registry.candidate_labels(query)
+        metrics.INTENT_PREFILTER.inc(outcome="narrowed" if narrowed else "full")
+        by_candidates.setdefault(tuple(labels), []).append(i)
+
+    classified = [None] * len(queries)
+    for labels, indices in by_candidates.items():
+        for i, result in zip(indices, _classify_zero_shot_with_labels([queries[i] for i in indices], list(labels))):
+            classified[i] = result
+    return classified
+
+
+def _classify_zero_shot_with_labels(queries, candidate_labels):
+    """
+    Runs the zero-shot classifier over a batch of queries that share the same candidate labels.
+    :return: List of (intent_key, confidence) tuples, one per query
     """
     try:
-        result = intent_classifier(query, CANDIDATE_INTENTS_LABELS, multi_label=False)
+        results = get_intent_classifier()(queries, candidate_labels, multi_label=False)
+        if isinstance(results, dict):
+            results = [results]
+    except Exception as e:
+        metrics.NLP_ERRORS.inc(stage="intent")
+        if len(queries) > 1:
+            # Retry one at a time so a single bad query doesn't fail the whole batch
+            print(f"Batched intent classification failed ({e}); retrying queries individually.")
+            return [_classify_zero_shot_with_labels([query], candidate_labels)[0] for query in queries]
+        print(f"Error in intent classification: {e}")
+        return [(None, 0.0)]
+
+    classified = []
+    for result in results:
         # Get the intent with the highest score
         top_intent_label = result['labels'][0]
         confidence = result['scores'][0]
-        
+
         # Map the readable label to our internal key
         intent_key = INTENT_LABEL_TO_KEY_MAP.get(top_intent_label)
-        
+
         if not intent_key:
-            return None, 0.0 # Or raise an error
-            
-        return intent_key, confidence
+            classified.append((None, 0.0)) # Or raise an error
+        else:
+            classified.append((intent_key, confidence))
+    return classified
+
+
+def _classify_intents_with_embeddings(queries):
+    """
+    Identifies the intents of a batch of queries with the embedding backend.
+    :return: List of (intent_key, confidence) tuples, one per query
+    """
+    try:
+        return get_embedding_classifier().classify(list(queries))
     except Exception as e:
+        metrics.NLP_ERRORS.inc(stage="intent")
         print(f"Error in intent classification: {e}")
-        return None, 0.0
+        return [(None, 0.0)] * len(queries)
+
+
+# Intent classifier implementations selectable via INTENT_CLASSIFIER_BACKEND.
+# Each takes a list of queries and returns one (intent_key, confidence) per query.
+INTENT_BACKENDS = {
+    "zero_shot": _classify_intents_zero_shot,
+    "embedding": _classify_intents_with_embeddings,
+}
+
+if INTENT_CLASSIFIER_BACKEND not in INTENT_BACKENDS:
+    raise ValueError(f"Unknown INTENT_CLASSIFIER_BACKEND '{INTENT_CLASSIFIER_BACKEND}'. Choose one of: {', '.join(INTENT_BACKENDS)}.")
+
+
+def get_intent(query):
+    """
+    Identifies the financial intent from the user's query.
+    Unambiguous queries are resolved by the rule-based fast path; the rest go to the model
+    (the joint model when NLP_MODE is "joint", which also extracts the entities it then discards).
+    """
+    if NLP_MODE == "joint":
+        intent_key, confidence, _entities, _error_message = analyze_query(query)
+        return intent_key, confidence
+    return get_intent_batch([query])[0]
+
+
+def get_intent_batch(queries):
+    """
+    Batched version of get_intent: queries the fast path can't resolve are classified
+    together in one model call.
+    :return: List of (intent_key, confidence) tuples in the same order as queries
+    """
+    start = time.perf_counter()
+    results = [None] * len(queries)
+    pending = []
+    for i, query in enumerate(queries):
+        match = _rule_match(query)
+        if match:
+            results[i] = (match.intent_key, match.confidence)
+        else:
+            pending.append(i)
+    fast_path_count = len(queries) - len(pending)
+    if fast_path_count:
+        _record_path("intent", "fast_path", time.perf_counter() - start, count=fast_path_count)
+
+    if pending:
+        model_start = time.perf_counter()
+        classified = INTENT_BACKENDS[INTENT_CLASSIFIER_BACKEND]([queries[i] for i in pending])
+        for i, result in zip(pending, classified):
+            results[i] = result
+        _record_path("intent", "model", time.perf_counter() - model_start, count=len(pending))
+
+    for intent_key, confidence in results:
+        metrics.INTENT_CONFIDENCE.observe(confidence, intent=intent_key)
+        if confidence < LOW_CONFIDENCE_THRESHOLD:
+            metrics.INTENT_LOW_CONFIDENCE.inc(intent=intent_key)
+
+    return results
+
+
+def analyze_query(query):
+    """
+    Analyzes one query the way pipeline does: the rule fast path, then analyze_batch in the configured NLP_MODE.
+    :return: (intent_key, intent_confidence, entities, error_message)
+    """
+    return analyze_fast_path(query) or analyze_batch([query])[0]
+
+
+def analyze_fast_path(query):
+    """
+    Resolves a query with the rule-based fast path alone.
+    :return: (intent_key, confidence, entities, None) if the rules are confident, else None
+    """
+    start = time.perf_counter()
+    match = _rule_match(query)
+    if not match:
+        return None
+    elapsed = time.perf_counter() - start
+    _record_path("intent", "fast_path", elapsed)
+    _record_path("entities", "fast_path", 0.0)
+    return match.intent_key, match.confidence, dict(match.entities), None
+
+
+# error_message of analyze_batch results for queries skipped because their deadline had passed
+DEADLINE_EXCEEDED = "Deadline exceeded before the query could be analyzed."
+
+
+class DegradedResult(tuple):
+    """
+    An analysis result that used the regex patterns where the models would normally have run
+    (analyze_degraded, or late entities in analyze_batch). It unpacks like any other result.
+    """
+
+
+def analyze_batch(queries, deadlines=None):
+    """
+    Runs intent classification and entity extraction for a batch of queries,
+    with one batched model call per stage (or one joint model call when NLP_MODE is "joint").
+    :param deadlines: Optional list of (intent_deadline, entities_deadline) time.monotonic() values per query,
+                      or None for a query without one. A query still waiting for intent classification after
+                      its intent deadline, or classified after its entities deadline, is skipped with
+                      DEADLINE_EXCEEDED as its error_message. A query classified after its intent deadline
+                      gets regex-only entities, as its share of the budget for the QA call is already spent,
+                      and its result is a DegradedResult.
+                      In joint mode both stages are one pass, so only the intent deadline is checked and
+                      the entities deadline is never enforced.
+    :return: List of (intent_key, intent_confidence, entities, error_message) tuples, one per query
+    """
+    if not deadlines or not any(deadlines):
+        if NLP_MODE == "joint":
+            return analyze_batch_joint(queries)
+        intents = get_intent_batch(queries)
+        entity_results = extract_entities_batch(queries, [intent_key for intent_key, _confidence in intents])
+        return [
+            (intent_key, confidence, entities, error_message)
+            for (intent_key, confidence), (entities, error_message) in zip(intents, entity_results)
+        ]
+
+    results = [(None, 0.0, None, DEADLINE_EXCEEDED)] * len(queries)
+    now = time.monotonic()
+    live = [i for i, deadline in enumerate(deadlines) if not deadline or now <= deadline[0]]
+    if not live:
+        return results
+    if NLP_MODE == "joint":
+        # One pass does both stages, so only the intent deadline can be checked
+        for i, result in zip(live, analyze_batch_joint([queries[i] for i in live])):
+            results[i] = result
+        return results
+
+    intents = dict(zip(live, get_intent_batch([queries[i] for i in live])))
+    now = time.monotonic()
+    model_pending = []
+    for i, (intent_key, confidence) in intents.items():
+        deadline = deadlines[i]
+        if deadline and now > deadline[1]:
+            continue
+        if deadline and now > deadline[0] and intent_key in INTENT_CONFIG:
+            start = time.perf_counter()
+            entities, error_message = _regex_entities(intent_key, rule_extractor.match_slots(queries[i], intent_key)[0])
+            _record_degraded("entities", time.perf_counter() - start, reason="late_intent")
+            results[i] = DegradedResult((intent_key, confidence, entities, error_message))
+            continue
+        model_pending.append(i)
+
+    entity_results = extract_entities_batch([queries[i] for i in model_pending], [intents[i][0] for i in model_pending])
+    for i, (entities, error_message) in zip(model_pending, entity_results):
+        results[i] = (intents[i][0], intents[i][1], entities, error_message)
+    return results
+
+
+def _record_degraded(stage, seconds, reason):
+    metrics.NLP_STAGE_SECONDS.observe(seconds, stage=stage, path="degraded")
+    metrics.NLP_STAGE_QUERIES.inc(stage=stage, path="degraded")
+    metrics.DEGRADED_ANSWERS.inc(reason=reason)
+
+
+def _regex_entities(intent_key, entities):
+    """
+    Turns the parameters found by the rule-based slot patterns into the (extracted_values, error_message)
+    pair returned by extract_entities, reporting required parameters the patterns didn't find.
+    """
+    entities = dict(entities)
+    missing_params = [param_name for param_name in INTENT_CONFIG[intent_key].get("required_params", [])
+                      if param_name not in entities]
+    if missing_params:
+        for param_name in missing_params:
+            metrics.MISSING_PARAMETERS.inc(intent=intent_key, parameter=param_name)
+        return entities, f"Missing or unparsable required parameters: {', '.join(missing_params)}."
+    return entities, None
+
+
+def analyze_degraded(query):
+    """
+    Regex-only analysis for when the service is overloaded: the rule-based intent keywords and slot
+    patterns are used whatever their confidence, and no model is called.
+    :return: DegradedResult of (intent_key, confidence, entities, error_message); intent_key is None when
+             the keywords of no single intent appear in the query
+    """
+    start = time.perf_counter()
+    match = rule_extractor.match_query(query)
+    if match.intent_key:
+        entities, error_message = _regex_entities(match.intent_key, match.entities)
+        result = (match.intent_key, match.confidence, entities, error_message)
+    else:
+        result = (None, 0.0, None, None)
+    _record_degraded("intent", time.perf_counter() - start, reason="watermark")
+    return DegradedResult(result)
+
+
+def analyze_batch_joint(queries):
+    """
+    analyze_batch with the joint intent + slot model: each query gets its intent and every parameter
+    span from one forward pass. The rule fast path is left to the caller (see analyze_fast_path).
+    The spans go through the same parsing and missing-parameter handling as QA answers, so results
+    have the same shape and error messages.
+    :return: List of (intent_key, intent_confidence, entities, error_message) tuples, one per query
+    """
+    if not queries:
+        return []
+    start = time.perf_counter()
+    results = []
+    for intent_key, confidence, slots in _predict_joint(queries):
+        metrics.INTENT_CONFIDENCE.observe(confidence, intent=intent_key)
+        if confidence < LOW_CONFIDENCE_THRESHOLD:
+            metrics.INTENT_LOW_CONFIDENCE.inc(intent=intent_key)
+        if not intent_key or intent_key not in INTENT_CONFIG:
+            results.append((intent_key, confidence, None, "Invalid intent key."))
+            continue
+        entities, error_message = _joint_entities(intent_key, slots)
+        results.append((intent_key, confidence, entities, error_message))
+    # One pass produces both stages, so the time is recorded against intent classification
+    _record_path("intent", "model", time.perf_counter() - start, count=len(queries))
+    _record_path("entities", "model", 0.0, count=len(queries))
+    return results
+
+
+def _predict_joint(queries):
+    """
+    :return: The joint model's (intent_key, confidence, slots) per query, or empty predictions if it fails
+    """
+    try:
+        return get_joint_model().predict(list(queries))
+    except Exception as e:
+        metrics.NLP_ERRORS.inc(stage="joint")
+        print(f"Error in joint intent/slot model: {e}")
+        return [(None, 0.0, {})] * len(queries)
+
+
+def _joint_entities(intent_key, slots):
+    """
+    Turns the joint model's tagged spans into intent_key's (extracted_values, error_message).
+    """
+    config = INTENT_CONFIG[intent_key]
+    # Parameters without a tagged span count as unanswered, like a QA answer below the score threshold
+    slot_results = [slots.get(param_name, {"answer": "", "score": 0.0}) for param_name in config["parameters"]]
+    return _collect_entities(intent_key, config, slot_results)
+
 
 def parse_numerical_value(answer_text):
     """
@@ -133,40 +628,177 @@ def parse_numerical_value(answer_text):
     return None
 
 
-def extract_entities(query, intent_key):
+# Numbers in a list such as "$300, $400 and $1,500": thousands-grouped numbers are matched first
+# so their commas aren't taken as list separators.
+_LIST_NUMBER_PATTERN = re.compile(r'-?\$?\s*(?:\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?|\.\d+)')
+
+def parse_numerical_list(answer_text):
     """
-    Extracts numerical parameters for a given intent using Question Answering.
+    Extracts a list of numerical values (e.g. cash flows) from a QA model's answer string.
+    :return: List of floats, or None if no number was found
     """
-    if not intent_key or intent_key not in INTENT_CONFIG:
-        return None, "Invalid intent key."
+    if not answer_text:
+        return None
+    values = [float(match.replace('$', '').replace(',', '').replace(' ', ''))
+              for match in _LIST_NUMBER_PATTERN.findall(str(answer_text))]
+    if not values:
+        print(f"Could not parse numerical values from: '{answer_text}'")
+        return None
+    return values
 
-    config = INTENT_CONFIG[intent_key]
+
+# Number of (question, context) pairs handed to the QA model in one forward pass.
+QA_BATCH_SIZE = 16
+
+def _run_qa_batch(questions, contexts):
+    """
+    Runs the QA pipeline over parallel lists of questions and contexts as padded batches.
+    Returns one result (or the raised exception) per pair, in input order, so callers can
+    apply the same per-parameter handling they would for individual calls.
+    """
+    if not questions:
+        return []
+    try:
+        start = time.perf_counter()
+        results = get_qa_pipeline()(question=questions, context=contexts, batch_size=QA_BATCH_SIZE)
+        metrics.QA_BATCH_SECONDS.observe(time.perf_counter() - start)
+        # The pipeline unwraps single-element inputs, so normalize back to a list
+        if isinstance(results, dict):
+            results = [results]
+        return list(results)
+    except Exception as e:
+        metrics.NLP_ERRORS.inc(stage="entities")
+        # Fall back to one call per pair so a single bad input only affects its own parameter
+        print(f"Batched QA failed ({e}); retrying questions individually.")
+        results = []
+        for question_text, context in zip(questions, contexts):
+            try:
+                results.append(get_qa_pipeline()(question=question_text, context=context))
+            except Exception as item_error:
+                metrics.NLP_ERRORS.inc(stage="entities")
+                results.append(item_error)
+        return results
+
+
+def _collect_entities(intent_key, config, qa_results):
+    """
+    Turns the QA results for one intent's parameters (in parameter order) into
+    the (extracted_values, error_message) pair returned by extract_entities.
+    """
     parameter_questions = config["parameters"]
     extracted_values = {}
     missing_params = []
 
-    for param_name, question_text in parameter_questions.items():
-        try:
-            qa_result = qa_pipeline(question=question_text, context=query)
-            # print(f"DEBUG: Intent: {intent_key}, Param: {param_name}, Question: '{question_text}' -> QA Raw Answer: '{qa_result['answer']}' (Score: {qa_result['score']:.4f})")
-            if qa_result and qa_result['score'] > 0.1: # Confidence threshold for QA
+    for (param_name, question_text), qa_result in zip(parameter_questions.items(), qa_results):
+        if isinstance(qa_result, Exception):
+            print(f"Error extracting entity '{param_name}' with question '{question_text}': {qa_result}")
+            metrics.PARAMETER_EXTRACTIONS.inc(intent=intent_key, parameter=param_name, outcome="error")
+            if param_name in config.get("required_params", []):
+                missing_params.append(param_name)
+            continue
+
+        # print(f"DEBUG: Param: {param_name}, Question: '{question_text}' -> QA Raw Answer: '{qa_result['answer']}' (Score: {qa_result['score']:.4f})")
+        if qa_result and qa_result['score'] > 0.1: # Confidence threshold for QA
+            parse_start = time.perf_counter()
+            if param_name in config.get("list_params", []):
+                kind = "list"
+                value = parse_numerical_list(qa_result['answer'])
+            else:
+                kind = "value"
                 value = parse_numerical_value(qa_result['answer'])
-                if value is not None:
-                    extracted_values[param_name] = value
-                else:
-                    # QA found an answer, but we couldn't parse a number
-                    print(f"Could not parse number for '{param_name}' from QA answer: '{qa_result['answer']}'")
-                    if param_name in config.get("required_params", []):
-                        missing_params.append(param_name)
-            elif param_name in config.get("required_params", []):
-                 missing_params.append(param_name)
-
-        except Exception as e:
-            print(f"Error extracting entity '{param_name}' with question '{question_text}': {e}")
+            outcome = "ok" if value is not None else "unparsable"
+            metrics.NUMBER_PARSING_SECONDS.observe(time.perf_counter() - parse_start, kind=kind, outcome=outcome)
+            metrics.PARAMETER_EXTRACTIONS.inc(intent=intent_key, parameter=param_name, outcome=outcome)
+            if value is not None:
+                extracted_values[param_name] = value
+            else:
+                # QA found an answer, but we couldn't parse a number
+                print(f"Could not parse number for '{param_name}' from QA answer: '{qa_result['answer']}'")
+                if param_name in config.get("required_params", []):
+                    missing_params.append(param_name)
+        else:
+            metrics.PARAMETER_EXTRACTIONS.inc(intent=intent_key, parameter=param_name, outcome="low_score")
             if param_name in config.get("required_params", []):
                 missing_params.append(param_name)
-    
+
     if missing_params:
+        for param_name in missing_params:
+            metrics.MISSING_PARAMETERS.inc(intent=intent_key, parameter=param_name)
         return extracted_values, f"Missing or unparsable required parameters: {', '.join(missing_params)}."
-        
-    return extracted_values, None # No error message means success
\ No newline at end of file
+
+    return extracted_values, None # No error message means success
+
+
+def extract_entities(query, intent_key):
+    """
+    Extracts numerical parameters for a given intent using Question Answering.
+    All of the intent's parameter questions are answered in a single batched QA call,
+    unless the rule-based fast path already resolved every parameter for this intent.
+    When NLP_MODE is "joint", the joint model's tagged spans are used instead of QA.
+    """
+    if not intent_key or intent_key not in INTENT_CONFIG:
+        return None, "Invalid intent key."
+
+    start = time.perf_counter()
+    match = _rule_match(query)
+    if match and match.intent_key == intent_key:
+        _record_path("entities", "fast_path", time.perf_counter() - start)
+        return dict(match.entities), None
+
+    if NLP_MODE == "joint":
+        _predicted_intent, _confidence, slots = _predict_joint([query])[0]
+        result = _joint_entities(intent_key, slots)
+        _record_path("entities", "model", time.perf_counter() - start)
+        return result
+
+    config = INTENT_CONFIG[intent_key]
+    questions = list(config["parameters"].values())
+    qa_results = _run_qa_batch(questions, [query] * len(questions))
+    result = _collect_entities(intent_key, config, qa_results)
+    _record_path("entities", "model", time.perf_counter() - start)
+    return result
+
+
+def extract_entities_batch(queries, intent_keys):
+    """
+    Batched version of extract_entities for many queries at once.
+    :param queries: List of user queries
+    :param intent_keys: List of intent keys, one per query
+    :return: List of (extracted_values, error_message) tuples in the same order as queries
+    """
+    start = time.perf_counter()
+    results = [None] * len(queries)
+    questions, contexts, owners = [], [], []
+    fast_path_count = 0
+
+    for i, (query, intent_key) in enumerate(zip(queries, intent_keys)):
+        if not intent_key or intent_key not in INTENT_CONFIG:
+            results[i] = (None, "Invalid intent key.")
+            continue
+        match = _rule_match(query)
+        if match and match.intent_key == intent_key:
+            results[i] = (dict(match.entities), None)
+            fast_path_count += 1
+            continue
+        for question_text in INTENT_CONFIG[intent_key]["parameters"].values():
+            questions.append(question_text)
+            contexts.append(query)
+            owners.append(i)
+    if fast_path_count:
+        _record_path("entities", "fast_path", time.perf_counter() - start, count=fast_path_count)
+
+    if not questions:
+        return results
+
+    model_start = time.perf_counter()
+    qa_results = _run_qa_batch(questions, contexts)
+
+    # Regroup the flat QA results by the query they belong to, keeping parameter order
+    grouped = {}
+    for owner, qa_result in zip(owners, qa_results):
+        grouped.setdefault(owner, []).append(qa_result)
+    for i, query_results in grouped.items():
+        results[i] = _collect_entities(intent_keys[i], INTENT_CONFIG[intent_keys[i]], query_results)
+    _record_path("entities", "model", time.perf_counter() - model_start, count=len(grouped))
+
+    return results
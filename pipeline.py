@@ -0,0 +1,480 @@
+# pipeline.py
+"""
+The query -> intent/entities -> calculator pipeline behind the web routes.
+NLP analysis goes through the query cache, then the rule-based fast path, then a
+MicroBatcher that coalesces concurrent queries into batched model calls. Requests that
+need the models pass admission control first, and their model work has a deadline.
+"""
+import concurrent.futures
+import contextlib
+import itertools
+import math
+import os
+import time
+
+import admission
+import amortization
+import calculator
+import metrics
+import nlp_service
+import query_cache
+import vectorized_calculator
+from batching import MicroBatcher
+from model_client import ModelServerClient
+
+# Micro-batching window for model calls: a batch is dispatched once it has MICROBATCH_MAX_SIZE
+# queries or its first query has waited MICROBATCH_MAX_WAIT_MS, whichever comes first.
+MICROBATCH_MAX_SIZE = int(os.environ.get("MICROBATCH_MAX_SIZE", 16))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get("MICROBATCH_MAX_WAIT_MS", 10))
+# How long a caller waits for its batch result before giving up
+MICROBATCH_TIMEOUT_SECONDS = float(os.environ.get("MICROBATCH_TIMEOUT_SECONDS", 30))
+
+# When MODEL_SERVER_SOCKET is set, model calls go to the shared model server (model_server.py)
+# and this process never loads the models itself.
+MODEL_SERVER_SOCKET = os.environ.get("MODEL_SERVER_SOCKET")
+# Requests then skip nlp_batcher and are sent as they arrive, since the server does the batching.
+# Without MODEL_SERVER_AUTHKEY the client reads the key the server wrote next to its socket.
+model_client = ModelServerClient(MODEL_SERVER_SOCKET, authkey=os.environ.get("MODEL_SERVER_AUTHKEY", "").encode() or None,
+                                 timeout_seconds=MICROBATCH_TIMEOUT_SECONDS) if MODEL_SERVER_SOCKET else None
+
+# Admission control: at most ADMISSION_MAX_IN_FLIGHT requests wait for model work at once (0 for no limit);
+# further requests are shed with a 503. Requests admitted while more than DEGRADE_WATERMARK are in flight
+# get regex-only analysis instead of the models (0 never degrades).
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", 64)) or None
+DEGRADE_WATERMARK = int(os.environ.get("DEGRADE_WATERMARK", 48)) or None
+admission_controller = admission.AdmissionController(ADMISSION_MAX_IN_FLIGHT, DEGRADE_WATERMARK)
+
+# Budget for a request's model work, counted from admission (0 for none). Intent classification has to
+# finish within INTENT_DEADLINE_SHARE of it; entity extraction gets the rest. See nlp_service.analyze_batch.
+REQUEST_DEADLINE_MS = float(os.environ.get("REQUEST_DEADLINE_MS", 10000))
+INTENT_DEADLINE_SHARE = float(os.environ.get("INTENT_DEADLINE_SHARE", 0.5))
+_DEADLINE_MESSAGE = "The server could not answer in time. Please retry shortly."
+
+
+def _analyze_items(items):
+    """
+    nlp_batcher's handler, also called directly with a model server. Items are (query, deadlines, traced)
+    tuples; each gets back (result, spans). The batch may run on the batcher's thread, so when any item
+    is traced the batch is traced here and its spans are handed to every traced item (its stages ran
+    batched, so the batch's timings are its own).
+    The model's stage timings aren't traced when it runs in the model server.
+    """
+    queries = [query for query, _deadlines, _traced in items]
+    deadlines = [deadlines for _query, deadlines, _traced in items]
+    any_traced = any(traced for _query, _deadlines, traced in items)
+    with metrics.trace() if any_traced else contextlib.nullcontext() as spans:
+        if model_client:
+            results = _analyze_on_server(queries, deadlines)
+        else:
+            results = nlp_service.analyze_batch(queries, deadlines)
+    return [(result, spans if traced else None) for result, (_query, _deadlines, traced) in zip(results, items)]
+
+
+def _analyze_on_server(queries, deadlines):
+    """
+    Sends queries to the model server with the seconds left before their deadlines, which the server
+    applies on its own clock. The wait for its answer ends at the last deadline.
+    """
+    now = time.monotonic()
+    budgets = [deadline and (deadline[0] - now, deadline[1] - now) for deadline in deadlines]
+    timeout = MICROBATCH_TIMEOUT_SECONDS
+    if all(budgets):
+        timeout = min(timeout, max(max(budget[1] for budget in budgets), 0.0))
+    return model_client.analyze_batch(queries, budgets, timeout_seconds=timeout)
+
+
+nlp_batcher = MicroBatcher(_analyze_items, max_batch_size=MICROBATCH_MAX_SIZE, max_wait_ms=MICROBATCH_MAX_WAIT_MS,
+                           name="nlp-batcher")
+
+# Set TRACE_REQUESTS=1 to add a per-stage timing trace to every response, not just those that ask for one
+TRACE_REQUESTS = os.environ.get("TRACE_REQUESTS") == "1"
+
+metrics.CallbackGauge(
+    "query_cache_stat", "Query cache entries, bytes, hits, misses, evictions and expirations.", ["cache", "stat"],
+    lambda: {(name, stat): value for name, stats in query_cache.get_cache_stats().items()
+             for stat, value in stats.items() if stat != "name"})
+metrics.CallbackGauge(
+    "nlp_batcher_stat", "Micro-batcher batches, items, batch sizes and queue depth.", ["stat"],
+    lambda: {(stat,): value for stat, value in nlp_batcher.stats().items()})
+metrics.CallbackGauge(
+    "admission_stat", "Requests in flight for model work, admitted and rejected, and the admission limits.", ["stat"],
+    lambda: {(stat,): value for stat, value in admission_controller.stats().items()})
+
+
+def readiness(preload_models=False):
+    """
+    Checks whether this process can answer queries with the models.
+    With a model server, that is whether the server reports its models loaded. Otherwise it is whether
+    the models are loaded in this process -- only required when preload_models is set, since without
+    preloading they load on the first request.
+    :return: (ready, details dict)
+    """
+    if model_client:
+        try:
+            status = model_client.ping()
+        except Exception as e:
+            return False, {"model_server": MODEL_SERVER_SOCKET, "error": str(e)}
+        return bool(status["ready"]), {"model_server": MODEL_SERVER_SOCKET, "server_ready": status["ready"],
+                                       "server_pid": status["pid"]}
+    loaded = nlp_service.models_loaded()
+    return loaded["ready"] or not preload_models, {"models_loaded": loaded, "preload_models": preload_models}
+
+
+def analyze_queries(queries):
+    """
+    Finds the intent and entities for each query.
+    Cached and fast-path queries are answered immediately. If any are left, the request is admitted by
+    admission_controller and the rest are submitted to nlp_batcher together and awaited, or analyzed
+    with regex alone when the controller is above its watermark.
+    :return: List of (intent_key, intent_confidence, entities, error_message) tuples, one per query.
+             Queries whose deadline passed have nlp_service.DEADLINE_EXCEEDED as their error_message, and
+             regex-only answers are nlp_service.DegradedResult tuples.
+    :raises admission.Overloaded: The request was shed, because too many are in flight or the deadline
+                                  passed before any of its queries was answered
+    """
+    results = [None] * len(queries)
+    pending = {}
+
+    for i, user_query in enumerate(queries):
+        cache_key = query_cache.normalize_query(user_query)
+        cached_nlp = query_cache.nlp_cache.get(cache_key)
+        if cached_nlp:
+            intent_key, intent_confidence, entities = cached_nlp
+            results[i] = (intent_key, intent_confidence, dict(entities), None)
+            continue
+        fast_path = nlp_service.analyze_fast_path(user_query)
+        if fast_path:
+            results[i] = fast_path
+            intent_key, intent_confidence, entities, _error_message = fast_path
+            query_cache.nlp_cache.put(cache_key, (intent_key, intent_confidence, dict(entities)))
+            continue
+        pending[i] = cache_key
+
+    if not pending:
+        return results
+
+    try:
+        with admission_controller.admit() as mode:
+            if mode == admission.DEGRADED:
+                # Not cached, so the models answer the query once the load has passed
+                for i in pending:
+                    results[i] = nlp_service.analyze_degraded(queries[i])
+            else:
+                _analyze_with_models(queries, pending, results)
+    except admission.Overloaded as e:
+        metrics.REQUESTS_SHED.inc(reason=e.reason)
+        raise
+    return results
+
+
+def _analyze_now(items):
+    """
+    Runs _analyze_items on the calling thread, bypassing nlp_batcher.
+    :return: Dict of index -> completed future, like the batcher's
+    """
+    futures = {i: concurrent.futures.Future() for i in items}
+    try:
+        outcomes = _analyze_items(list(items.values()))
+    except Exception as e:
+        for future in futures.values():
+            future.set_exception(e)
+    else:
+        for future, outcome in zip(futures.values(), outcomes):
+            future.set_result(outcome)
+    return futures
+
+
+def _analyze_with_models(queries, pending, results):
+    """
+    Submits the pending queries (index -> cache key) to nlp_batcher, or straight to the model server,
+    and fills their results within REQUEST_DEADLINE_MS.
+    """
+    start = time.monotonic()
+    deadlines = None
+    if REQUEST_DEADLINE_MS:
+        budget_seconds = REQUEST_DEADLINE_MS / 1000.0
+        deadlines = (start + budget_seconds * INTENT_DEADLINE_SHARE, start + budget_seconds)
+    traced = metrics.tracing()
+    items = {i: (queries[i], deadlines, traced) for i in pending}
+    if model_client:
+        # The model server batches across every worker already; a second window here would only add latency
+        futures = _analyze_now(items)
+    else:
+        futures = {i: nlp_batcher.submit(item) for i, item in items.items()}
+    # Queries that shared a batch share its spans, which are added to the trace once
+    added_spans = set()
+
+    wait_start = time.perf_counter()
+    try:
+        for i, future in futures.items():
+            timeout = MICROBATCH_TIMEOUT_SECONDS
+            if deadlines:
+                timeout = min(timeout, max(deadlines[1] - time.monotonic(), 0.0))
+            try:
+                results[i], spans = future.result(timeout=timeout)
+            except Exception as e:
+                future.cancel()
+                if deadlines and time.monotonic() >= deadlines[1]:
+                    results[i] = (None, 0.0, None, nlp_service.DEADLINE_EXCEEDED)
+                else:
+                    print(f"Error analyzing query '{queries[i]}': {e}")
+                    results[i] = (None, 0.0, None, None)
+                continue
+            if spans is not None and id(spans) not in added_spans:
+                added_spans.add(id(spans))
+                metrics.add_spans(spans)
+            intent_key, intent_confidence, entities, error_message = results[i]
+            if (intent_key and entities and not error_message
+                    and not isinstance(results[i], nlp_service.DegradedResult)):
+                # Only successful model extractions are cached, so transient errors and
+                # regex-only answers aren't remembered
+                query_cache.nlp_cache.put(pending[i], (intent_key, intent_confidence, entities))
+    finally:
+        # Once the deadline has passed, queries the batcher hasn't started on are dropped
+        for future in futures.values():
+            future.cancel()
+        metrics.BATCH_WAIT_SECONDS.observe(time.perf_counter() - wait_start)
+
+    missed = sum(results[i][3] == nlp_service.DEADLINE_EXCEEDED for i in pending)
+    if missed:
+        metrics.QUERIES_PAST_DEADLINE.inc(missed)
+        if missed == len(queries):
+            # Nothing was answered, so the whole request is shed and can be retried
+            raise admission.Overloaded(_DEADLINE_MESSAGE, reason="deadline")
+
+
+# Months of the schedule shown at the start (and end) of the amortization preview
+SCHEDULE_PREVIEW_MONTHS = 3
+
+
+def _schedule_preview(principal, annual_rate, n_months):
+    """
+    Formats the first and last few months of a loan's amortization schedule for calculation_details.
+    The last months start from their closed-form balance, so the cost doesn't grow with the term.
+    """
+    lines = ["Schedule (month: interest / principal / balance):"]
+    last_month = int(math.ceil(n_months))
+    head = itertools.islice(amortization.iter_schedule(principal, annual_rate, n_months), SCHEDULE_PREVIEW_MONTHS)
+    tail_start = max(last_month - SCHEDULE_PREVIEW_MONTHS + 1, SCHEDULE_PREVIEW_MONTHS + 1)
+    tail = amortization.iter_schedule(principal, annual_rate, n_months, start_month=tail_start)
+    for row in head:
+        lines.append(f"  {row.month}: ${row.interest:,.2f} / ${row.principal:,.2f} / ${row.balance:,.2f}")
+    if tail_start > SCHEDULE_PREVIEW_MONTHS + 1:
+        lines.append("  ...")
+    for row in tail:
+        lines.append(f"  {row.month}: ${row.interest:,.2f} / ${row.principal:,.2f} / ${row.balance:,.2f}")
+    return "\n".join(lines) + "\n"
+
+
+def _irr_with_roots(cashflows):
+    """
+    Solves one series' IRR once, also learning whether it has several (which the scalar calculator can't report).
+    :return: (irr, multiple_roots)
+    :raises ValueError: The cash flows have no IRR in the search range
+    """
+    result = vectorized_calculator.internal_rate_of_return([cashflows])
+    if result.error_codes[0]:
+        raise ValueError(vectorized_calculator.ERROR_MESSAGES[int(result.error_codes[0])])
+    return float(result.values[0]), bool(result.multiple_roots[0])
+
+
+def run_calculation(intent_key, entities):
+    """
+    Maps extracted entities onto the intent's calculator function and calls it.
+    :return: (numeric_result, result_text, calculation_details); numeric_result is None on error
+    """
+    start = time.perf_counter()
+    result_text = ""
+    calculation_details = ""
+    numeric_result = None
+    args_for_calc = {}
+
+    try:
+        intent_config = nlp_service.INTENT_CONFIG[intent_key]
+        calc_func_name = intent_config["calculator_function_name"]
+        
+        # Prepare arguments for the calculator function
+        # Rates are expected as percentages from NLP, convert to decimal for calculator
+        args_for_calc = {}
+        valid_call = True
+        
+        for param_name, value in entities.items():
+            if param_name.endswith("_percent"): # e.g., rate_percent, annual_rate_percent
+                args_for_calc[param_name.replace("_percent", "")] = value / 100.0
+            elif param_name == "time_years": # for simple interest
+                 args_for_calc["time"] = value
+            elif param_name == "term_months": # for loan amortization
+                 args_for_calc["n_months"] = value
+            elif param_name == "compounding_frequency":
+                 args_for_calc["times_compounded_per_year"] = value
+            else: # Handles future_value, present_value, principal, periods, years
+                args_for_calc[param_name] = value
+        
+        # Ensure all required parameters for the specific function are present after mapping
+        # This is a simplified check; more robust mapping might be needed if param names differ greatly
+        # between NLP extraction and calculator function signatures. For now, we assume close mapping.
+
+        # Example: Get the actual calculator function
+        if hasattr(calculator, calc_func_name):
+            calculator_function = getattr(calculator, calc_func_name)
+            
+            # Dynamically call the function with extracted and mapped arguments
+            # This requires careful alignment of NLP param names and function arg names
+            # For simplicity, we'll use if/else based on intent_key for now,
+            # as direct mapping can be tricky with varying param names.
+
+            numeric_result = None
+            if intent_key == "calculate_present_value":
+                numeric_result = query_cache.cached_call(calc_func_name, calculator_function, fv=args_for_calc['future_value'], rate=args_for_calc['rate'], n_periods=args_for_calc['periods'])
+                result_text = f"The Present Value is: ${numeric_result:,.2f}"
+            elif intent_key == "calculate_future_value":
+                numeric_result = query_cache.cached_call(calc_func_name, calculator_function, pv=args_for_calc['present_value'], rate=args_for_calc['rate'], n_periods=args_for_calc['periods'])
+                result_text = f"The Future Value is: ${numeric_result:,.2f}"
+            elif intent_key == "calculate_simple_interest":
+                numeric_result = query_cache.cached_call(calc_func_name, calculator_function, principal=args_for_calc['principal'], rate=args_for_calc['rate'], time=args_for_calc['time'])
+                result_text = f"The Simple Interest earned is: ${numeric_result:,.2f}"
+            elif intent_key == "calculate_compound_interest":
+                numeric_result = query_cache.cached_call(calc_func_name, calculator_function,
+                                                         principal=args_for_calc['principal'], 
+                                                         annual_rate=args_for_calc['annual_rate'], 
+                                                         times_compounded_per_year=args_for_calc['times_compounded_per_year'], 
+                                                         years=args_for_calc['years'])
+                result_text = f"The total amount with Compound Interest (Future Value) is: ${numeric_result:,.2f}"
+            elif intent_key == "calculate_monthly_loan_payment":
+                numeric_result = query_cache.cached_call(calc_func_name, calculator_function,
+                                                         principal=args_for_calc['principal'], 
+                                                         annual_rate=args_for_calc['annual_rate'], 
+                                                         n_months=args_for_calc['n_months'])
+                result_text = f"The Monthly Loan Payment is: ${numeric_result:,.2f}"
+            elif intent_key == "calculate_loan_amortization_schedule":
+                summary = query_cache.cached_call(calc_func_name, calculator_function,
+                                                  principal=args_for_calc['principal'],
+                                                  annual_rate=args_for_calc['annual_rate'],
+                                                  n_months=args_for_calc['n_months'])
+                numeric_result = summary["total_interest"]
+                result_text = (f"The Monthly Loan Payment is ${summary['monthly_payment']:,.2f}; over {args_for_calc['n_months']:g} months "
+                               f"you pay ${summary['total_paid']:,.2f} in total, of which ${numeric_result:,.2f} is interest.")
+                calculation_details += _schedule_preview(args_for_calc['principal'], args_for_calc['annual_rate'], args_for_calc['n_months'])
+            elif intent_key == "calculate_net_present_value":
+                # The initial investment is an outflow at time 0, ahead of the later cash flows
+                args_for_calc['cashflows'] = [-abs(args_for_calc.pop('initial_investment'))] + list(args_for_calc['cashflows'])
+                numeric_result = query_cache.cached_call(calc_func_name, calculator_function,
+                                                         rate=args_for_calc['rate'], cashflows=args_for_calc['cashflows'])
+                result_text = f"The Net Present Value is: ${numeric_result:,.2f}"
+            elif intent_key == "calculate_internal_rate_of_return":
+                args_for_calc['cashflows'] = [-abs(args_for_calc.pop('initial_investment'))] + list(args_for_calc['cashflows'])
+                numeric_result, multiple_roots = query_cache.cached_call("irr_with_roots", _irr_with_roots,
+                                                                         cashflows=args_for_calc['cashflows'])
+                result_text = f"The Internal Rate of Return is: {numeric_result:.2%}"
+                if multiple_roots:
+                    result_text += (" (Warning: these cash flows have more than one IRR; showing the one closest to "
+                                    f"{vectorized_calculator.IRR_GUESS:.0%}.)")
+            else:
+                result_text = "Error: Calculation logic for this intent is not implemented yet."
+                valid_call = False
+
+            if valid_call and numeric_result is not None:
+                 calculation_details += f"Calculation: {calc_func_name}({', '.join(f'{k}={v:.4f}' if isinstance(v, float) else f'{k}={v}' for k, v in args_for_calc.items() if k in calculator_function.__code__.co_varnames)})\n"
+                 calculation_details += f"Result: {numeric_result:.2f}"
+
+
+        else:
+            result_text = f"Error: Calculator function '{calc_func_name}' not found."
+
+    except ValueError as ve: # Catch specific errors from calculator functions
+        numeric_result = None
+        result_text = f"Calculation Error: {ve}"
+    except TypeError as te: # Catch argument mismatch errors
+        numeric_result = None
+        result_text = f"Parameter Mismatch Error: Could not perform calculation. {te}. Check extracted values: {args_for_calc}"
+    except Exception as e:
+        numeric_result = None
+        result_text = f"An unexpected error occurred during calculation: {e}"
+
+    metrics.CALCULATION_SECONDS.observe(
+        time.perf_counter() - start,
+        function=nlp_service.INTENT_CONFIG.get(intent_key, {}).get("calculator_function_name"),
+        outcome="ok" if numeric_result is not None else "error")
+    return numeric_result, result_text, calculation_details
+
+
+def answer_query(user_query, analysis):
+    """
+    Turns one query's analysis from analyze_queries into the response shown to the user.
+    :return: dict with the query, intent, entities, degraded flag, numeric result, result_text and calculation_details
+    """
+    intent_key, intent_confidence, entities, error_message = analysis
+    degraded = isinstance(analysis, nlp_service.DegradedResult)
+    response = {
+        "query": user_query,
+        "intent_key": intent_key,
+        "intent_confidence": intent_confidence,
+        "entities": entities,
+        "degraded": degraded,
+        "result": None,
+        "result_text": "",
+        "calculation_details": "",
+    }
+
+    if error_message == nlp_service.DEADLINE_EXCEEDED:
+        response["result_text"] = f"Error: {_DEADLINE_MESSAGE}"
+        return response
+
+    if not intent_key:
+        response["result_text"] = "Error: Could not understand your request. Please try rephrasing."
+        return response
+
+    # Optional: Check intent confidence
+    # if intent_confidence < 0.7: # Adjust threshold as needed
+    #     result_text = f"Warning: Low confidence ({intent_confidence:.2f}) in understanding intent. Interpreted as: {intent_key.replace('_', ' ').title()}"
+    # else:
+    #     result_text = f"Intent: {intent_key.replace('_', ' ').title()}\n"
+
+    calculation_details = f"Interpreted Action: {nlp_service.INTENT_KEY_TO_LABEL_MAP[intent_key]}\n"
+    if degraded:
+        calculation_details += "Values found with pattern matching only, as the server was busy.\n"
+
+    if error_message:
+        response["result_text"] = f"Error extracting parameters: {error_message}"
+        response["calculation_details"] = calculation_details
+        return response
+
+    if not entities:
+        response["result_text"] = "Error: Could not extract necessary values from your query."
+        response["calculation_details"] = calculation_details
+        return response
+
+    calculation_details += f"Extracted Values: {entities}\n"
+
+    numeric_result, result_text, calc_details = run_calculation(intent_key, entities)
+    response["result"] = numeric_result
+    response["result_text"] = result_text
+    response["calculation_details"] = calculation_details + calc_details
+    return response
+
+
+def _add_trace(response, spans):
+    response["trace"] = [{"metric": name, "labels": labels, "ms": seconds * 1000} for name, labels, seconds in spans]
+    response["calculation_details"] += metrics.format_trace(spans)
+
+
+def answer_queries(queries, trace=False):
+    """
+    Runs the full pipeline for a list of queries, batching model calls across them.
+    :param trace: Add the timings recorded while answering each query to its response, as a "trace"
+                  list and in calculation_details. Analysis is shared by the batch, so its spans
+                  (including the wait for batched model calls) appear in every response.
+    :return: List of response dicts from answer_query, one per query
+    """
+    if not (trace or TRACE_REQUESTS):
+        return [answer_query(user_query, analysis) for user_query, analysis in zip(queries, analyze_queries(queries))]
+
+    with metrics.trace() as analysis_spans:
+        analyses = analyze_queries(queries)
+    responses = []
+    for user_query, analysis in zip(queries, analyses):
+        with metrics.trace() as spans:
+            response = answer_query(user_query, analysis)
+        _add_trace(response, analysis_spans + spans)
+        responses.append(response)
+    return responses
@@ -0,0 +1,158 @@
+# query_cache.py
+"""
+Bounded LRU + TTL caches for the /calculate pipeline.
+* nlp_cache maps normalized query text to (intent_key, intent_confidence, entities).
+* calculation_cache memoizes calculator results keyed on function name and arguments.
+Both are limited in entries and in (approximate) bytes, and count hits, misses and evictions.
+"""
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUTTLCache:
+    def __init__(self, name, max_entries=1024, max_bytes=8 * 1024 * 1024, ttl_seconds=600):
+        """
+        :param name: Name used when reporting stats
+        :param max_entries: Maximum number of entries kept
+        :param max_bytes: Maximum approximate total size of keys and values (pickled) in bytes
+        :param ttl_seconds: Entries older than this are treated as missing; None disables expiry
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (value, size_bytes, expires_at)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _estimate_size(key, value):
+        try:
+            return len(pickle.dumps((key, value), protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return 0
+
+    def _remove(self, key):
+        _value, size_bytes, _expires_at = self._entries.pop(key)
+        self._total_bytes -= size_bytes
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for key, or default if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, _size_bytes, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores value under key, evicting least recently used entries to stay within the limits.
+        Values larger than max_bytes on their own are not cached.
+        """
+        size_bytes = self._estimate_size(key, value)
+        if size_bytes > self.max_bytes or self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size_bytes, expires_at)
+            self._total_bytes += size_bytes
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+nlp_cache = LRUTTLCache(
+    "nlp",
+    max_entries=_env_int("QUERY_CACHE_MAX_ENTRIES", 4096),
+    max_bytes=_env_int("QUERY_CACHE_MAX_BYTES", 8 * 1024 * 1024),
+    ttl_seconds=_env_int("QUERY_CACHE_TTL_SECONDS", 3600),
+)
+
+calculation_cache = LRUTTLCache(
+    "calculation",
+    max_entries=_env_int("CALCULATION_CACHE_MAX_ENTRIES", 4096),
+    max_bytes=_env_int("CALCULATION_CACHE_MAX_BYTES", 2 * 1024 * 1024),
+    ttl_seconds=_env_int("CALCULATION_CACHE_TTL_SECONDS", 3600),
+)
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    """
+    Normalizes query text for use as a cache key: runs of whitespace become one space and the
+    ends are trimmed. Only differences that can't change the extracted values are normalized
+    away. The QA model is cased and reads punctuation, so case and punctuation are kept, and
+    digits and commas stay as written: "300,400,500" may be a list of cash flows or one number.
+    Queries that only differ in such details still share the calculator result through calculation_cache.
+    """
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+def cached_call(func_name, func, **kwargs):
+    """
+    Calls func(**kwargs), memoizing the result in calculation_cache under (func_name, kwargs).
+    Exceptions are not cached.
+    """
+    # Lists (e.g. cashflows) are converted to tuples so the key is hashable
+    key = (func_name, tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                                   for name, value in kwargs.items())))
+    result = calculation_cache.get(key, _MISSING)
+    if result is _MISSING:
+        result = func(**kwargs)
+        calculation_cache.put(key, result)
+    return result
+
+
+def get_cache_stats():
+    return {cache.name: cache.stats() for cache in (nlp_cache, calculation_cache)}
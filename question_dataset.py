@@ -0,0 +1,42 @@
+# question_dataset.py
+"""
+Helpers for question/answer CSV files in the format of financial_questions_and_answers.csv
+(columns: Calculation, Question, Answer).
+"""
+import csv
+import os
+
+import intent_registry
+
+DEFAULT_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "financial_questions_and_answers.csv")
+
+# Map the CSV's "Calculation" column onto intent keys in nlp_service.INTENT_CONFIG (IntentSpec.csv_calculations)
+CALCULATION_TO_INTENT_KEY = {calculation: spec.key for spec in intent_registry.INTENTS
+                             for calculation in spec.csv_calculations}
+
+
+def iter_rows(path=DEFAULT_CSV_PATH):
+    """
+    Streams rows from a question/answer CSV one at a time, so arbitrarily large files use constant memory.
+    :return: Iterator of dicts with "calculation", "question", "answer" and "expected_intent" keys
+    """
+    with open(path, newline="", encoding="utf-8") as f_csv:
+        for row in csv.DictReader(f_csv):
+            calculation = (row.get("Calculation") or "").strip()
+            yield {
+                "calculation": calculation,
+                "question": (row.get("Question") or "").strip(),
+                "answer": (row.get("Answer") or "").strip(),
+                "expected_intent": CALCULATION_TO_INTENT_KEY.get(calculation),
+            }
+
+
+def parse_answer_amount(answer_text):
+    """
+    Parses an expected answer such as "$1,496.97" into a float, or None if it isn't a number.
+    """
+    cleaned = str(answer_text).replace("$", "").replace(",", "").replace("%", "").strip()
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
@@ -0,0 +1,244 @@
+# rule_extractor.py
+"""
+Deterministic, regex-based extraction for the common query shapes
+("$X at Y% for Z years", "compounded quarterly", "over N months").
+Resolves the intent key and parameters for the INTENT_CONFIG schemas without
+running any model, together with a confidence score. nlp_service only trusts
+a match when it is unambiguous and falls back to the transformer pipelines otherwise.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import intent_registry
+
+RuleMatch = namedtuple("RuleMatch", ["intent_key", "entities", "confidence"])
+
+# Matches below this confidence are treated as ambiguous and left to the models.
+RULE_CONFIDENCE_THRESHOLD = 0.9
+
+# --- Intent keywords ---
+# Each intent is recognised by a few unambiguous phrases (IntentSpec.rule_keywords). If none or
+# several intents match, the rules don't guess.
+INTENT_PATTERNS = {spec.key: re.compile(spec.rule_keywords, re.IGNORECASE) for spec in intent_registry.INTENTS}
+
+# --- Slot patterns ---
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?|\.\d+"
+
+RATE_PATTERN = re.compile(
+    r"(?P<num>" + _NUMBER + r")\s*(?:%|percent\b|per cent\b)", re.IGNORECASE)
+
+# Money needs a currency marker or a magnitude suffix, so bare counts aren't mistaken for amounts.
+MONEY_PATTERN = re.compile(
+    r"(?P<currency>\$)\s*(?P<num>" + _NUMBER + r")(?:\s*(?P<word_suffix>thousand|million|billion)\b|(?P<suffix>k|m|mm|bn)\b)?"
+    r"|(?P<num2>" + _NUMBER + r")(?:\s*(?P<word_suffix2>thousand|million|billion)\b|(?P<suffix2>k|m|mm|bn)\b)"
+    r"|(?P<num3>" + _NUMBER + r")\s*(?:dollars|usd)\b",
+    re.IGNORECASE)
+
+DURATION_PATTERN = re.compile(
+    r"(?P<num>" + _NUMBER + r")\s*-?\s*(?P<unit>years?|yrs?|months?|quarters?|periods?)\b", re.IGNORECASE)
+
+COMPOUNDING_WORD_PATTERN = re.compile(
+    r"\bcompound(?:ed|ing)?\s+(?:interest\s+)?(?P<word>semi-?annually|annually|yearly|twice a year|quarterly|monthly|weekly|daily|continuously)\b"
+    r"|\b(?P<word2>semi-?annual|annual|yearly|quarterly|monthly|weekly|daily|continuous)\s+compounding\b",
+    re.IGNORECASE)
+
+COMPOUNDING_COUNT_PATTERN = re.compile(
+    r"\bcompound(?:ed|ing)?\s+(?P<num>\d+)\s+times\s+(?:a|per|each)\s+year\b", re.IGNORECASE)
+
+# A single amount inside a cash flow list, e.g. "$300", "1,500" or "2k"
+_AMOUNT = r"-?\$?\s*(?:" + _NUMBER + r")(?:\s*(?:thousand|million|billion)\b|(?:k|m|mm|bn)\b)?"
+AMOUNT_PATTERN = re.compile(
+    r"(?P<num>" + _NUMBER + r")(?:\s*(?P<word_suffix>thousand|million|billion)\b|(?P<suffix>k|m|mm|bn)\b)?", re.IGNORECASE)
+
+# The upfront cost of an investment ("investing $1,000", "an initial outlay of 5k", "a $2,000 investment")
+INITIAL_INVESTMENT_PATTERN = re.compile(
+    r"\b(?:initial investment|initial outlay|upfront cost|investing|invests?|costs?|outlay)\s+(?:of\s+)?(?P<amount>" + _AMOUNT + r")"
+    r"|(?P<amount2>\$\s*(?:" + _NUMBER + r")(?:\s*(?:thousand|million|billion)\b|(?:k|m|mm|bn)\b)?)\s+(?:initial\s+)?investment\b",
+    re.IGNORECASE)
+
+# Two or more amounts following "cash flows of", "returning", "receiving", ...
+CASHFLOW_LIST_PATTERN = re.compile(
+    r"\b(?:cash ?flows?|returns?|returning|receiving|receives?|pays? out|paying out)\s+(?:of\s+|are\s+|:\s*)?"
+    r"(?P<list>" + _AMOUNT + r"(?:\s*(?:,\s*(?:and\s+|then\s+)?|and\s+|then\s+)" + _AMOUNT + r")+)",
+    re.IGNORECASE)
+
+MAGNITUDE_SUFFIXES = {
+    "k": 1e3, "thousand": 1e3,
+    "m": 1e6, "mm": 1e6, "million": 1e6,
+    "bn": 1e9, "billion": 1e9,
+}
+
+# Word multipliers for compounding frequency. Continuous compounding has no
+# finite frequency in compound_interest, so it is left to the models.
+COMPOUNDING_FREQUENCIES = {
+    "annually": 1, "annual": 1, "yearly": 1,
+    "semiannually": 2, "semi-annually": 2, "semiannual": 2, "semi-annual": 2, "twice a year": 2,
+    "quarterly": 4,
+    "monthly": 12,
+    "weekly": 52,
+    "daily": 365,
+}
+
+# Which slot feeds which INTENT_CONFIG parameter for each intent (IntentSpec.slots).
+INTENT_SLOTS = {spec.key: dict(spec.slots) for spec in intent_registry.INTENTS}
+
+# How a duration is expressed in each parameter's unit. None keeps the number as written,
+# matching what the QA model returns for a generic "periods" question.
+_DURATION_UNITS = {
+    "periods": None,
+    "time_years": "years",
+    "years": "years",
+    "term_months": "months",
+}
+
+
+def _to_float(number_text):
+    return float(number_text.replace(",", ""))
+
+
+def _parse_amount(amount_text):
+    match = AMOUNT_PATTERN.search(amount_text)
+    suffix = match.group("word_suffix") or match.group("suffix")
+    value = _to_float(match.group("num")) * MAGNITUDE_SUFFIXES.get((suffix or "").lower(), 1)
+    return -value if amount_text.lstrip().startswith("-") else value
+
+
+def _overlaps(span, taken_spans):
+    return any(span[0] < end and start < span[1] for start, end in taken_spans)
+
+
+def _convert_duration(value, unit, target_unit):
+    """
+    Converts a duration written in `unit` into `target_unit` (years or months).
+    """
+    if target_unit is None:
+        return value
+    unit = unit.lower()
+    if unit.startswith("month"):
+        months = value
+    elif unit.startswith("quarter"):
+        months = value * 3
+    elif unit.startswith("period"):
+        return value # Unknown period length; take it as written
+    else:
+        months = value * 12
+    return months if target_unit == "months" else months / 12
+
+
+def find_slots(query, cashflow_slots=False):
+    """
+    Finds every rate, money amount, duration and compounding frequency mentioned in the query.
+    Rates are matched first so "5%" is never read as an amount or duration.
+    :param cashflow_slots: Also look for an initial investment and a list of cash flows (NPV/IRR queries),
+                           which then claim their amounts ahead of the generic money slot
+    :return: dict of slot name -> list of values (durations are (value, unit) pairs, cash flows are tuples)
+    """
+    taken_spans = []
+    slots = {"rate": [], "money": [], "duration": [], "frequency": []}
+
+    for match in RATE_PATTERN.finditer(query):
+        slots["rate"].append(_to_float(match.group("num")))
+        taken_spans.append(match.span())
+
+    if cashflow_slots:
+        slots["initial"] = []
+        slots["cashflows"] = []
+        for match in INITIAL_INVESTMENT_PATTERN.finditer(query):
+            if _overlaps(match.span(), taken_spans):
+                continue
+            slots["initial"].append(_parse_amount(match.group("amount") or match.group("amount2")))
+            taken_spans.append(match.span())
+        for match in CASHFLOW_LIST_PATTERN.finditer(query):
+            if _overlaps(match.span(), taken_spans):
+                continue
+            amounts = re.findall(_AMOUNT, match.group("list"), re.IGNORECASE)
+            slots["cashflows"].append(tuple(_parse_amount(amount) for amount in amounts))
+            taken_spans.append(match.span())
+
+    for match in MONEY_PATTERN.finditer(query):
+        if _overlaps(match.span(), taken_spans):
+            continue
+        number = match.group("num") or match.group("num2") or match.group("num3")
+        suffix = (match.group("word_suffix") or match.group("suffix")
+                  or match.group("word_suffix2") or match.group("suffix2"))
+        value = _to_float(number) * MAGNITUDE_SUFFIXES.get((suffix or "").lower(), 1)
+        slots["money"].append(value)
+        taken_spans.append(match.span())
+
+    for match in DURATION_PATTERN.finditer(query):
+        if _overlaps(match.span(), taken_spans):
+            continue
+        slots["duration"].append((_to_float(match.group("num")), match.group("unit")))
+        taken_spans.append(match.span())
+
+    for match in COMPOUNDING_WORD_PATTERN.finditer(query):
+        word = (match.group("word") or match.group("word2")).lower()
+        # None marks continuous compounding, which the rules can't express
+        slots["frequency"].append(COMPOUNDING_FREQUENCIES.get(word))
+    for match in COMPOUNDING_COUNT_PATTERN.finditer(query):
+        slots["frequency"].append(int(match.group("num")))
+
+    return slots
+
+
+def match_intent(query):
+    """
+    :return: The intent key whose keywords alone appear in the query, or None when none or several match
+    """
+    matched_intents = [key for key, pattern in INTENT_PATTERNS.items() if pattern.search(query)]
+    return matched_intents[0] if len(matched_intents) == 1 else None
+
+
+def match_slots(query, intent_key):
+    """
+    Fills intent_key's parameters from the slots found in the query. A parameter is only filled when
+    its slot has exactly one candidate.
+    :return: (entities, confidence), confidence halved for each parameter left out and for each
+             slot found that the intent doesn't use. An intent without an INTENT_SLOTS entry gets no entities.
+    """
+    slot_map = INTENT_SLOTS.get(intent_key, {})
+    slots = find_slots(query, cashflow_slots="cashflows" in slot_map)
+
+    entities = {}
+    confidence = 1.0
+    for slot_name, param_name in slot_map.items():
+        candidates = slots[slot_name]
+        if len(candidates) != 1 or candidates[0] is None:
+            # Missing, or several candidates we can't tell apart
+            confidence *= 0.5
+            continue
+        if slot_name == "duration":
+            value, unit = candidates[0]
+            entities[param_name] = _convert_duration(value, unit, _DURATION_UNITS[param_name])
+        elif slot_name == "cashflows":
+            entities[param_name] = candidates[0]
+        else:
+            entities[param_name] = float(candidates[0])
+
+    # Anything mentioned but not used by this intent suggests the query means something else
+    for slot_name, candidates in slots.items():
+        if candidates and slot_name not in slot_map:
+            confidence *= 0.5
+
+    return entities, confidence
+
+
+@lru_cache(maxsize=1024)
+def match_query(query):
+    """
+    Resolves a query to an intent and its parameters using the rules alone.
+    :param query: The user's query text
+    :return: RuleMatch(intent_key, entities, confidence). intent_key is None and
+             confidence 0.0 when no single intent is recognised. Treat entities as read-only;
+             results are cached.
+    """
+    if not query:
+        return RuleMatch(None, {}, 0.0)
+
+    intent_key = match_intent(query)
+    if not intent_key:
+        return RuleMatch(None, {}, 0.0)
+
+    entities, confidence = match_slots(query, intent_key)
+    return RuleMatch(intent_key, entities, confidence)
@@ -0,0 +1,133 @@
+# synthetic_queries.py
+"""
+Generates synthetic financial queries from nlp_service.INTENT_CONFIG: for each intent, random
+values for every parameter are phrased with a few templates, giving (query, intent_key, entities)
+examples for benchmarks and for training data.
+"""
+import math
+import random
+from collections import namedtuple
+
+import intent_registry
+import nlp_service
+
+# spans maps each parameter to the (start, end) character offsets of its value in query
+SyntheticQuery = namedtuple("SyntheticQuery", ["query", "intent_key", "entities", "spans"])
+
+# How to draw a value for each parameter, and ways to phrase it. Parameters are matched by name
+# across intents, so a new intent only needs entries for parameter names not listed here.
+PARAMETER_TEMPLATES = {
+    "principal": (lambda rng: rng.choice([500, 1000, 2500, 10000, 25000, 150000, 300000]),
+                  ["${value:,.0f}", "a principal of ${value:,.0f}", "${value:,.0f} borrowed"]),
+    "present_value": (lambda rng: rng.choice([500, 1000, 1500, 5000, 20000]),
+                      ["${value:,.0f} invested today", "an initial ${value:,.0f}", "${value:,.0f}"]),
+    "future_value": (lambda rng: rng.choice([1000, 2000, 5000, 10000, 50000]),
+                     ["${value:,.0f} received later", "${value:,.0f} in the future", "a future amount of ${value:,.0f}"]),
+    "rate_percent": (lambda rng: rng.choice([2, 3.5, 4, 5, 6, 7.25, 8, 10]),
+                     ["{value:g}%", "an interest rate of {value:g}%", "{value:g} percent"]),
+    "annual_rate_percent": (lambda rng: rng.choice([2.5, 3, 4.5, 5, 6, 6.5, 9]),
+                            ["{value:g}% annual interest", "an annual rate of {value:g}%", "{value:g}% a year"]),
+    "periods": (lambda rng: rng.randint(1, 30),
+                ["{value:g} years", "{value:g} periods", "over {value:g} years"]),
+    "time_years": (lambda rng: rng.randint(1, 15),
+                   ["for {value:g} years", "over {value:g} years", "{value:g} years"]),
+    "years": (lambda rng: rng.randint(1, 30),
+              ["for {value:g} years", "after {value:g} years", "over {value:g} years"]),
+    "compounding_frequency": (lambda rng: rng.choice([1, 2, 4, 12, 365]),
+                              ["compounded {value:g} times per year", "compounded {value:g} times a year"]),
+    "term_months": (lambda rng: rng.choice([12, 24, 36, 60, 120, 180, 360]),
+                    ["over {value:g} months", "for {value:g} months", "a {value:g}-month term"]),
+    "initial_investment": (lambda rng: rng.choice([1000, 5000, 10000, 25000]),
+                           ["an initial investment of ${value:,.0f}", "an upfront cost of ${value:,.0f}"]),
+    "cashflows": (lambda rng: [rng.choice([200, 300, 400, 500, 1000, 2500]) for _ in range(rng.randint(2, 5))],
+                  ["cash flows of {value}", "returns of {value}"]),
+}
+
+# Lead-in phrases per intent (IntentSpec.lead_phrases); the intent's readable label is always one of the options
+INTENT_PHRASES = {spec.key: list(spec.lead_phrases) for spec in intent_registry.INTENTS}
+
+_missing_templates = {param_name for config in nlp_service.INTENT_CONFIG.values()
+                      for param_name in config["parameters"]} - set(PARAMETER_TEMPLATES)
+if _missing_templates:
+    raise ValueError(f"PARAMETER_TEMPLATES has no entry for parameters {sorted(_missing_templates)}.")
+
+
+def _format_value(value):
+    if isinstance(value, list):
+        return ", ".join(f"${item:,.0f}" for item in value[:-1]) + f" and ${value[-1]:,.0f}"
+    return value
+
+
+def _value_span(phrasing, fragment):
+    """
+    Offsets of the formatted value (including a leading "$" or trailing "%") within fragment = phrasing.format(...).
+    """
+    placeholder_start = phrasing.index("{value")
+    suffix = phrasing[phrasing.index("}", placeholder_start) + 1:]
+    start = placeholder_start - 1 if phrasing[:placeholder_start].endswith("$") else placeholder_start
+    end = len(fragment) - len(suffix) + (1 if suffix.startswith("%") else 0)
+    return start, end
+
+
+def generate_query(rng, intent_key):
+    """
+    Builds one synthetic query for intent_key.
+    :param rng: random.Random instance
+    :return: SyntheticQuery(query, intent_key, entities, spans)
+    """
+    config = nlp_service.INTENT_CONFIG[intent_key]
+    label = nlp_service.INTENT_KEY_TO_LABEL_MAP[intent_key]
+    lead = rng.choice(INTENT_PHRASES[intent_key] + [label + ":"])
+
+    entities = {}
+    fragments = []
+    for param_name in config["parameters"]:
+        draw, phrasings = PARAMETER_TEMPLATES[param_name]
+        value = draw(rng)
+        entities[param_name] = [float(item) for item in value] if isinstance(value, list) else float(value)
+        phrasing = rng.choice(phrasings)
+        fragment = phrasing.format(value=_format_value(value))
+        fragments.append((param_name, fragment, _value_span(phrasing, fragment)))
+    rng.shuffle(fragments)
+
+    # "<lead> <f1>, <f2> and <f3>?", tracking where each fragment lands
+    query = lead + " "
+    spans = {}
+    for i, (param_name, fragment, (start, end)) in enumerate(fragments):
+        if i:
+            query += " and " if i == len(fragments) - 1 else ", "
+        spans[param_name] = (len(query) + start, len(query) + end)
+        query += fragment
+    query += "?"
+    return SyntheticQuery(query, intent_key, entities, spans)
+
+
+def generate_queries(n, seed=0, intent_keys=None):
+    """
+    Generates n synthetic queries, cycling through the intents so each is equally represented.
+    :param n: Number of queries
+    :param seed: Seed for reproducible output
+    :param intent_keys: Intents to generate (defaults to all of INTENT_CONFIG)
+    :return: List of SyntheticQuery
+    """
+    rng = random.Random(seed)
+    intent_keys = list(intent_keys or nlp_service.INTENT_CONFIG)
+    return [generate_query(rng, intent_keys[i % len(intent_keys)]) for i in range(n)]
+
+
+def entities_match(left, right, rel_tolerance=1e-6):
+    """
+    Whether two entity dicts have the same parameters with (nearly) equal values, lists compared element-wise.
+    """
+    if set(left) != set(right):
+        return False
+    for name, value in left.items():
+        other = right[name]
+        if isinstance(value, (list, tuple)) or isinstance(other, (list, tuple)):
+            if not isinstance(value, (list, tuple)) or not isinstance(other, (list, tuple)) or len(value) != len(other):
+                return False
+            if not all(math.isclose(a, b, rel_tol=rel_tolerance) for a, b in zip(value, other)):
+                return False
+        elif not math.isclose(value, other, rel_tol=rel_tolerance):
+            return False
+    return True
@@ -0,0 +1,190 @@
+# train_joint_model.py
+"""
+Trains the joint intent + slot model (joint_model.py) by distilling the existing pipelines.
+
+1. Queries are generated from the intent registry with synthetic_queries.py.
+2. The teacher labels them: with --teacher pipelines (default) the intent comes from get_intent_batch
+   and each parameter's span from the QA pipeline's answer offsets; with --teacher generator the
+   generator's own intent and value spans are used, which needs no models.
+   Pipeline labels that disagree with the generator's known values are dropped unless --keep-disagreements is given.
+3. An encoder with an intent head and a BIO token-tagging head is fine-tuned on the labels and
+   written to --output-dir, where NLP_MODE=joint loads it from (JOINT_MODEL_DIR).
+4. The saved model is evaluated on held-out generated queries against their known intents and values.
+
+Usage:
+    python train_joint_model.py [--examples 4000] [--teacher pipelines] [--base-model distilbert-base-cased] [--epochs 3]
+"""
+import argparse
+import random
+import time
+
+import torch
+from transformers import AutoModel, AutoTokenizer
+
+import joint_model
+import nlp_service
+import synthetic_queries
+
+
+def label_with_pipelines(generated, batch_size):
+    """
+    Labels generated queries with the zero-shot and QA pipelines.
+    :return: List of (query, intent_key, spans, agrees_with_generator)
+    """
+    labelled = []
+    for start in range(0, len(generated), batch_size):
+        batch = generated[start:start + batch_size]
+        queries = [item.query for item in batch]
+        intents = nlp_service.get_intent_batch(queries)
+
+        questions, contexts, owners = [], [], []
+        for i, (query, (intent_key, _confidence)) in enumerate(zip(queries, intents)):
+            for param_name, question_text in nlp_service.INTENT_CONFIG.get(intent_key, {}).get("parameters", {}).items():
+                questions.append(question_text)
+                contexts.append(query)
+                owners.append((i, param_name))
+        qa_results = nlp_service._run_qa_batch(questions, contexts)
+
+        spans = [{} for _ in batch]
+        values = [{} for _ in batch]
+        for (i, param_name), qa_result in zip(owners, qa_results):
+            if isinstance(qa_result, Exception) or not qa_result or qa_result["score"] <= 0.1:
+                continue
+            config = nlp_service.INTENT_CONFIG[intents[i][0]]
+            parse = nlp_service.parse_numerical_list if param_name in config.get("list_params", []) else nlp_service.parse_numerical_value
+            value = parse(qa_result["answer"])
+            if value is not None:
+                spans[i][param_name] = (qa_result["start"], qa_result["end"])
+                values[i][param_name] = value
+
+        for item, (intent_key, _confidence), item_spans, item_values in zip(batch, intents, spans, values):
+            agrees = intent_key == item.intent_key and synthetic_queries.entities_match(item_values, item.entities)
+            labelled.append((item.query, intent_key, item_spans, agrees))
+    return labelled
+
+
+def encode_examples(tokenizer, examples, intent_keys, tags, max_length):
+    """
+    Tokenizes labelled examples and converts their spans to BIO label ids.
+    :return: List of (input_ids, intent_id, slot_label_ids)
+    """
+    intent_to_id = {key: i for i, key in enumerate(intent_keys)}
+    tag_to_id = {tag: i for i, tag in enumerate(tags)}
+    encoded = tokenizer([query for query, _intent_key, _spans in examples], truncation=True, max_length=max_length,
+                        return_offsets_mapping=True)
+    return [
+        (input_ids, intent_to_id[intent_key], joint_model.tag_tokens(offsets, spans, tag_to_id))
+        for input_ids, offsets, (_query, intent_key, spans)
+        in zip(encoded["input_ids"], encoded["offset_mapping"], examples)
+    ]
+
+
+def collate(batch, pad_token_id):
+    max_len = max(len(input_ids) for input_ids, _intent_id, _labels in batch)
+    input_ids = torch.full((len(batch), max_len), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(batch), max_len), dtype=torch.long)
+    slot_labels = torch.full((len(batch), max_len), joint_model.IGNORE_LABEL_ID, dtype=torch.long)
+    for row, (ids, _intent_id, labels) in enumerate(batch):
+        input_ids[row, :len(ids)] = torch.tensor(ids)
+        attention_mask[row, :len(ids)] = 1
+        slot_labels[row, :len(labels)] = torch.tensor(labels)
+    intent_ids = torch.tensor([intent_id for _ids, intent_id, _labels in batch], dtype=torch.long)
+    return input_ids, attention_mask, intent_ids, slot_labels
+
+
+def train(model, encoded, epochs, batch_size, learning_rate, pad_token_id, seed):
+    rng = random.Random(seed)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=learning_rate)
+    total_steps = epochs * ((len(encoded) + batch_size - 1) // batch_size)
+    scheduler = torch.optim.lr_scheduler.LambdaLR(optimizer, lambda step: max(0.0, 1 - step / total_steps))
+    loss_function = torch.nn.CrossEntropyLoss(ignore_index=joint_model.IGNORE_LABEL_ID)
+
+    model.train()
+    for epoch in range(epochs):
+        order = list(range(len(encoded)))
+        rng.shuffle(order)
+        epoch_loss = 0.0
+        start = time.perf_counter()
+        for batch_start in range(0, len(order), batch_size):
+            batch = [encoded[i] for i in order[batch_start:batch_start + batch_size]]
+            input_ids, attention_mask, intent_ids, slot_labels = collate(batch, pad_token_id)
+            intent_logits, slot_logits = model(input_ids, attention_mask)
+            loss = (loss_function(intent_logits, intent_ids)
+                    + loss_function(slot_logits.reshape(-1, slot_logits.shape[-1]), slot_labels.reshape(-1)))
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            scheduler.step()
+            epoch_loss += loss.item() * len(batch)
+        print(f"Epoch {epoch + 1}/{epochs}: loss {epoch_loss / len(encoded):.4f} ({time.perf_counter() - start:.0f}s)")
+    model.eval()
+
+
+def evaluate(model_dir, n_queries, seed):
+    """
+    Runs the saved model through nlp_service.analyze_batch_joint on held-out generated queries
+    and compares against the known intents and values.
+    """
+    from joint_model import JointIntentSlotExtractor
+
+    nlp_service.set_models(joint_model=JointIntentSlotExtractor(model_dir))
+    generated = synthetic_queries.generate_queries(n_queries, seed=seed)
+
+    start = time.perf_counter()
+    results = nlp_service.analyze_batch_joint([item.query for item in generated])
+    elapsed = time.perf_counter() - start
+    intent_correct = sum(intent_key == item.intent_key for item, (intent_key, _c, _e, _err) in zip(generated, results))
+    entities_correct = sum(intent_key == item.intent_key and not error and synthetic_queries.entities_match(entities, item.entities)
+                           for item, (intent_key, _c, entities, error) in zip(generated, results))
+    print(f"Held-out accuracy on {n_queries} queries: intent {intent_correct / n_queries:.1%}, "
+          f"intent + all values {entities_correct / n_queries:.1%}, {1000 * elapsed / n_queries:.1f} ms/query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the joint intent + slot model by distilling the pipelines.")
+    parser.add_argument("--examples", type=int, default=4000, help="Generated training queries")
+    parser.add_argument("--eval-examples", type=int, default=400, help="Held-out generated queries for evaluation")
+    parser.add_argument("--teacher", choices=["pipelines", "generator"], default="pipelines",
+                        help="Label with the zero-shot + QA pipelines, or with the generator's known spans")
+    parser.add_argument("--keep-disagreements", action="store_true",
+                        help="Keep pipeline labels that disagree with the generator's known values")
+    parser.add_argument("--base-model", default="distilbert-base-cased", help="Encoder to fine-tune (needs a fast tokenizer)")
+    parser.add_argument("--output-dir", default=nlp_service.JOINT_MODEL_DIR, help="Where to save the model")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--learning-rate", type=float, default=5e-5)
+    parser.add_argument("--max-length", type=int, default=96, help="Maximum tokens per query")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    generated = synthetic_queries.generate_queries(args.examples, seed=args.seed)
+    if args.teacher == "generator":
+        examples = [(item.query, item.intent_key, item.spans) for item in generated]
+    else:
+        # The rule fast path is part of the teacher, but spans always come from QA
+        labelled = label_with_pipelines(generated, args.batch_size)
+        agreeing = sum(agrees for *_rest, agrees in labelled)
+        print(f"Teacher agrees with the generator on {agreeing}/{len(labelled)} queries")
+        examples = [(query, intent_key, spans) for query, intent_key, spans, agrees in labelled
+                    if intent_key and (agrees or args.keep_disagreements)]
+    print(f"Training on {len(examples)} labelled queries")
+
+    intent_keys = list(nlp_service.INTENT_CONFIG)
+    tags = joint_model.bio_tags(joint_model.slot_names())
+    tokenizer = AutoTokenizer.from_pretrained(args.base_model)
+    if not tokenizer.is_fast:
+        parser.error(f"{args.base_model} has no fast tokenizer, which is needed for character offsets")
+    encoded = encode_examples(tokenizer, examples, intent_keys, tags, args.max_length)
+
+    model = joint_model.JointIntentSlotModel(AutoModel.from_pretrained(args.base_model), len(intent_keys), len(tags))
+    train(model, encoded, args.epochs, args.batch_size, args.learning_rate, tokenizer.pad_token_id, args.seed)
+    joint_model.save_joint_model(model, tokenizer, intent_keys, tags, args.output_dir, args.base_model, args.max_length)
+    print(f"Saved the joint model to {args.output_dir}")
+
+    # A different seed, so evaluation queries are new combinations of values and phrasings
+    evaluate(args.output_dir, args.eval_examples, seed=args.seed + 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+# vectorized_calculator.py
+"""
+Array-aware versions of the calculator functions. Every argument may be a scalar or a NumPy
+array, and arguments broadcast against each other, so rate x term x principal grids with
+millions of cells are computed in a single call instead of a Python loop.
+
+Edge cases follow calculator.py, except that invalid inputs are reported per element instead
+of raising on the first bad value: such cells are NaN in `values` and carry a non-zero code in
+`error_codes` (see ERROR_MESSAGES for the matching calculator.py error message).
+"""
+from collections import namedtuple
+
+import numpy as np
+
+ArrayResult = namedtuple("ArrayResult", ["values", "error_codes"])
+IRRResult = namedtuple("IRRResult", ["values", "error_codes", "multiple_roots", "iterations"])
+SensitivityGrid = namedtuple("SensitivityGrid", ["values", "error_codes", "axes"])
+
+# Error codes stored in ArrayResult.error_codes
+OK = 0
+INVALID_COMPOUNDING_FREQUENCY = 1
+INVALID_N_MONTHS = 2
+NEGATIVE_ANNUAL_RATE = 3
+INVALID_DISCOUNT_RATE = 4
+NO_SIGN_CHANGE = 5
+IRR_NOT_FOUND = 6
+
+ERROR_MESSAGES = {
+    INVALID_COMPOUNDING_FREQUENCY: "Number of times compounded per year must be greater than 0.",
+    INVALID_N_MONTHS: "Number of months must be greater than 0.",
+    NEGATIVE_ANNUAL_RATE: "Annual rate cannot be negative.",
+    INVALID_DISCOUNT_RATE: "Discount rate must be greater than -100%.",
+    NO_SIGN_CHANGE: "Cashflows must include both positive and negative values to have an IRR.",
+    IRR_NOT_FOUND: "Could not find an IRR between -99% and 1000%.",
+}
+
+# Starting rate for IRR solves, and the rate the returned root is closest to when there are several
+IRR_GUESS = 0.1
+
+# Rates scanned when bracketing IRRs: dense near zero, where nearly all real-world IRRs lie
+IRR_SCAN_RATES = np.unique(np.concatenate([
+    np.linspace(-0.99, -0.5, 25, endpoint=False),
+    np.linspace(-0.5, 1.0, 151, endpoint=False),
+    np.geomspace(1.0, 10.0, 40),
+]))
+
+
+def _as_float_arrays(*args):
+    return np.broadcast_arrays(*(np.asarray(arg, dtype=np.float64) for arg in args))
+
+
+def _no_errors(values):
+    return ArrayResult(values, np.zeros(values.shape, dtype=np.uint8))
+
+
+def present_value(fv, rate, n_periods):
+    """
+    Vectorized calculator.present_value.
+    :return: ArrayResult of present values
+    """
+    fv, rate, n_periods = _as_float_arrays(fv, rate, n_periods)
+    return _no_errors(fv / ((1 + rate) ** n_periods))
+
+
+def future_value(pv, rate, n_periods):
+    """
+    Vectorized calculator.future_value.
+    :return: ArrayResult of future values
+    """
+    pv, rate, n_periods = _as_float_arrays(pv, rate, n_periods)
+    return _no_errors(pv * ((1 + rate) ** n_periods))
+
+
+def simple_interest(principal, rate, time):
+    """
+    Vectorized calculator.simple_interest.
+    :return: ArrayResult of simple interest amounts
+    """
+    principal, rate, time = _as_float_arrays(principal, rate, time)
+    return _no_errors(principal * rate * time)
+
+
+def compound_interest(principal, annual_rate, times_compounded_per_year, years):
+    """
+    Vectorized calculator.compound_interest. Cells with a compounding frequency <= 0
+    are NaN with error code INVALID_COMPOUNDING_FREQUENCY.
+    :return: ArrayResult of total amounts after compound interest
+    """
+    principal, annual_rate, frequency, years = _as_float_arrays(principal, annual_rate, times_compounded_per_year, years)
+    invalid = frequency <= 0
+    safe_frequency = np.where(invalid, 1.0, frequency)
+
+    values = principal * ((1 + annual_rate / safe_frequency) ** (safe_frequency * years))
+    values = np.where(invalid, np.nan, values)
+    error_codes = np.where(invalid, INVALID_COMPOUNDING_FREQUENCY, OK).astype(np.uint8)
+    return ArrayResult(values, error_codes)
+
+
+def loan_amortization_payment(principal, annual_rate, n_months):
+    """
+    Vectorized calculator.loan_amortization_payment. Zero-rate cells are principal / n_months.
+    Cells with n_months <= 0 (INVALID_N_MONTHS) or a negative rate (NEGATIVE_ANNUAL_RATE) are NaN;
+    when both apply, the n_months error is reported, as the scalar function checks it first.
+    :return: ArrayResult of monthly payments
+    """
+    principal, annual_rate, n_months = _as_float_arrays(principal, annual_rate, n_months)
+    bad_months = n_months <= 0
+    bad_rate = ~bad_months & (annual_rate < 0)
+    invalid = bad_months | bad_rate
+    zero_rate = annual_rate == 0
+
+    # Substitute harmless values in cells that are masked out below, to avoid spurious warnings:
+    # a zero rate there keeps growth at 1 for any term, and its denominator is replaced by 1
+    masked = zero_rate | invalid
+    safe_months = np.where(bad_months, 1.0, n_months)
+    monthly_rate = np.where(masked, 0.0, annual_rate / 12)
+    growth = (1 + monthly_rate) ** safe_months
+    payment = principal * (monthly_rate * growth) / np.where(masked, 1.0, growth - 1)
+
+    values = np.where(zero_rate, principal / safe_months, payment)
+    values = np.where(invalid, np.nan, values)
+    error_codes = np.select([bad_months, bad_rate], [INVALID_N_MONTHS, NEGATIVE_ANNUAL_RATE], OK).astype(np.uint8)
+    return ArrayResult(values, error_codes)
+
+
+def pad_cashflows(cashflow_series):
+    """
+    Packs cashflow series of different lengths into one (n_series, n_periods) array.
+    Series are padded with trailing zeros, which change neither NPV nor IRR.
+    """
+    cashflow_series = [np.asarray(series, dtype=np.float64).ravel() for series in cashflow_series]
+    n_periods = max((len(series) for series in cashflow_series), default=0)
+    padded = np.zeros((len(cashflow_series), n_periods))
+    for i, series in enumerate(cashflow_series):
+        padded[i, :len(series)] = series
+    return padded
+
+
+def _as_cashflow_matrix(cashflows):
+    if isinstance(cashflows, np.ndarray):
+        return np.atleast_2d(cashflows.astype(np.float64, copy=False))
+    if len(cashflows) and np.ndim(cashflows[0]) == 0:
+        return pad_cashflows([cashflows]) # A single series
+    return pad_cashflows(cashflows)
+
+
+def _npv_and_derivative(discount, cashflows):
+    """
+    Evaluates NPV(v) = sum(cf_t * v**t) and its derivative dNPV/dv by Horner's rule, where v = 1 / (1 + rate).
+    Only one value per (series, rate) is kept per step, so memory doesn't grow with the number of periods.
+    """
+    value = np.zeros(np.broadcast_shapes(discount.shape, cashflows.shape[:-1]))
+    derivative = np.zeros_like(value)
+    for t in range(cashflows.shape[-1] - 1, -1, -1):
+        derivative = derivative * discount + value
+        value = value * discount + cashflows[..., t]
+    return value, derivative
+
+
+def net_present_value(rate, cashflows):
+    """
+    Vectorized calculator.net_present_value over many cashflow series and rates at once.
+    :param rate: Discount rate(s) per period as decimals; broadcasts against the series axis of cashflows,
+                 e.g. shape (n_series,) for one rate per series, or (n_rates, 1) for every rate x every series
+    :param cashflows: One series (1-D), an (n_series, n_periods) array, or a list of series of any lengths;
+                      cashflows[..., 0] is at time 0
+    :return: ArrayResult of NPVs; rates <= -100% are NaN with INVALID_DISCOUNT_RATE
+    """
+    cashflows = _as_cashflow_matrix(cashflows)
+    rate = np.asarray(rate, dtype=np.float64)
+    invalid = rate <= -1
+    discount = 1 / (1 + np.where(invalid, 0.0, rate))
+
+    values, _derivative = _npv_and_derivative(discount, cashflows)
+    invalid = np.broadcast_to(invalid, values.shape)
+    values = np.where(invalid, np.nan, values)
+    error_codes = np.where(invalid, INVALID_DISCOUNT_RATE, OK).astype(np.uint8)
+    return ArrayResult(values, error_codes)
+
+
+def _count_sign_changes(values, axis=-1):
+    signs = np.sign(values)
+    changes = np.zeros(np.delete(signs.shape, axis), dtype=np.int64)
+    # Zeros don't break a run of equal signs, so compare each value to the previous non-zero sign
+    previous = np.zeros_like(changes, dtype=signs.dtype)
+    for column in np.moveaxis(signs, axis, 0):
+        changes += (column != 0) & (previous != 0) & (column != previous)
+        previous = np.where(column != 0, column, previous)
+    return changes
+
+
+def internal_rate_of_return(cashflows, guess=IRR_GUESS, tol=1e-10, max_iter=100):
+    """
+    Batched IRR solver using Newton steps inside a bracket, falling back to bisection whenever a
+    step would leave the bracket, so every series converges even where Newton alone would diverge.
+
+    By Descartes' rule of signs a series whose cashflows change sign once has exactly one IRR, so it
+    is bracketed by the whole search range [-99%, 1000%] and solved from `guess`. Series with several
+    sign changes may have several IRRs: their NPV is scanned over IRR_SCAN_RATES, they are flagged in
+    `multiple_roots` if it changes sign more than once, and the root nearest `guess` is returned.
+
+    :param cashflows: One series (1-D), an (n_series, n_periods) array, or a list of series of any lengths
+    :param guess: Starting rate, and the rate used to choose between several roots
+    :param tol: Convergence tolerance on the rate
+    :param max_iter: Maximum Newton/bisection steps
+    :return: IRRResult(values, error_codes, multiple_roots, iterations); series without an IRR are NaN
+             with NO_SIGN_CHANGE or IRR_NOT_FOUND
+    """
+    cashflows = _as_cashflow_matrix(cashflows)
+    n_series = cashflows.shape[0]
+    values = np.full(n_series, np.nan)
+    error_codes = np.zeros(n_series, dtype=np.uint8)
+    multiple_roots = np.zeros(n_series, dtype=bool)
+    iterations = np.zeros(n_series, dtype=np.int64)
+
+    sign_changes = _count_sign_changes(cashflows)
+    error_codes[sign_changes == 0] = NO_SIGN_CHANGE
+
+    low = np.full(n_series, IRR_SCAN_RATES[0])
+    high = np.full(n_series, IRR_SCAN_RATES[-1])
+    rate = np.full(n_series, float(np.clip(guess, IRR_SCAN_RATES[0], IRR_SCAN_RATES[-1])))
+    has_bracket = sign_changes == 1
+
+    # Non-conventional series: scan NPV on a grid of rates, shape (n_scan, n_unconventional)
+    unconventional = np.flatnonzero(sign_changes > 1)
+    if len(unconventional):
+        scan_discount = (1 / (1 + IRR_SCAN_RATES))[:, None]
+        scan_npv, _derivative = _npv_and_derivative(scan_discount, cashflows[None, unconventional, :])
+        multiple_roots[unconventional] = _count_sign_changes(scan_npv, axis=0) > 1
+
+        # Exact zeros on the grid count as a crossing too
+        crossings = (np.sign(scan_npv[:-1]) * np.sign(scan_npv[1:]) < 0) | (scan_npv[:-1] == 0)
+        midpoints = (IRR_SCAN_RATES[:-1] + IRR_SCAN_RATES[1:]) / 2
+        distance = np.where(crossings, np.abs(midpoints - guess)[:, None], np.inf)
+        bracket_index = distance.argmin(axis=0)
+
+        has_bracket[unconventional] = crossings.any(axis=0)
+        low[unconventional] = IRR_SCAN_RATES[bracket_index]
+        high[unconventional] = IRR_SCAN_RATES[bracket_index + 1]
+        rate[unconventional] = (low[unconventional] + high[unconventional]) / 2
+
+    def npv_at(rates, rows):
+        discount = 1 / (1 + rates)
+        value, dvalue_ddiscount = _npv_and_derivative(discount, cashflows[rows])
+        # Chain rule: d(discount)/d(rate) = -discount**2
+        return value, dvalue_ddiscount * -(discount ** 2)
+
+    # The bracket must straddle a root; otherwise the IRR lies outside the search range
+    f_low, _ = npv_at(low, slice(None))
+    f_high, _ = npv_at(high, slice(None))
+    has_bracket &= (np.sign(f_low) != np.sign(f_high)) | (f_low == 0)
+    error_codes[(sign_changes > 0) & ~has_bracket] = IRR_NOT_FOUND
+    rate = np.where(f_low == 0, low, rate)
+
+    # Only series that haven't converged yet are evaluated at each step
+    pending = np.flatnonzero(has_bracket & (f_low != 0))
+    values[has_bracket & (f_low == 0)] = low[has_bracket & (f_low == 0)]
+    for _ in range(max_iter):
+        if not len(pending):
+            break
+        iterations[pending] += 1
+        r = rate[pending]
+        f, df = npv_at(r, pending)
+
+        # Shrink the bracket around the root using the sign of NPV at the current rate
+        same_side_as_low = np.sign(f) == np.sign(f_low[pending])
+        low[pending] = np.where(same_side_as_low, r, low[pending])
+        f_low[pending] = np.where(same_side_as_low, f, f_low[pending])
+        high[pending] = np.where(same_side_as_low, high[pending], r)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = r - f / df
+        use_newton = np.isfinite(newton) & (newton > low[pending]) & (newton < high[pending])
+        new_rate = np.where(use_newton, newton, (low[pending] + high[pending]) / 2)
+        rate[pending] = new_rate
+
+        done = (np.abs(new_rate - r) <= tol * np.maximum(1.0, np.abs(r))) | (f == 0)
+        values[pending[done]] = np.where(f[done] == 0, r[done], new_rate[done])
+        pending = pending[~done]
+
+    error_codes[pending] = IRR_NOT_FOUND
+    return IRRResult(values, error_codes, multiple_roots, iterations)
+
+
+# Vectorized functions by calculator.py function name (INTENT_CONFIG's calculator_function_name)
+VECTORIZED_FUNCTIONS = {
+    "present_value": present_value,
+    "future_value": future_value,
+    "simple_interest": simple_interest,
+    "compound_interest": compound_interest,
+    "loan_amortization_payment": loan_amortization_payment,
+}
+
+
+def describe_errors(error_codes):
+    """
+    Counts the invalid cells of a result by error message.
+    :return: dict of error message -> number of cells
+    """
+    codes, counts = np.unique(np.asarray(error_codes), return_counts=True)
+    return {ERROR_MESSAGES[code]: int(count) for code, count in zip(codes, counts) if code != OK}
+
+
+def sensitivity_grid(function_name, **arguments):
+    """
+    Evaluates a calculator function over the full cartesian product of its arguments in one call.
+    Each argument is a scalar (held fixed) or a 1-D sequence (a grid axis); axes appear in the
+    result in the order they are passed.
+
+    Example:
+        sensitivity_grid("loan_amortization_payment", principal=[1e5, 2e5],
+                         annual_rate=np.linspace(0, 0.1, 11), n_months=[180, 360])
+        -> values of shape (2, 11, 2)
+
+    :param function_name: Name of a calculator function (a key of VECTORIZED_FUNCTIONS)
+    :return: SensitivityGrid(values, error_codes, axes) where axes maps axis name -> axis values
+    """
+    if function_name not in VECTORIZED_FUNCTIONS:
+        raise ValueError(f"Unknown calculator function '{function_name}'.")
+
+    axis_names = [name for name, value in arguments.items() if np.ndim(value) > 0]
+    n_axes = len(axis_names)
+
+    # Give each axis its own dimension so the arguments broadcast into the full grid
+    shaped_arguments = {}
+    for name, value in arguments.items():
+        array = np.asarray(value, dtype=np.float64)
+        if array.ndim > 1:
+            raise ValueError(f"Grid axis '{name}' must be a scalar or 1-D sequence.")
+        if array.ndim == 1:
+            shape = [1] * n_axes
+            shape[axis_names.index(name)] = array.size
+            array = array.reshape(shape)
+        shaped_arguments[name] = array
+
+    result = VECTORIZED_FUNCTIONS[function_name](**shaped_arguments)
+    axes = {name: np.asarray(arguments[name], dtype=np.float64) for name in axis_names}
+    return SensitivityGrid(result.values, result.error_codes, axes)